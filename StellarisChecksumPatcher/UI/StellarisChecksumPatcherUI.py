@@ -17,8 +17,8 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QPalette, QPixmap, QRadialGradient, QTransform)
 from PySide6.QtWidgets import (QAbstractScrollArea, QApplication, QFrame, QGridLayout,
     QHBoxLayout, QLabel, QLayout, QMainWindow,
-    QPushButton, QSizePolicy, QSpacerItem, QTextBrowser,
-    QVBoxLayout, QWidget)
+    QPlainTextEdit, QProgressBar, QPushButton, QSizePolicy,
+    QSpacerItem, QTextBrowser, QVBoxLayout, QWidget)
 
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
@@ -35,15 +35,11 @@ class Ui_MainWindow(object):
         self.central_widget.setObjectName(u"central_widget")
         sizePolicy.setHeightForWidth(self.central_widget.sizePolicy().hasHeightForWidth())
         self.central_widget.setSizePolicy(sizePolicy)
-        self.central_widget.setStyleSheet(u"background-color: rgb(35, 55, 50);\n"
-"color: rgb(35, 75, 70);")
         self.gridLayout = QGridLayout(self.central_widget)
         self.gridLayout.setObjectName(u"gridLayout")
         self.main_frame = QFrame(self.central_widget)
         self.main_frame.setObjectName(u"main_frame")
         self.main_frame.setMinimumSize(QSize(650, 500))
-        self.main_frame.setStyleSheet(u"color: rgb(35, 75, 70);\n"
-"color: rgb(67, 144, 134);")
         self.main_frame.setFrameShape(QFrame.WinPanel)
         self.main_frame.setFrameShadow(QFrame.Plain)
         self.main_frame.setLineWidth(5)
@@ -67,19 +63,6 @@ class Ui_MainWindow(object):
         font.setPointSize(18)
         font.setBold(False)
         self.btn_themed_exit_application.setFont(font)
-        self.btn_themed_exit_application.setStyleSheet(u"QPushButton#btn_themed_exit_application {\n"
-"color: rgb(25, 255, 236);\n"
-"background-color: rgba(22, 59, 56, 100);\n"
-"border: 2px solid rgb(67, 144, 134);\n"
-"}\n"
-"QPushButton#btn_themed_exit_application:hover {\n"
-"background-color: rgba(255, 179, 25, 100);\n"
-"border-color: rgba(255, 151, 33, 175);\n"
-"}\n"
-"QPushButton#btn_themed_exit_application:pressed {\n"
-"background-color: rgba(30, 80, 70, 100);\n"
-"border-color: rgb(67, 144, 134);\n"
-"}")
 
         self.hlayout_window_functions.addWidget(self.btn_themed_exit_application, 0, Qt.AlignRight)
 
@@ -99,9 +82,6 @@ class Ui_MainWindow(object):
         font1.setPointSize(26)
         font1.setBold(False)
         self.lbl_title.setFont(font1)
-        self.lbl_title.setStyleSheet(u"color: rgb(255, 255, 255);\n"
-"background-color: rgb(35, 75, 70);\n"
-"border-radius: 5px;")
         self.lbl_title.setFrameShadow(QFrame.Plain)
         self.lbl_title.setTextFormat(Qt.AutoText)
         self.lbl_title.setScaledContents(False)
@@ -126,7 +106,7 @@ class Ui_MainWindow(object):
 
         self.verticalLayout.addItem(self.verticalSpacer)
 
-        self.terminal_display = QTextBrowser(self.main_frame)
+        self.terminal_display = QPlainTextEdit(self.main_frame)
         self.terminal_display.setObjectName(u"terminal_display")
         sizePolicy3 = QSizePolicy(QSizePolicy.Expanding, QSizePolicy.Ignored)
         sizePolicy3.setHorizontalStretch(0)
@@ -138,16 +118,24 @@ class Ui_MainWindow(object):
         font3.setPointSize(10)
         font3.setBold(False)
         self.terminal_display.setFont(font3)
-        self.terminal_display.setStyleSheet(u"color: rgb(255, 255, 255);\n"
-"background-color: rgba(22, 59, 56, 100);\n"
-"border: 4px solid rgb(35, 75, 70);")
         self.terminal_display.setFrameShape(QFrame.Box)
         self.terminal_display.setFrameShadow(QFrame.Sunken)
         self.terminal_display.setLineWidth(2)
-        self.terminal_display.setOpenExternalLinks(True)
+        self.terminal_display.setReadOnly(True)
+        self.terminal_display.setMaximumBlockCount(2000)
 
         self.verticalLayout.addWidget(self.terminal_display)
 
+        self.progress_bar = QProgressBar(self.main_frame)
+        self.progress_bar.setObjectName(u"progress_bar")
+        self.progress_bar.setVisible(False)
+        self.progress_bar.setMaximumSize(QSize(16777215, 18))
+        self.progress_bar.setMaximum(1000)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setAlignment(Qt.AlignCenter)
+
+        self.verticalLayout.addWidget(self.progress_bar)
+
         self.hlayout_after_terminal_display = QHBoxLayout()
         self.hlayout_after_terminal_display.setSpacing(0)
         self.hlayout_after_terminal_display.setObjectName(u"hlayout_after_terminal_display")
@@ -162,7 +150,6 @@ class Ui_MainWindow(object):
         font4.setPointSize(10)
         font4.setBold(True)
         self.txt_browser_project_link.setFont(font4)
-        self.txt_browser_project_link.setStyleSheet(u"border: 4px solid rgb(35, 75, 70);")
         self.txt_browser_project_link.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.txt_browser_project_link.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.txt_browser_project_link.setSizeAdjustPolicy(QAbstractScrollArea.AdjustToContents)
@@ -195,19 +182,6 @@ class Ui_MainWindow(object):
         self.btn_patch_from_dir.setFont(font5)
         self.btn_patch_from_dir.setLayoutDirection(Qt.RightToLeft)
         self.btn_patch_from_dir.setAutoFillBackground(False)
-        self.btn_patch_from_dir.setStyleSheet(u"QPushButton {\n"
-"color: rgb(255, 255, 255);\n"
-"background-color: rgba(22, 59, 56, 100);\n"
-"border: 4px solid rgb(35, 75, 70);\n"
-"}\n"
-"QPushButton:hover {\n"
-"background-color: rgba(255, 179, 25, 100);\n"
-"border-color: rgba(255, 151, 33, 175);\n"
-"}\n"
-"QPushButton:pressed {\n"
-"background-color: rgba(30, 80, 70, 100);\n"
-"border-color: rgb(67, 144, 134);\n"
-"}")
         self.btn_patch_from_dir.setIconSize(QSize(64, 64))
 
         self.hlayout_patch_buttons.addWidget(self.btn_patch_from_dir)
@@ -222,19 +196,6 @@ class Ui_MainWindow(object):
         self.btn_patch_from_install.setFont(font5)
         self.btn_patch_from_install.setLayoutDirection(Qt.RightToLeft)
         self.btn_patch_from_install.setAutoFillBackground(False)
-        self.btn_patch_from_install.setStyleSheet(u"QPushButton {\n"
-"color: rgb(255, 255, 255);\n"
-"background-color: rgba(22, 59, 56, 100);\n"
-"border: 4px solid rgb(35, 75, 70);\n"
-"}\n"
-"QPushButton:hover {\n"
-"background-color: rgba(255, 179, 25, 100);\n"
-"border-color: rgba(255, 151, 33, 175);\n"
-"}\n"
-"QPushButton:pressed {\n"
-"background-color: rgba(30, 80, 70, 100);\n"
-"border-color: rgb(67, 144, 134);\n"
-"}")
         self.btn_patch_from_install.setIconSize(QSize(64, 64))
         self.btn_patch_from_install.setFlat(False)
 
@@ -261,15 +222,10 @@ class Ui_MainWindow(object):
         self.btn_themed_exit_application.setText(QCoreApplication.translate("MainWindow", u"X", None))
         self.lbl_title.setText(QCoreApplication.translate("MainWindow", u"Stellaris Checksum Patcher", None))
         self.lbl_app_version.setText(QCoreApplication.translate("MainWindow", u"App Version", None))
-        self.terminal_display.setHtml(QCoreApplication.translate("MainWindow", u"<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0//EN\" \"http://www.w3.org/TR/REC-html40/strict.dtd\">\n"
-"<html><head><meta name=\"qrichtext\" content=\"1\" /><style type=\"text/css\">\n"
-"p, li { white-space: pre-wrap; }\n"
-"</style></head><body style=\" font-family:'Century Gothic'; font-size:10pt; font-weight:400; font-style:normal;\">\n"
-"<p style=\" margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><span style=\" font-family:'Orbitron';\">[INFO] Loading file Hex.</span></p>\n"
-"<p style=\" margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><span style=\" font-family:'Orbitron';\">[INFO] Streaming File Hex Info...</span></p>\n"
-"<p style=\" margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><span style=\" font-family:'Orbitron';\">[INFO] Read finished.</span></p>\n"
-"<p style=\" margin-top:0px; margin-bottom:0px; margin-left:0px; margin-"
-                        "right:0px; -qt-block-indent:0; text-indent:0px;\"><span style=\" font-family:'Orbitron';\">[INFO] Acquiring Checksum Block...</span></p></body></html>", None))
+        self.terminal_display.setPlainText(QCoreApplication.translate("MainWindow", u"[INFO] Loading file Hex.\n"
+"[INFO] Streaming File Hex Info...\n"
+"[INFO] Read finished.\n"
+"[INFO] Acquiring Checksum Block...", None))
         self.txt_browser_project_link.setHtml(QCoreApplication.translate("MainWindow", u"<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0//EN\" \"http://www.w3.org/TR/REC-html40/strict.dtd\">\n"
 "<html><head><meta name=\"qrichtext\" content=\"1\" /><style type=\"text/css\">\n"
 "p, li { white-space: pre-wrap; }\n"
@@ -4,8 +4,10 @@ import os
 import ctypes
 import shutil
 import json
+import threading
+import time
 
 from time import sleep
 from io import StringIO
 from ctypes import wintypes
-from utils.global_defines import logger, config_folder, updater, settings
+from utils.global_defines import logger, config_folder, updater, settings, install_store
@@ -4,16 +4,46 @@ from PySide6 import QtWidgets, QtCore, QtGui
 from .ui_utils import prompt_user_game_install_dialog, Worker
 from UI.StellarisChecksumPatcherUI import Ui_MainWindow
 from hex_patchers.HexPatcher import StellarisChecksumPatcher
+from service.process_worker import PatchProcess
+
+TERMINAL_FLUSH_INTERVAL = 50 # Milliseconds between batched writes of log lines to the terminal display.
+PATCH_STAGE_NAMES = {"load": "Reading", "scan": "Scanning", "write": "Writing"}
+APP_STYLESHEET_FILE = os.path.join(os.path.dirname(__file__), "StellarisChecksumPatcherUI.qss")
+
+_app_stylesheet = None
+
+
+def get_app_stylesheet() -> str:
+    """
+    The whole UI is styled by one application stylesheet, read once and cached.
+    """
+    global _app_stylesheet
+    if _app_stylesheet is None:
+        try:
+            with open(APP_STYLESHEET_FILE, "r") as f:
+                _app_stylesheet = f.read()
+        except OSError as e:
+            logger.error("Unable to load stylesheet.")
+            logger.debug_error(e)
+            _app_stylesheet = ""
+
+    return _app_stylesheet
 
 class StellarisChecksumPatcherGUI(Ui_MainWindow):
     _app_version = (".".join([str(v) for v in StellarisChecksumPatcher.APP_VERSION]))
     UI_ICONS_FOLDER = os.path.join(os.path.dirname(__file__), "ui_icons")
 
-    def __init__(self) -> None:
+    def __init__(self, started=None) -> None:
+        """
+        :param started: time.perf_counter() at process start, to report the time to first frame from there.
+        """
         super(StellarisChecksumPatcherGUI, self).__init__()
 
+        self._started = started if started is not None else time.perf_counter()
+
         # Required constructor definitions
         self.app = QtWidgets.QApplication(sys.argv)
+        self.app.setStyleSheet(get_app_stylesheet()) # Set before the widgets exist, so they are polished once.
         self.main_window = QtWidgets.QMainWindow()
         Ui_MainWindow.setupUi(self, self.main_window)
 
@@ -32,13 +62,20 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         self.main_window.installEventFilter(self.grabber_filter)
         self.start_pos = None
 
-        self.__set_app_id() # Setting App ID on Windows
+        # Settings, the update check and the install status probe run after the first frame is painted.
+        self.first_paint_filter = EventFilterFirstPaint(self._after_first_paint)
+        self.main_window.installEventFilter(self.first_paint_filter)
 
         # Set App Version from HexPatcher
         self.lbl_app_version.setText(f"Version {self._app_version}")
 
         # Patcher Service Class
-        self.stellaris_patcher = StellarisChecksumPatcher()
+        try:
+            self.stellaris_patcher = StellarisChecksumPatcher()
+        except ValueError as e:
+            # A broken game profile override in the config folder. Patching stays disabled until it is fixed.
+            logger.error(f"Unable to load the game profile: {e}")
+            self.stellaris_patcher = None
 
         self._has_run_once = False
         self._patch_successful = False
@@ -57,22 +94,36 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         self.btn_patch_from_install.setIconSize(QtCore.QSize(64, 64))
         self.btn_patch_from_install.setFlat(False)
 
-        # =========== QTextBrowser Terminal Display ===========
+        # =========== QPlainTextEdit Terminal Display ===========
         self.terminal_display.clear() # Clear as we have preview text as default
+
+        # Log lines from any thread are buffered and written to the display in batches by a single shot timer.
+        self._terminal_buffer = []
+        self._terminal_buffer_lock = threading.Lock()
+        self._terminal_flush_timer = QtCore.QTimer(self.main_window)
+        self._terminal_flush_timer.setSingleShot(True)
+        self._terminal_flush_timer.setInterval(TERMINAL_FLUSH_INTERVAL)
+        self._terminal_flush_timer.timeout.connect(self._flush_terminal_log)
         
         # Handle initial connects
         self.btn_patch_from_dir.clicked.connect(self.patch_from_directory_thread)
         self.btn_patch_from_install.clicked.connect(self.patch_from_game_install_thread)
         self.btn_themed_exit_application.clicked.connect(self._app_quit)
         logger.signals.progress.connect(self.terminal_display_log)
+
+        if self.stellaris_patcher is None:
+            self._disable_ui_elements()
         
         # Worker
         self.worker = None
+        self.patch_worker = None # Worker of the running patch, cancelled when quitting.
+        self.update_worker = None
+        self.probe_worker = None # Kept apart so a late status probe never replaces the patch worker.
 
         # ThreadPool
         self.thread_pool = QtCore.QThreadPool()
 
-        self.load_configs()
+        logger.debug("Window constructed in %.1f ms", (time.perf_counter() - self._started) * 1000)
 
     # ===============================================
     # ============== Protected methods ==============
@@ -92,9 +143,42 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
     # ============== Class Functions ==============
     # =============================================
 
+    def _after_first_paint(self):
+        logger.info(f"First frame after {(time.perf_counter() - self._started) * 1000:.0f} ms.")
+
+        if os.name == "nt":
+            self.__set_app_id() # Setting App ID on Windows
+
+        self.load_configs()
+        self.check_install_status()
+
+    def _probe_install_status(self):
+        """
+        Reports whether the located game executable is patched, from the install store only. Nothing is read from
+        the executable itself.
+
+        To be called from Worker Thread.
+        """
+        if self._manual_install_dir:
+            game_executable = os.path.join(self._manual_install_dir, self.stellaris_patcher.exe_default_filename)
+        else:
+            game_executable = self.stellaris_patcher.locate_game_install()
+
+        if not game_executable or not os.path.isfile(game_executable):
+            return
+
+        record = install_store.get(game_executable)
+        if record and install_store.is_current(record):
+            state = "patched" if record.get("patched") else "not patched"
+            logger.info(f"{game_executable} is {state}.")
+        else:
+            logger.info(f"Found {game_executable}. Patch status unknown until it is patched.")
+
     def _app_quit(self):
         try:
             logger.info("Quitting Application.")
+            if self.patch_worker is not None:
+                self.patch_worker.cancel() # Stops a running patch at its next block, without leaving partial output.
             if self.thread_pool and self.thread_pool.activeThreadCount() > 0:
                 logger.info("Waiting for finish.")
                 self.thread_pool.waitForDone(msecs=2000) # Wait for max 2 seconds.
@@ -102,6 +186,9 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         except Exception as e:
             logger.error(e)
 
+        settings.flush() # Write pending setting changes now rather than after the debounce delay.
+        logger.shutdown() # Flush queued log records before exiting.
+
         sys.exit(0)
 
     def _set_terminal_clickable(self, is_clickable: bool):
@@ -110,19 +197,92 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         else:
             self.terminal_display.setTextInteractionFlags(QtCore.Qt.LinksAccessibleByMouse)
         
-    def _refresh_terminal_log(self):
-        # Could potentially not be useful anymore. Here to force redraw of elements in the QTextBrowser.
-        self.terminal_display.update()
+    def _flush_terminal_log(self):
+        with self._terminal_buffer_lock:
+            lines, self._terminal_buffer = self._terminal_buffer, []
+
+        if not lines:
+            return
+
+        # One append per batch. The display caps its scrollback with maximumBlockCount.
+        self.terminal_display.appendPlainText("\n".join(lines))
+        self.terminal_display.ensureCursorVisible()
+
+    def _clear_terminal_log(self):
+        with self._terminal_buffer_lock:
+            self._terminal_buffer.clear()
+        self.terminal_display.clear()
+
+    def _show_patch_progress(self):
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
+        self.progress_bar.setVisible(True)
+
+    def _hide_patch_progress(self):
+        self.progress_bar.setVisible(False)
+
+    def _update_patch_progress(self, stage: str, done: int, total: int):
+        self.progress_bar.setFormat(f"{PATCH_STAGE_NAMES.get(stage, stage)} %p%")
+        self.progress_bar.setValue(int(done * self.progress_bar.maximum() / total) if total else 0)
 
     def _operations_finished_report(self):
         self.terminal_display_log(' ')
         logger.info("Operations finished.")
         
-    def _patch_from_game_install(self) -> bool:
+    def _patch_executable(self, game_executable, token=None, progress=None) -> dict:
+        """
+        Patches and replaces game_executable in a child process, so the scan never blocks the event loop. Falls back
+        to patching in this process if the child cannot be started.
+
+        To be called from Worker Thread.
+        :return: The result of StellarisChecksumPatcher.patch_executable.
+        """
+        # The child patches with the profile and build of this patcher. An invalid one fails the job with its reason.
+        params = {"executable": game_executable, "replace": True,
+                  "output_dir": self.stellaris_patcher.exe_out_directory,
+                  "profile": self.stellaris_patcher.profile.profile_id, "build": self.stellaris_patcher.build}
+
+        try:
+            response = PatchProcess("patch", params).run(token=token, progress=progress)
+        except OSError as e:
+            logger.debug_error(f"Unable to start patch process, patching in process: {e}")
+            return self.stellaris_patcher.patch_executable(game_executable, replace=True, token=token,
+                                                           progress=progress)
+
+        if not response["ok"]:
+            return {"executable": game_executable, "loaded": False, "patched": False, "already_patched": False,
+                    "replaced": False, "cancelled": token is not None and token.cancelled}
+
+        self.stellaris_patcher.is_patched = response["result"].get("already_patched", False)
+
+        return response["result"]
+
+    @staticmethod
+    def _report_patch_result(result: dict) -> bool:
+        """
+        Logs the outcome of a patch run. Only a patched or already patched executable counts as a success.
+        """
+        if result.get("cancelled"):
+            logger.info("Patch cancelled.")
+            return False
+
+        if not result.get("patched") and not result.get("already_patched"):
+            logger.info("Patch failed.")
+            return False
+
+        # Handle feedback if replacing failed
+        if result.get("patched") and not result.get("replaced"):
+            logger.info("Unable to replace original game file. Please attempt to do so manually.")
+
+        return True
+
+    def _patch_from_game_install(self, token=None, progress=None) -> bool:
         """
         Attempts to find the Steam game installation and performing all the necessary steps to patch the exe.
 
         To be called from Worker Thread.
+        :param token: CancellationToken of the worker.
+        :param progress: Progress callback of the worker.
         :return: bool
         """
         self.reset_caches()
@@ -156,35 +316,31 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         # Patch can proceed, therefore save game install location
         settings.set_install_location(self._manual_install_dir)
         
-        self.stellaris_patcher.load_file_hex(file_path=game_executable)
-        
         logger.info("Applying Patch...")
         
         self.terminal_display_log(' ')
-        
-        self.stellaris_patcher.patch() # Here if the file IS patched, there is the "is_patched" flag
-            
-        replaced = self.replace_with_patched_file()
 
-        self._patch_successful = True
-        self.is_patching = False
+        # Load, patch and replace under the executable's file lock, in a child process.
+        # If the file IS patched, "already_patched" is set.
+        result = self._patch_executable(game_executable, token=token, progress=progress)
 
-        # Handle feedback if replacing failed
-        if not replaced and not self.stellaris_patcher.is_patched:
-            logger.info(f"Unable to replace original game file. Please attempt to do so manually.\n")
+        self._patch_successful = self._report_patch_result(result)
+        self.is_patching = False
 
         self._operations_finished_report()
 
         self._set_terminal_clickable(True)
 
-        return True
+        return self._patch_successful
         
-    def _patch_from_manual_game_install(self) -> bool:
+    def _patch_from_manual_game_install(self, token=None, progress=None) -> bool:
         """
         Attempts to patch the executable located in the current application's directory. Will prompt for a directory
         in the event that the executable is not found.
 
         To be called from Worker Thread.
+        :param token: CancellationToken of the worker.
+        :param progress: Progress callback of the worker.
         :return: True if patched succesfully.
         """
 
@@ -197,9 +353,8 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         self._set_terminal_clickable(False)
         
         logger.info("Patching from directory.")
-        loaded = self.stellaris_patcher.load_file_hex(dir_to_look)
         
-        if not loaded:
+        if not os.path.isfile(dir_to_look):
             self.is_patching = False
             self.terminal_display_log(" ")
             if not self._manual_install_dir or self._manual_install_dir == "":
@@ -207,7 +362,7 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
             else:
                 logger.error(f"Game executable not found in {dir_to_look}.")
             logger.info("Patch failed.")
-            self.worker.signals.failed.emit()
+            self.patch_worker.signals.failed.emit()
             self._set_terminal_clickable(True)
             return False
 
@@ -218,22 +373,18 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         
         self.terminal_display_log(" ")
 
-        self.stellaris_patcher.patch()  # Here if the file IS patched, there is the "is_patched" flag
+        # Load, patch and replace under the executable's file lock, in a child process.
+        # If the file IS patched, "already_patched" is set.
+        result = self._patch_executable(dir_to_look, token=token, progress=progress)
 
-        replaced = self.replace_with_patched_file()
-
-        self._patch_successful = True
+        self._patch_successful = self._report_patch_result(result)
         self.is_patching = False
 
-        # Handle feedback if replacing failed
-        if not replaced and not self.stellaris_patcher.is_patched:
-            logger.info(f"Unable to replace original game file. Please attempt to do so manually.")
-
         self._operations_finished_report()
 
         self._set_terminal_clickable(True)
 
-        return True
+        return self._patch_successful
         
     def _patch_from_directory(self): # Legacy?
         self.reset_caches()
@@ -251,10 +402,10 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         
         logger.info("Applying Patch...")
         
-        self.stellaris_patcher.patch()
-        
-        self._patch_successful = True
+        self._patch_successful = self.stellaris_patcher.patch() or self.stellaris_patcher.is_patched
         self.is_patching = False
+
+        return self._patch_successful
         
     def _enable_ui_elements(self):
         self.btn_patch_from_install.setDisabled(False)
@@ -279,8 +430,13 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         self.is_patching = False
         
     def terminal_display_log(self, t_log):
-        self.terminal_display.insertPlainText(f"{t_log}\n")
-        self._refresh_terminal_log()
+        # Safe to call from worker threads, the timer is started on the GUI thread.
+        with self._terminal_buffer_lock:
+            schedule_flush = not self._terminal_buffer
+            self._terminal_buffer.append(f"{t_log}")
+
+        if schedule_flush:
+            QtCore.QMetaObject.invokeMethod(self._terminal_flush_timer, "start", QtCore.Qt.QueuedConnection)
         
     def get_patched_file(self) -> str:
         """
@@ -296,7 +452,6 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
             return False
 
         self.terminal_display_log(' ')
-        patched_file = self.get_patched_file()
 
         # Here we check if we already have an install location saved in config
         # Otherwise try to look for it.
@@ -305,45 +460,7 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         else:
             original_file = self.stellaris_patcher.locate_game_install()
 
-        # Rename original file
-        renamed = False
-        logger.info("Backing up original file.")
-        try:
-            backup_file = f"{original_file}.orig"
-            if not os.path.exists(backup_file):
-                logger.debug(f"Renaming {original_file} -> {backup_file}")
-                os.rename(original_file, original_file + ".orig")
-            else:
-                logger.info("Backed up file already exists.")
-            renamed = True
-        except Exception as e:
-            logger.error("Failed to rename original file.")
-            logger.debug_error(e)
-            
-        if not renamed:
-            return False
-        
-        # Copy patched file and rename
-        copied = False
-        logger.info("Moving patched file.")
-        try:
-            logger.debug(f"{patched_file} -> {original_file}")
-            shutil.copy(patched_file, original_file)
-            copied = True
-        except Exception as e:
-            logger.error("Failed to move patched file.")
-            logger.debug_error(e)
-            
-        if not copied:
-            return False
-            
-        try:
-            os.remove(patched_file)
-        except Exception:
-            self.terminal_display_log(' ')
-            logger.error("Unable to delete patched file.")
-        
-        return True
+        return self.stellaris_patcher.replace_original_file(original_file)
         
     def patch_from_game_install_thread(self):
         if self.is_patching:
@@ -351,11 +468,15 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         
         logger.restart_log_file()
         
-        self.terminal_display.clear()
+        self._clear_terminal_log()
         
-        self.worker = Worker(target=self._patch_from_game_install)
+        self.worker = Worker(target=self._patch_from_game_install, cancellable=True)
         self.worker.signals.started.connect(self._disable_ui_elements)
+        self.worker.signals.started.connect(self._show_patch_progress)
+        self.worker.signals.patch_progress.connect(self._update_patch_progress)
         self.worker.signals.finished.connect(self._enable_ui_elements)
+        self.worker.signals.finished.connect(self._hide_patch_progress)
+        self.patch_worker = self.worker
         self.thread_pool.start(self.worker)
         
     def patch_from_prompt(self):
@@ -371,17 +492,28 @@ class StellarisChecksumPatcherGUI(Ui_MainWindow):
         
         logger.restart_log_file()
         
-        self.terminal_display.clear()
+        self._clear_terminal_log()
         
-        self.worker = Worker(target=self._patch_from_manual_game_install)
+        self.worker = Worker(target=self._patch_from_manual_game_install, cancellable=True)
         self.worker.signals.failed.connect(self.patch_from_prompt)
         self.worker.signals.started.connect(self._disable_ui_elements)
+        self.worker.signals.started.connect(self._show_patch_progress)
+        self.worker.signals.patch_progress.connect(self._update_patch_progress)
         self.worker.signals.finished.connect(self._enable_ui_elements)
+        self.worker.signals.finished.connect(self._hide_patch_progress)
+        self.patch_worker = self.worker
         self.thread_pool.start(self.worker)
 
     def check_update(self):
-        self.worker = Worker(target=updater.check_for_update)
-        self.thread_pool.start(self.worker)
+        self.update_worker = Worker(target=updater.check_for_update)
+        self.thread_pool.start(self.update_worker)
+
+    def check_install_status(self):
+        if self.stellaris_patcher is None:
+            return
+
+        self.probe_worker = Worker(target=self._probe_install_status)
+        self.thread_pool.start(self.probe_worker)
     
     def show(self):
         self.main_window.show()
@@ -392,6 +524,23 @@ class EventFilterOvr(QtCore.QObject):
         return False
 
 
+class EventFilterFirstPaint(EventFilterOvr):
+    """
+    Calls callback once, from the event loop, right after the first paint of the watched widget.
+    """
+
+    def __init__(self, callback) -> None:
+        super().__init__()
+        self._callback = callback
+
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Type.Paint and self._callback is not None:
+            callback, self._callback = self._callback, None
+            obj.removeEventFilter(self)
+            QtCore.QTimer.singleShot(0, callback)
+        return False
+
+
 class EventFilterGrabber(EventFilterOvr):
     def eventFilter(self, obj, event):
         if obj.underMouse() and event.type() == QtCore.QEvent.Type.MouseButtonPress:
@@ -2,6 +2,7 @@ from . import *
 
 from PySide6 import QtWidgets
 from PySide6.QtCore import QObject, QRunnable, Slot, Signal
+from hex_patchers.progress import CancellationToken
 
 
 class Capturing(list):  # Deprecated and not used, here for simply backup reasons because it was really cool to figure it out.
@@ -26,17 +27,32 @@ class WorkerSignals(QObject):
     finished = Signal()
     progress = Signal(str)
     terminal_progress = Signal(str)
+    download_progress = Signal(int, int) # Bytes received, total bytes (0 when unknown).
+    patch_progress = Signal(str, int, int) # Stage, bytes processed, total bytes of the stage.
     failed = Signal()
 
 
 class Worker(QRunnable):
-    def __init__(self, target=None, args=(), kwargs=None) -> None:
+    """
+    :param cancellable: Also pass token (the worker's CancellationToken) and progress (emits
+    signals.patch_progress) to target.
+    """
+
+    def __init__(self, target=None, args=(), kwargs=None, cancellable=False) -> None:
         super().__init__()
         self.signals = WorkerSignals()
+        self.cancel_token = CancellationToken()
 
         self._target = target
         self._args = args
         self._kwargs = kwargs
+        self._cancellable = cancellable
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def report_progress(self, stage: str, done: int, total: int):
+        self.signals.patch_progress.emit(stage, done, total)
 
     @Slot()
     def run(self):
@@ -44,6 +60,8 @@ class Worker(QRunnable):
         if self._target:
             if self._kwargs is None:
                 self._kwargs = {}
+            if self._cancellable:
+                self._kwargs.update(token=self.cancel_token, progress=self.report_progress)
             self.signals.started.emit()
-            self._target(*self._args, *self._kwargs)
+            self._target(*self._args, **self._kwargs)
         self.signals.finished.emit()
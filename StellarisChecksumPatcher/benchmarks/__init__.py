@@ -0,0 +1,13 @@
+# built-ins
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+from typing import Union
+
+# 3rd-party
+from utils.global_defines import LazySingleton
+
+logger = LazySingleton("logger")
@@ -0,0 +1,123 @@
+import subprocess
+
+from . import *
+
+# Startup paths, each measured in a fresh interpreter by importing its entry module.
+STARTUP_TARGETS = {
+    "interpreter": None, # Baseline: interpreter start-up without importing anything.
+    "engine": "hex_patchers.HexPatcher",
+    "cli": "cli",
+    "gui": "UI.stellaris_checksum_patcher_gui",
+}
+DEFAULT_ITERATIONS = 5
+_RESULT_MARKER = "STARTUP-BENCHMARK:"
+
+_CHILD_SCRIPT = """
+import importlib
+import json
+import sys
+import time
+
+started = time.perf_counter()
+target = sys.argv[1]
+if target:
+    importlib.import_module(target)
+import_ms = (time.perf_counter() - started) * 1000
+
+def _peak_rss():
+    # On Linux ru_maxrss of a child started by fork/exec includes the parent's peak from before exec, so read the
+    # high water mark of this process image instead.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+        # ru_maxrss is in KiB on Linux and in bytes on macOS.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    except ImportError:
+        return None
+
+peak_rss = _peak_rss()
+
+print(%r + json.dumps({
+    "import_ms": import_ms,
+    "peak_rss": peak_rss,
+    "qt": any(name.split(".")[0] == "PySide6" for name in sys.modules),
+    "requests": "requests" in sys.modules,
+    "modules": len(sys.modules),
+}))
+""" % _RESULT_MARKER
+
+
+def _package_dir() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _measure_once(target) -> Union[dict, None]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [_package_dir(), env.get("PYTHONPATH")]))
+
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", _CHILD_SCRIPT, target or ""], env=env, capture_output=True,
+                               text=True)
+    process_ms = (time.perf_counter() - started) * 1000
+
+    for line in completed.stdout.splitlines():
+        if line.startswith(_RESULT_MARKER):
+            result = json.loads(line[len(_RESULT_MARKER):])
+            result["process_ms"] = process_ms
+            return result
+
+    logger.error(f"Startup benchmark of {target} failed.")
+    logger.debug_error(completed.stderr.strip())
+    return None
+
+
+def run_benchmark(targets=None, iterations: int = DEFAULT_ITERATIONS) -> dict:
+    """
+    Measures import time, total process time and peak RSS of each startup path in fresh interpreters, and whether
+    the path imported Qt or requests.
+
+    :param targets: Names from STARTUP_TARGETS. Defaults to all of them.
+    :return: {target: {"import_ms": {"min", "avg"}, "process_ms": {"min", "avg"}, "peak_rss_mb", "qt", "requests",
+    "modules"}}
+    """
+    iterations = max(1, int(iterations))
+    report = {}
+
+    for name in targets or STARTUP_TARGETS:
+        logger.info(f"Measuring {name} startup...")
+        runs = [result for result in (_measure_once(STARTUP_TARGETS[name]) for _ in range(iterations)) if result]
+        if not runs:
+            continue
+
+        entry = {}
+        for key in ("import_ms", "process_ms"):
+            values = [run[key] for run in runs]
+            entry[key] = {"min": round(min(values), 3), "avg": round(sum(values) / len(values), 3)}
+
+        peak_rss = [run["peak_rss"] for run in runs if run["peak_rss"] is not None]
+        entry["peak_rss_mb"] = round(max(peak_rss) / (1024 * 1024), 2) if peak_rss else None
+        entry["qt"] = runs[-1]["qt"]
+        entry["requests"] = runs[-1]["requests"]
+        entry["modules"] = runs[-1]["modules"]
+
+        report[name] = entry
+
+    return report
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'path':<12} {'import ms':>10} {'process ms':>11} {'peak RSS MB':>12} {'modules':>8}  qt  requests"]
+
+    for name, entry in report.items():
+        rss = f"{entry['peak_rss_mb']:.2f}" if entry["peak_rss_mb"] is not None else "n/a"
+        lines.append(f"{name:<12} {entry['import_ms']['min']:>10.2f} {entry['process_ms']['min']:>11.2f} {rss:>12} "
+                     f"{entry['modules']:>8}  {'yes' if entry['qt'] else 'no':<3} {'yes' if entry['requests'] else 'no'}")
+
+    return "\n".join(lines)
@@ -0,0 +1,323 @@
+from . import *
+from hex_patchers import steam_helper
+from hex_patchers.steam_index import SteamLibraryIndex
+from hex_patchers.steam_locator import LinuxSteamLocator, SteamLocationCache, LINUX_STEAM_ROOTS
+from hex_patchers.vdf_parser import clear_vdf_cache
+
+TARGET_TITLE = "Stellaris"
+TARGET_APP_ID = "281990"
+FILLER_APP_ID_START = 1000000
+DEFAULT_SIZES = ((1, 10), (4, 100), (10, 1000)) # (libraries, manifests per library), up to 10k manifests.
+DEFAULT_ITERATIONS = 3
+
+# Counted audit events. Builtin open() and os.open() both raise "open".
+_COUNTED_EVENTS = ("open", "os.listdir", "os.scandir")
+
+_counters = None # {event: count} while a measurement is running, None otherwise.
+_counters_lock = threading.Lock()
+_audit_hook_installed = False
+
+_MANIFEST_TEMPLATE = """"AppState"
+{{
+\t"appid"\t\t"{app_id}"
+\t"Universe"\t\t"1"
+\t"LauncherPath"\t\t"C:\\\\Program Files (x86)\\\\Steam\\\\steam.exe"
+\t"name"\t\t"{name}"
+\t"StateFlags"\t\t"4"
+\t"installdir"\t\t"{install_dir}"
+\t"LastUpdated"\t\t"1700000000"
+\t"SizeOnDisk"\t\t"{size_on_disk}"
+\t"StagingSize"\t\t"0"
+\t"buildid"\t\t"{build_id}"
+\t"LastOwner"\t\t"76561190000000000"
+\t"UpdateResult"\t\t"0"
+\t"BytesToDownload"\t\t"0"
+\t"BytesDownloaded"\t\t"0"
+\t"BytesToStage"\t\t"0"
+\t"BytesStaged"\t\t"0"
+\t"TargetBuildID"\t\t"{build_id}"
+\t"AutoUpdateBehavior"\t\t"0"
+\t"AllowOtherDownloadsWhileRunning"\t\t"0"
+\t"ScheduledAutoUpdate"\t\t"0"
+\t"InstalledDepots"
+\t{{
+\t\t"{depot_id}"
+\t\t{{
+\t\t\t"manifest"\t\t"{depot_manifest}"
+\t\t\t"size"\t\t"{size_on_disk}"
+\t\t}}
+\t\t"{depot_id_2}"
+\t\t{{
+\t\t\t"manifest"\t\t"{depot_manifest_2}"
+\t\t\t"size"\t\t"1048576"
+\t\t\t"dlcappid"\t\t"{dlc_app_id}"
+\t\t}}
+\t}}
+\t"SharedDepots"
+\t{{
+\t\t"228988"\t\t"228980"
+\t\t"228990"\t\t"228980"
+\t}}
+\t"UserConfig"
+\t{{
+\t\t"language"\t\t"english"
+\t}}
+\t"MountedConfig"
+\t{{
+\t\t"language"\t\t"english"
+\t}}
+}}
+"""
+
+
+def _audit_hook(event, args) -> None:
+    if _counters is not None and event in _COUNTED_EVENTS:
+        with _counters_lock:
+            _counters[event] += 1
+
+
+def _install_audit_hook() -> None:
+    # Audit hooks cannot be removed, so a single hook is installed and only counts while a measurement is running.
+    global _audit_hook_installed
+    if not _audit_hook_installed:
+        sys.addaudithook(_audit_hook)
+        _audit_hook_installed = True
+
+
+class _SyscallCounter:
+    """
+    Counts file opens and directory listings (through audit events) and stat calls (os.stat has no audit event, so
+    it is wrapped) made by any thread while the context is active.
+    """
+
+    def __init__(self) -> None:
+        self.counts = {}
+        self._stat = None
+
+    def __enter__(self):
+        global _counters
+        _install_audit_hook()
+
+        counts = {event: 0 for event in _COUNTED_EVENTS}
+        counts["os.stat"] = 0
+        self._stat = os.stat
+
+        def _counted_stat(*args, **kwargs):
+            with _counters_lock:
+                counts["os.stat"] += 1
+            return self._stat(*args, **kwargs)
+
+        os.stat = _counted_stat
+        _counters = counts
+
+        return self
+
+    def __exit__(self, *args):
+        global _counters
+        os.stat = self._stat
+        self.counts = dict(_counters)
+        _counters = None
+
+
+def _write_manifest(library, app_id, name, install_dir) -> None:
+    manifest = _MANIFEST_TEMPLATE.format(
+        app_id=app_id,
+        name=name,
+        install_dir=install_dir,
+        size_on_disk=int(app_id) * 7 % 90000000000,
+        build_id=int(app_id) % 10000000,
+        depot_id=int(app_id) + 1,
+        depot_id_2=int(app_id) + 2,
+        depot_manifest=int(app_id) * 7919 % 10 ** 19,
+        depot_manifest_2=int(app_id) * 104729 % 10 ** 19,
+        dlc_app_id=int(app_id) + 3
+    )
+
+    with open(os.path.join(library, f"{steam_helper.STEAM_APP_MANIFEST_FILE_PREFIX}_{app_id}.acf"), "w") as f:
+        f.write(manifest)
+
+
+def build_fake_steam(home, libraries: int, manifests: int, target_position: float = 1.0) -> dict:
+    """
+    Builds a fake Linux Steam root under home/.local/share/Steam whose libraryfolders.vdf lists `libraries` libraries
+    (the root's own steamapps being the first), each holding `manifests` app manifests.
+
+    :param target_position: Where the target game sits among all manifests, 0.0 being the first manifest of the first
+    library and 1.0 the last manifest of the last library.
+    :return: {"home", "steam-root", "libraries", "manifests", "target-library"}
+    """
+    libraries = max(1, int(libraries))
+    manifests = max(1, int(manifests))
+    steam_root = os.path.join(home, ".local", "share", "Steam")
+
+    library_roots = [steam_root] + [os.path.join(home, f"SteamLibrary{i}") for i in range(1, libraries)]
+
+    total = libraries * manifests
+    target_index = round(min(max(target_position, 0.0), 1.0) * (total - 1))
+
+    library_folders = ['"libraryfolders"', "{"]
+    target_library = None
+    for library_number, library_root in enumerate(library_roots):
+        steamapps = os.path.join(library_root, steam_helper.STEAM_STEAMAPPS_FOLDER)
+        os.makedirs(os.path.join(steamapps, steam_helper.STEAM_COMMON_FOLDER), exist_ok=True)
+
+        library_folders.extend([
+            f'\t"{library_number}"', "\t{",
+            f'\t\t"path"\t\t"{library_root}"',
+            '\t\t"label"\t\t""',
+            f'\t\t"contentid"\t\t"{library_number + 1}"',
+            '\t\t"totalsize"\t\t"0"',
+            "\t}"
+        ])
+
+        for manifest_number in range(manifests):
+            index = library_number * manifests + manifest_number
+            if index == target_index:
+                _write_manifest(steamapps, TARGET_APP_ID, TARGET_TITLE, TARGET_TITLE)
+                target_library = os.path.abspath(steamapps)
+            else:
+                app_id = FILLER_APP_ID_START + index
+                _write_manifest(steamapps, app_id, f"Synthetic App {app_id}", f"SyntheticApp{app_id}")
+
+    library_folders.append("}")
+
+    os.makedirs(os.path.join(steam_root, "config"), exist_ok=True)
+    with open(os.path.join(steam_root, "config", "libraryfolders.vdf"), "w") as f:
+        f.write("\n".join(library_folders) + "\n")
+
+    return {
+        "home": home,
+        "steam-root": steam_root,
+        "libraries": libraries,
+        "manifests": total,
+        "target-library": target_library
+    }
+
+
+class _FakeHomeLocator(LinuxSteamLocator):
+    # Only looks inside the fake home, never at $XDG_DATA_HOME, so a real Steam install cannot leak in.
+    def _candidate_roots(self) -> list:
+        return [os.path.join(self.home, trail) for trail in LINUX_STEAM_ROOTS]
+
+
+def _new_helper(home, index_file, location_file) -> steam_helper.SteamHelper:
+    return steam_helper.SteamHelper(
+        library_index=SteamLibraryIndex(index_file),
+        locator=_FakeHomeLocator(SteamLocationCache(location_file), home=home)
+    )
+
+
+def _wait_for_probes() -> None:
+    # First-match lookups return while the other library probes still run; let them finish so they are not counted
+    # against the next scenario.
+    for thread in threading.enumerate():
+        if thread.name.startswith("Probe-"):
+            thread.join()
+
+
+def _measure(function) -> tuple:
+    with _SyscallCounter() as counter:
+        started = time.perf_counter()
+        result = function()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+    return result, elapsed_ms, counter.counts
+
+
+def _run_scenarios(fake_steam: dict, state_dir) -> dict:
+    """
+    Runs each scenario once. Cold scenarios start without any location cache, library index or parsed VDF; warm
+    scenarios reuse what the previous scenarios persisted, as a second launch of the patcher would.
+    """
+    index_file = os.path.join(state_dir, "index.json")
+    location_file = os.path.join(state_dir, "locations.json")
+    home = fake_steam["home"]
+    expected = os.path.join(fake_steam["target-library"], steam_helper.STEAM_COMMON_FOLDER, TARGET_TITLE)
+
+    scenarios = (
+        ("libraries-cold", lambda helper: helper.get_steam_libraries(), True),
+        ("libraries-warm", lambda helper: helper.get_steam_libraries(), False),
+        ("by-name-cold", lambda helper: helper.get_game_install_path(TARGET_TITLE), True),
+        ("by-app-id-cold", lambda helper: helper.get_game_install_path(TARGET_TITLE, app_id=TARGET_APP_ID), True),
+        ("by-app-id-warm", lambda helper: helper.get_game_install_path(TARGET_TITLE, app_id=TARGET_APP_ID), False),
+    )
+
+    results = {}
+    for name, scenario, cold in scenarios:
+        if cold:
+            for state_file in (index_file, location_file):
+                if os.path.exists(state_file):
+                    os.remove(state_file)
+            clear_vdf_cache()
+
+        helper = _new_helper(home, index_file, location_file)
+        result, elapsed_ms, counts = _measure(lambda: scenario(helper))
+        _wait_for_probes()
+
+        if name.startswith("libraries"):
+            correct = bool(result) and len(result) == fake_steam["libraries"]
+        else:
+            correct = result == expected
+
+        results[name] = {"ms": elapsed_ms, "counts": counts, "correct": correct}
+
+    return results
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, target_position: float = 1.0, iterations: int = DEFAULT_ITERATIONS,
+                  work_dir=None) -> list:
+    """
+    Times SteamHelper library discovery and game lookups against synthetic Steam installs of each size.
+
+    :param sizes: [(libraries, manifests per library), ...]
+    :return: One dict per size: {"libraries", "manifests", "target-position", "scenarios": {name: {"min_ms",
+    "avg_ms", "opens", "listdirs", "stats", "correct"}}}
+    """
+    iterations = max(1, int(iterations))
+    report = []
+
+    for libraries, manifests in sizes:
+        with tempfile.TemporaryDirectory(prefix="scp-steam-bench-", dir=work_dir) as temp_dir:
+            home = os.path.join(temp_dir, "home")
+            state_dir = os.path.join(temp_dir, "state")
+            os.makedirs(state_dir)
+
+            logger.info(f"Building fake Steam install with {libraries} libraries of {manifests} manifests...")
+            fake_steam = build_fake_steam(home, libraries, manifests, target_position)
+
+            runs = [_run_scenarios(fake_steam, state_dir) for _ in range(iterations)]
+
+        scenarios = {}
+        for name in runs[0]:
+            timings = [run[name]["ms"] for run in runs]
+            counts = runs[-1][name]["counts"]
+            scenarios[name] = {
+                "min_ms": round(min(timings), 3),
+                "avg_ms": round(sum(timings) / len(timings), 3),
+                "opens": counts["open"],
+                "listdirs": counts["os.listdir"] + counts["os.scandir"],
+                "stats": counts["os.stat"],
+                "correct": all(run[name]["correct"] for run in runs)
+            }
+
+        report.append({
+            "libraries": fake_steam["libraries"],
+            "manifests": fake_steam["manifests"],
+            "target-position": target_position,
+            "scenarios": scenarios
+        })
+
+    return report
+
+
+def format_report(report: list) -> str:
+    lines = [f"{'size':>12} {'scenario':<16} {'min ms':>10} {'avg ms':>10} {'opens':>7} {'listdirs':>9} {'stats':>7}  ok"]
+
+    for entry in report:
+        size = f"{entry['libraries']}x{entry['manifests'] // entry['libraries']}"
+        for name, scenario in entry["scenarios"].items():
+            lines.append(f"{size:>12} {name:<16} {scenario['min_ms']:>10.3f} {scenario['avg_ms']:>10.3f} "
+                         f"{scenario['opens']:>7} {scenario['listdirs']:>9} {scenario['stats']:>7}  "
+                         f"{'yes' if scenario['correct'] else 'NO'}")
+
+    return "\n".join(lines)
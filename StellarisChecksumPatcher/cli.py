@@ -0,0 +1,440 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from utils.global_defines import debug_commands, LazySingleton
+
+# Subsystems are imported by the commands using them, so importing the CLI (as main.py does for every start) loads
+# none of them and creates no singleton.
+logger = LazySingleton("logger")
+
+
+def _new_patcher(args):
+    from hex_patchers.HexPatcher import StellarisChecksumPatcher
+
+    try:
+        return StellarisChecksumPatcher(profile=args.profile, build=args.build)
+    except ValueError as e:
+        logger.error(e)
+        return None
+
+
+def _export_patch(args) -> bool:
+    patcher = _new_patcher(args)
+    if patcher is None:
+        return False
+    if args.output_dir:
+        patcher.exe_out_directory = args.output_dir
+
+    if not patcher.load_file_hex(file_path=args.executable):
+        return False
+
+    if not patcher.patch():
+        return False
+
+    return bool(patcher.export_patch_file(args.patch_file))
+
+
+def _apply_patch(args) -> bool:
+    # The patch file holds its own edits, the profile only names the patched executable.
+    patcher = _new_patcher(args)
+    if patcher is None:
+        return False
+    if args.output_dir:
+        patcher.exe_out_directory = args.output_dir
+
+    return patcher.apply_patch_file(args.patch_file, args.executable)
+
+
+def _hexdump(args) -> bool:
+    from hex_patchers.hexdump import write_hexdump, windows_around
+
+    if args.offsets:
+        # Explicit offsets need no scan, only positioned reads around them.
+        if not os.path.isfile(args.executable):
+            logger.error(f"{args.executable} does not exist.")
+            return False
+        ranges = windows_around(args.offsets, args.radius, os.path.getsize(args.executable))
+        write_hexdump(args.executable, ranges, out=args.output)
+        return True
+
+    patcher = _new_patcher(args)
+    if patcher is None or not patcher.load_file_hex(file_path=args.executable):
+        return False
+
+    # The scan of probe() also stages the edits the dump shows next to the original bytes.
+    if patcher.probe()["state"] == "unknown":
+        logger.error("No signature match found.")
+        return False
+
+    patcher.write_hexdump(args.output, radius=args.radius)
+
+    return True
+
+
+def _serve(args) -> bool:
+    from service.patch_service import PatchService
+
+    return PatchService(socket_path=args.socket, max_workers=args.workers).serve_forever()
+
+
+def _submit(args) -> bool:
+    from service.patch_service import send_job
+
+    params = {"executable": args.executable, "output_dir": args.output_dir, "replace": args.replace,
+              "iterations": args.iterations}
+    params = {key: value for key, value in params.items() if value is not None}
+
+    try:
+        response = send_job(args.job, params, socket_path=args.socket, timeout=args.timeout)
+    except OSError as e:
+        logger.error(f"Unable to reach the patch service: {e}")
+        return False
+
+    print(json.dumps(response, indent=2))
+
+    return response.get("ok", False)
+
+
+def _parse_size(value) -> tuple:
+    libraries, _, manifests = value.lower().partition("x")
+    try:
+        return int(libraries), int(manifests)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected <libraries>x<manifests per library>, got {value}")
+
+
+def _bench_steam(args) -> bool:
+    from benchmarks import steam_discovery
+
+    report = steam_discovery.run_benchmark(sizes=args.sizes or steam_discovery.DEFAULT_SIZES,
+                                           target_position=args.position, iterations=args.iterations,
+                                           work_dir=args.work_dir)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(steam_discovery.format_report(report))
+
+    return all(scenario["correct"] for entry in report for scenario in entry["scenarios"].values())
+
+
+def _bench_startup(args) -> bool:
+    from benchmarks import startup
+
+    report = startup.run_benchmark(targets=args.targets, iterations=args.iterations)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(startup.format_report(report))
+
+    return len(report) == len(args.targets or startup.STARTUP_TARGETS)
+
+
+def _profiles(args) -> bool:
+    from hex_patchers.game_profiles import get_profile_registry
+    from hex_patchers.patch_rules import format_signature
+
+    profiles = get_profile_registry().all()
+
+    if args.json:
+        print(json.dumps([{
+            "profile_id": profile.profile_id,
+            "title": profile.title,
+            "steam_app_id": profile.steam_app_id,
+            "executables": profile.executables,
+            "default_build": profile.default_build,
+            "builds": {build: [{"rule_id": rule.rule_id, "signature": format_signature(rule.signature)}
+                               for rule in rules] for build, rules in profile.builds.items()},
+            "source": profile.source,
+        } for profile in profiles], indent=2))
+    else:
+        for profile in profiles:
+            print(f"{profile.profile_id}: {profile.title} (app {profile.steam_app_id}) "
+                  f"{', '.join(profile.executable_names())} - {profile.source}")
+            for build, rules in profile.builds.items():
+                default = " (default)" if build == profile.default_build else ""
+                print(f"  {build}{default}: {', '.join(rule.rule_id for rule in rules)}")
+
+    return bool(profiles)
+
+
+def _known_builds(args) -> bool:
+    from utils.global_defines import known_builds
+
+    if args.action == "list":
+        for entry in known_builds.all():
+            print(f"{entry['sha256']} {entry['size']:>12} {entry['profile_id'] or '-'}/{entry['build'] or '-'} "
+                  f"{len(entry['edits'])} edit(s) at {entry['offset']} ({entry['origin']}, {entry['hits']} hit(s))")
+        return True
+
+    if not args.file:
+        logger.error(f"known-builds {args.action} needs a file.")
+        return False
+
+    if args.action == "export":
+        known_builds.export_file(args.file)
+        return True
+
+    try:
+        return known_builds.import_file(args.file) > 0
+    except (OSError, ValueError) as e:
+        logger.error(f"Unable to import {args.file}: {e}")
+        return False
+
+
+def _derive_signature(args) -> bool:
+    from hex_patchers.game_profiles import get_profile_registry
+    from hex_patchers.patch_rules import PatchEdit
+    from hex_patchers.signature_derivation import derive_signature, locate_site, format_report
+
+    if bool(args.old) != bool(args.new):
+        logger.error("Pass both --old and --new, or neither to use the edit of the profile.")
+        return False
+
+    site = args.site
+    if site is None or not args.old:
+        profile = get_profile_registry().get(args.profile)
+        if profile is None:
+            logger.error(f"Unknown game profile: {args.profile}")
+            return False
+
+        try:
+            located = locate_site(args.reference, profile.rules(args.build))
+        except ValueError as e:
+            logger.error(e)
+            return False
+        if located is None:
+            logger.error(f"No unpatched match of {args.profile} in {args.reference}. Pass --site, --old and --new.")
+            return False
+        site = located[0] if site is None else site
+        old, new = located[1].old, located[1].new
+
+    if args.old:
+        try:
+            edit = PatchEdit(0, args.old.replace(" ", ""), args.new.replace(" ", ""))
+        except ValueError as e:
+            logger.error(f"Invalid edit bytes: {e}")
+            return False
+        old, new = edit.old, edit.new
+
+    result = derive_signature(args.reference, site, old, new, sample_paths=args.samples,
+                              max_radius=args.radius, rule_id=args.rule_id)
+
+    if args.json:
+        print(json.dumps(result if "error" in result else result["rule"], indent=2))
+    else:
+        print(format_report(result))
+
+    return "error" not in result and result["verified"]
+
+
+def _ngram_index(args) -> bool:
+    from hex_patchers.ngram_index import NgramIndex, build_index
+
+    if args.action == "build":
+        try:
+            build_index(args.executable, args.index, stride=args.stride)
+        except (OSError, ValueError) as e:
+            logger.error(f"Unable to index {args.executable}: {e}")
+            return False
+        return True
+
+    index = NgramIndex(args.executable, args.index)
+    if not index.open(stride=args.stride):
+        return False
+
+    try:
+        if args.action == "info":
+            print(json.dumps(index.info(), indent=2))
+            return True
+
+        # Without signatures, answer one signature per line of stdin until EOF.
+        signatures = args.signatures or (line.strip() for line in sys.stdin)
+        for signature in signatures:
+            if not signature:
+                continue
+            started = time.perf_counter()
+            try:
+                offsets = index.find(signature, limit=args.limit)
+            except ValueError as e:
+                logger.error(f"Invalid signature {signature}: {e}")
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+
+            if args.json:
+                print(json.dumps({"signature": signature, "offsets": offsets, "ms": round(elapsed, 3)}))
+            else:
+                print(f"{len(offsets)} match(es) in {elapsed:.2f} ms: {signature}")
+                for offset in offsets:
+                    print(f"  {offset:>12}  0x{offset:08X}")
+    finally:
+        index.close()
+
+    return True
+
+
+def _update(args) -> bool:
+    from utils.global_defines import updater
+    from hex_patchers.HexPatcher import StellarisChecksumPatcher
+
+    if args.url:
+        updater.url = args.url
+    updater.local_version = ".".join(str(v) for v in StellarisChecksumPatcher.APP_VERSION)[2:]
+
+    is_new_version = updater.check_for_update(force=args.force)
+    if not args.download:
+        return True
+
+    if not is_new_version and not args.force:
+        return True
+
+    return updater.download_update(destination=args.output) is not None
+
+
+COMMANDS = {
+    "export-patch": _export_patch,
+    "apply-patch": _apply_patch,
+    "hexdump": _hexdump,
+    "serve": _serve,
+    "submit": _submit,
+    "bench-steam": _bench_steam,
+    "bench-startup": _bench_startup,
+    "derive-signature": _derive_signature,
+    "ngram-index": _ngram_index,
+    "update": _update,
+    "profiles": _profiles,
+    "known-builds": _known_builds,
+}
+
+
+def _add_profile_arguments(parser) -> None:
+    from hex_patchers.game_profiles import DEFAULT_PROFILE_ID
+
+    parser.add_argument("--profile", default=DEFAULT_PROFILE_ID, help="Game profile ID. See the profiles command.")
+    parser.add_argument("--build", default=None, help="Build of the profile to use the signatures of.")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from benchmarks import steam_discovery, startup
+    from hex_patchers.ngram_index import DEFAULT_STRIDE, INDEX_STRIDES
+    from hex_patchers.signature_derivation import DEFAULT_MAX_RADIUS
+    from service.patch_service import DEFAULT_WORKERS
+
+    parser = argparse.ArgumentParser(prog="StellarisChecksumPatcher",
+                                     description="Headless Stellaris Checksum Patcher commands.")
+    parser.add_argument("-d", "-debug", dest="debug", action="store_true", help="Enable debug logging.")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export-patch", help="Patch an executable and export a portable patch file.")
+    export_parser.add_argument("executable", help="Path to the unpatched game executable.")
+    export_parser.add_argument("-p", "--patch-file", default=None, help="Where to write the patch file.")
+    export_parser.add_argument("-o", "--output-dir", default=None, help="Where to write the patched executable.")
+    _add_profile_arguments(export_parser)
+
+    apply_parser = subparsers.add_parser("apply-patch", help="Apply a patch file to a known build without scanning.")
+    apply_parser.add_argument("patch_file", help="Patch file exported with export-patch.")
+    apply_parser.add_argument("executable", help="Path to the unpatched game executable.")
+    apply_parser.add_argument("-o", "--output-dir", default=None, help="Where to write the patched executable.")
+    _add_profile_arguments(apply_parser)
+
+    hexdump_parser = subparsers.add_parser("hexdump", help="Dump original and patched bytes around each match.")
+    hexdump_parser.add_argument("executable", help="Path to the game executable.")
+    hexdump_parser.add_argument("-r", "--radius", type=int, default=512, help="Bytes to dump on each side of a match.")
+    hexdump_parser.add_argument("--offset", dest="offsets", type=lambda value: int(value, 0), action="append",
+                                help="Dump around this offset instead of scanning. Can be repeated.")
+    hexdump_parser.add_argument("-o", "--output", default=None, help="Write the dump to a file instead of stdout.")
+    _add_profile_arguments(hexdump_parser)
+
+    serve_parser = subparsers.add_parser("serve", help="Run the patch service on a Unix domain socket.")
+    serve_parser.add_argument("--socket", default=None, help="Socket path. Defaults to the config folder.")
+    serve_parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="Number of job workers.")
+
+    submit_parser = subparsers.add_parser("submit", help="Send a job to a running patch service.")
+    submit_parser.add_argument("job", choices=["patch", "probe", "revert", "benchmark", "status"])
+    submit_parser.add_argument("executable", nargs="?", default=None,
+                               help="Game executable. Defaults to the Steam installation.")
+    submit_parser.add_argument("-o", "--output-dir", default=None, help="Where to write the patched executable.")
+    submit_parser.add_argument("--replace", action="store_true", default=None,
+                               help="Replace the original executable, keeping a .orig backup.")
+    submit_parser.add_argument("-n", "--iterations", type=int, default=None, help="Benchmark iterations.")
+    submit_parser.add_argument("--socket", default=None, help="Socket path. Defaults to the config folder.")
+    submit_parser.add_argument("--timeout", type=float, default=None, help="Seconds to wait for the response.")
+
+    bench_parser = subparsers.add_parser("bench-steam", help="Benchmark Steam discovery on synthetic libraries.")
+    bench_parser.add_argument("--size", dest="sizes", type=_parse_size, action="append",
+                              help="<libraries>x<manifests per library>, e.g. 10x1000. Can be repeated.")
+    bench_parser.add_argument("--position", type=float, default=1.0,
+                              help="Position of the game among all manifests, from 0.0 (first) to 1.0 (last).")
+    bench_parser.add_argument("-n", "--iterations", type=int, default=steam_discovery.DEFAULT_ITERATIONS,
+                              help="Runs per size.")
+    bench_parser.add_argument("--work-dir", default=None, help="Where to build the fake installs. Defaults to temp.")
+    bench_parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    startup_parser = subparsers.add_parser("bench-startup", help="Measure import time and peak RSS of each startup path.")
+    startup_parser.add_argument("--path", dest="targets", action="append", choices=list(startup.STARTUP_TARGETS),
+                                help="Startup path to measure. Can be repeated. Defaults to all.")
+    startup_parser.add_argument("-n", "--iterations", type=int, default=startup.DEFAULT_ITERATIONS,
+                                help="Fresh interpreters per path.")
+    startup_parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    derive_parser = subparsers.add_parser("derive-signature",
+                                          help="Derive the shortest signature matching a patch site in every build.")
+    derive_parser.add_argument("reference", help="Unpatched executable whose patch site is known.")
+    derive_parser.add_argument("samples", nargs="*", help="Other unpatched builds the signature must match once in.")
+    derive_parser.add_argument("--site", type=lambda value: int(value, 0), default=None,
+                               help="Offset of the edit in the reference. Defaults to the match of the profile.")
+    derive_parser.add_argument("--old", default=None, help="Original bytes at the site, in hex.")
+    derive_parser.add_argument("--new", default=None, help="Patched bytes at the site, in hex.")
+    derive_parser.add_argument("-r", "--radius", type=int, default=DEFAULT_MAX_RADIUS,
+                               help="Maximum bytes of context on each side of the site.")
+    derive_parser.add_argument("--rule-id", default="checksum", help="Rule ID of the printed rule.")
+    derive_parser.add_argument("--json", action="store_true", help="Print the rule as profile JSON.")
+    _add_profile_arguments(derive_parser)
+
+    index_parser = subparsers.add_parser("ngram-index",
+                                         help="Build a gram index of an executable and query signatures against it.")
+    index_parser.add_argument("action", choices=["build", "query", "info"])
+    index_parser.add_argument("executable", help="Path to the executable.")
+    index_parser.add_argument("signatures", nargs="*",
+                              help="Signatures to query, e.g. \"48 8B 12 ?? 85 C0\". Read from stdin if omitted.")
+    index_parser.add_argument("--stride", type=int, choices=INDEX_STRIDES, default=DEFAULT_STRIDE,
+                              help="Index the gram at every stride-th offset. 1 answers any signature with 4 fixed "
+                                   "bytes in a row, at 4 times the size and build time.")
+    index_parser.add_argument("--index", default=None, help="Index file. Defaults to the config folder.")
+    index_parser.add_argument("-n", "--limit", type=int, default=None, help="Maximum matches per signature.")
+    index_parser.add_argument("--json", action="store_true", help="Print one JSON line per signature.")
+
+    update_parser = subparsers.add_parser("update", help="Check for a new release and optionally download it.")
+    update_parser.add_argument("--download", action="store_true", help="Download the release asset if newer.")
+    update_parser.add_argument("-o", "--output", default=None, help="Where to save the downloaded asset.")
+    update_parser.add_argument("-f", "--force", action="store_true",
+                               help="Ignore the cached release info, and download even if not newer.")
+    update_parser.add_argument("--url", default=None, help="Release API URL. Defaults to the GitHub repository.")
+
+    profiles_parser = subparsers.add_parser("profiles", help="List the loaded game profiles and their builds.")
+    profiles_parser.add_argument("--json", action="store_true", help="Print the profiles as JSON.")
+
+    builds_parser = subparsers.add_parser("known-builds", help="List, import or export the known builds database.")
+    builds_parser.add_argument("action", choices=["list", "import", "export"])
+    builds_parser.add_argument("file", nargs="?", default=None, help="Known builds file to import or export.")
+
+    return parser
+
+
+def is_cli_invocation(argv) -> bool:
+    args = [arg for arg in argv if str(arg).lower() not in debug_commands]
+    return bool(args) and args[0] in COMMANDS
+
+
+def run(argv) -> int:
+    args = build_parser().parse_args(argv)
+
+    logger.debug(f"Running command {args.command}")
+    success = COMMANDS[args.command](args)
+
+    return 0 if success else 1
@@ -1,4 +1,12 @@
+import hashlib
+
 from . import *
+from .patch_file import PatchFile, PATCH_FILE_EXTENSION, fingerprint_file, pread, pwrite
+from .concurrency import FileLock
+from .hexdump import write_hexdump, windows_around, merge_ranges
+from .patch_rules import PatchRule, PatchEdit, PatchTransaction, WILDCARD, MATCH_APPLIED, MATCH_CONFLICT, MATCH_PENDING
+from .progress import CancellationToken, ProgressReporter, PatchCancelled, BLOCK_SIZE
+from .game_profiles import GameProfile, get_profile_registry, DEFAULT_PROFILE_ID
 
 def get_current_dir():
     if getattr(sys, "frozen", False):
@@ -11,34 +19,57 @@ def get_current_dir():
 class StellarisChecksumPatcher:
     APP_VERSION = ["r", 1, 0, 6]
     
-    def __init__(self, dev=is_debug) -> None:
-        self.hex_data_list = [] # Incoming original Hex data, so we can always have a copy of the original.
-        self._hex_data_list_working = [] # Copy of original that will be taking the changes and be modified.
+    def __init__(self, dev=is_debug, steam=None, patch_rules=None, store=None, profile=None, build=None,
+                 builds_db=None) -> None:
+        """
+        :param profile: GameProfile, or the ID of a loaded one. Defaults to Stellaris.
+        :param build: Build of the profile whose patch rules to use. Defaults to the profile's default build.
+        :raises ValueError: If the profile or the build does not exist.
+        :param builds_db: KnownBuilds to patch known executables from without scanning. Defaults to the shared one.
+        """
+        self.file_data = b"" # Incoming original file data, so we can always have a copy of the original.
+        self._transaction = PatchTransaction() # Edits staged against file_data, written out in a single pass.
 
         self._dev = dev
         
         self.data_loaded = False
 
         self._manual_install_dir = ""
-        
-        self._chunk_char_len = 32 # Each line is comprised of 32 characters. Will need this to recompile from changed chunks back to binary
-        
-        self._hex_begin_static = ["48", "8B", "12"] # The Hex block begins with these values, so we can reference them.
-        self._hex_end_static = ["85", "C0"] # The predicted end Hex values of the block.
-        self._hex_end_change_to = ["33", "C0"] # Change the target ending Hexes of the block to this
-        self._hex_wildcards_in_between = 14 # Up to 14 possible values to reach the predicted target end Hex
+
+        # Title, executable names and signatures all come from the game profile data files.
+        if not isinstance(profile, GameProfile):
+            profile_id = profile or DEFAULT_PROFILE_ID
+            profile = get_profile_registry().get(profile_id)
+            if profile is None:
+                raise ValueError(f"No valid game profile {profile_id}.")
+        self.profile = profile
+
+        # Rules applied by patch(). Every rule may describe several edits and several matches.
+        profile_rules = self.profile.rules(build) # Validates build even when patch_rules are given.
+        self.patch_rules = patch_rules or profile_rules
+        self.build = build or self.profile.default_build
+        # Without a build or rules, the build is picked from the hash of each executable, see _select_build.
+        self._auto_build = not build and not patch_rules
         
         self._checksum_block = []
         self._checksum_offset_start = 0
         self._checksum_offset_end = 0
+        self._match_offsets = [] # Offsets of every rule match of the last scan.
+        self._matched_rule_ids = [] # Ids of the rules that matched in the last scan.
+
+        self._loaded_file_path = "" # Path of the executable currently loaded.
         
-        self.title_name = "Stellaris" # Steam title name
-        self.exe_default_filename = "stellaris.exe" # Game executable name plus extension
+        self.title_name = self.profile.title # Steam title name
+        self.steam_app_id = self.profile.steam_app_id # Steam App Id, allows opening the app manifest directly
+        self.exe_default_filename = self.profile.executable_name() # Game executable name plus extension
         self.exe_out_directory = os.path.abspath(get_current_dir()) # Where to place the patched executable.
-        self.exe_modified_filename = "stellaris-patched" # Name of modified executable
+        self.exe_modified_filename = self.profile.patched_filename # Name of modified executable
         self.is_patched = False
         
-        self._steam = steam_helper.SteamHelper()
+        self._steam = steam or steam_helper.SteamHelper()
+        self._store = store or LazySingleton("install_store") # Per-install records of previous runs.
+        # Edits of every build patched before, keyed by content hash.
+        self._known_builds = builds_db or LazySingleton("known_builds")
 
         if self._dev: # Change certain values if running from executable or IDE/Console. Development purposes.
             self.exe_out_directory = os.path.abspath(os.path.join(get_current_dir(), os.pardir))
@@ -51,8 +82,8 @@ class StellarisChecksumPatcher:
     def _generate_missing_paths(dir_path) -> None:
         if not os.path.exists(dir_path):
             os.makedirs(dir_path)
-            
-    def compile_hex_file(self, directory=None, filename=None):
+
+    def compile_hex_file(self, directory=None, filename=None, token=None, progress=None):
         if not directory:
             directory = self.exe_out_directory
         else:
@@ -69,157 +100,286 @@ class StellarisChecksumPatcher:
             self._generate_missing_paths(directory)
         else:
             self._generate_missing_paths(get_current_dir())
-            
-        with open(dest, "wb") as out:
-            for line in self._hex_data_list_working:
-                chunk = binascii.unhexlify(str(line).rstrip())
-                out.write(chunk)
-            logger.info(f"Writing {filename}.exe to: {directory}")
+
+        write_progress = ProgressReporter("write", len(self.file_data), progress, token)
+        if not self._transaction.write(self.file_data, dest, checkpoint=write_progress.update):
+            return False
+        write_progress.finish()
+        logger.info(f"Writing {filename}.exe to: {directory}")
             
         return True
-            
-    def _convert_to_two_space(self, condense_chunks=False) -> list:
-        # https://stackoverflow.com/a/10070449
-        
-        """
-        Convert current loaded hex chunk to a list of two elements per item: From "XXXXXXXX" to ["XX", "XX", "XX", "XX", ..]
-        
-        This will output a list of lists [["XX", "XX", "XX", "XX", ..], ["XX", "XX", "XX", "XX", ..], ...]
 
-        Condensing chunks joins all chunk lists into a single chunk list. From [["XX", "XX", "XX", "XX", ..], ["XX", "XX", "XX", "XX", ..], ...] to ["XX", "XX", "XX", "XX", "XX", "XX", "XX", "XX", ..]
+    def _acquire_checksum_block(self, token=None, progress=None) -> bool:
+        """
+        Scans the loaded data with every patch rule and stages the edits of all pending matches.
         """
-        
-        logger.debug("Formatting hexadecimal data to working set...")
-        
-        formatted_hex_data_list = []
-        
-        for chunk in self.hex_data_list:
-            converted = " ".join(chunk[i:i+2] for i in range(0,len(chunk),2))
-            formatted_hex_data_list.append(converted)
-            
-        if condense_chunks:
-            logger.debug("Condensing chunks...") # Here we take the list of chunks [["XX", "XX", "XX",..], ["XX", "XX", "XX", "XX",..]] and turn all into a single chunk -> ["XX, XX, XX, XX, XX,.."]
-            self._hex_data_list_working.append(" ".join(formatted_hex_data_list))
-        else:
-            self._hex_data_list_working = formatted_hex_data_list
-        
-        return self._hex_data_list_working
-    
-    def _convert_hex_list_to_writable_chunk_list(self, hex_chunk_set: list) -> list:
-        out_list = []
-        
-        tmp_chunk = []
-        hex_iter = 0
-        for hex_char in hex_chunk_set:
-            if hex_iter < self._chunk_char_len/2:
-                tmp_chunk.append(hex_char)
-            else:
-                out_list.append("".join(tmp_chunk))
-                tmp_chunk.clear()
-                hex_iter = 0
-                tmp_chunk .append(hex_char)
-                
-            hex_iter += 1
-        
-        return out_list
-            
-    def _acquire_checksum_block(self) -> bool:
         logger.info("Acquiring Checksum Block...")
-        
-        working_set_hex = self._convert_to_two_space(condense_chunks=True)
-        
+
         potential_candidate = False
-        
-        for chunk in working_set_hex:
-            chunk_split = chunk.split(" ")
-            # logger.log_debug(f"Chunk: {chunk}")
-            # logger.log_debug(f"Chunk Split: {chunk_split}")
-            for index, hex_char in enumerate(chunk_split):
-                # CHECK FOR START SEQUENCE
-                if hex_char in self._hex_begin_static and hex_char == self._hex_begin_static[0]:
-                    # logger.log_debug(f"Found matching starting hex <{hex_char}> at index {index}")
-                    start_candidate = []
-                    start_sequence_len = len(self._hex_begin_static)
-                    
-                    for i in range(start_sequence_len):
-                        start_candidate.append(chunk_split[index+i])
-                    if start_candidate == self._hex_begin_static:
-                        # logger.log_debug(f"Found potential start candidate: {start_candidate} starting from {index}")
-                        
-                        # CHECK FOR END SEQUENCE AFTER X WILDCARDS IN BETWEEN
-                        # logger.log_debug("Checking for end sequence")
-                        end_sequence_candidate = []
-                        end_sequence_len = len(self._hex_end_static)
-                        
-                        # [start_index_chars, start_index_chars+1, start_index_chars+2, ??, ??, ??, ??, ??, ??, ??, ??, ??, ??, ??, ??, ??, ??, end_hex_char, end_hex_char+1]
-                        # [48, 8B, 12, ??, ??, ??, ??, ??, ??, ??, ??, ??, ??, ??, ??, ??, ??, 85, C0]
-                        search_offset_start = index + start_sequence_len + self._hex_wildcards_in_between
-                        # logger.log_debug(f"Search Offset Start {search_offset_start}")
-                        for end_candidate in chunk_split[search_offset_start:search_offset_start + end_sequence_len]:
-                            end_sequence_candidate.append(end_candidate)
-                        
-                        # logger.log_debug(f"End Candidate: {end_sequence_candidate}")
-                        
-                        if end_sequence_candidate == self._hex_end_static:
-                            logger.debug(f"Found potential start candidate: {start_candidate} starting from {index}")
-                            logger.debug(f"Found potential end candidate: {end_sequence_candidate} ending at index {search_offset_start + end_sequence_len}")
-                            logger.debug(f"Search Offset Start: {search_offset_start - index}")
-                            self._checksum_block = [hex_chunk for hex_chunk in chunk_split[index:search_offset_start + end_sequence_len]]
-                            self._checksum_offset_start = index
-                            self._checksum_offset_end = search_offset_start + end_sequence_len
-                            logger.info(f"Found potential matching sequence.")
-                            logger.debug(f"({index}) {''.join(self._checksum_block)} ({search_offset_start + self._checksum_offset_end})")
-                            potential_candidate = True
-                            break
-                        elif end_sequence_candidate == self._hex_end_change_to:
-                            logger.debug(f"Found potential start candidate: {start_candidate} starting from {index}")
-                            logger.debug(f"Found potential patched end candidate: {end_sequence_candidate} ending at index {search_offset_start + end_sequence_len}")
-                            # logger.log("Current executable is already patched and will not be touched further.")
-                            self.is_patched = True
-                            return False
-        
+
+        size = len(self.file_data)
+        scan_progress = ProgressReporter("scan", size * len(self.patch_rules), progress, token)
+
+        for index, rule in enumerate(self.patch_rules):
+            matches = rule.find_matches(self.file_data,
+                                        checkpoint=lambda scanned, base=index * size: scan_progress.update(base + scanned))
+            logger.debug("[%s] %d match(es): %s", rule.rule_id, len(matches), matches)
+            self._match_offsets.extend(match_offset for match_offset, _ in matches)
+
+            if not matches:
+                continue
+
+            self._matched_rule_ids.append(rule.rule_id)
+
+            if all(state == MATCH_APPLIED for _, state in matches):
+                logger.debug("[%s] Found already patched sequence at %d", rule.rule_id, matches[0][0])
+                self.is_patched = True
+                continue
+
+            for match_offset, state in matches:
+                if state == MATCH_CONFLICT:
+                    logger.error(f"[{rule.rule_id}] Match at {match_offset} holds unexpected bytes.")
+                    self._transaction.clear()
+                    return False
+                if state == MATCH_PENDING:
+                    self._transaction.stage_match(rule, match_offset)
+
+            if rule is self.patch_rules[0]:
+                match_offset = matches[0][0]
+                self._checksum_offset_start = match_offset
+                self._checksum_offset_end = match_offset + len(rule.signature)
+                self._checksum_block = [f"{value:02X}" for value in
+                                        self.file_data[self._checksum_offset_start:self._checksum_offset_end]]
+                logger.debug("(%d) %s (%d)", self._checksum_offset_start, "".join(self._checksum_block),
+                             self._checksum_offset_end)
+
+            logger.info(f"Found potential matching sequence.")
+            potential_candidate = True
+
+        scan_progress.finish()
+
         if potential_candidate:
+            # Only report as patched when every rule is already applied.
+            self.is_patched = False
             return True
         
         return False
 
     def _modify_checksum(self):
+        """
+        Validates every staged edit together. Nothing is written here; compile_hex_file applies the edits in one pass.
+        """
         logger.info("Patching Block...")
-        if not self._checksum_block:
+        if not self._transaction:
             return False
-        
-        checksum_block_modified = []
-        for enum, hex_char in enumerate(self._checksum_block):
-            if enum >= len(self._checksum_block) - len(self._hex_end_change_to):
-                checksum_block_modified.extend(self._hex_end_change_to)
-                break
-            else:
-                checksum_block_modified.append(hex_char)
-                
-        logger.debug(f"Original Block:  {''.join(self._checksum_block)}")
-        logger.debug(f"Modified Block: {''.join(checksum_block_modified)}")
 
-        if not self._hex_data_list_working:
-            return False
-        chunk_split = []
-        for chunk in self._hex_data_list_working:
-            chunk_split = chunk.split(" ")
-            for offset, modify_hex in enumerate(checksum_block_modified):
-                chunk_split[self._checksum_offset_start+offset] = modify_hex
+        for offset, old, new in self._transaction.edits:
+            logger.debug(lambda offset=offset, old=old, new=new:
+                         f"({offset}) Original: {old.hex().upper()} Modified: {new.hex().upper()}")
+
+        return self._transaction.validate(self.file_data)
     
-        self._hex_data_list_working = self._convert_hex_list_to_writable_chunk_list(chunk_split)
-        
+    def _record_install(self, file_path, result: dict, timings: dict, sha256=None) -> None:
+        """
+        Stores what this run learned about file_path. The record describes the file now on disk, which is the patched
+        executable if it was replaced.
+
+        :param sha256: Hash of the file now on disk, if this run already computed it. Hashed otherwise.
+        """
+        is_patched = result.get("already_patched") or result.get("replaced")
+        backup_file = f"{file_path}.orig"
+
+        if sha256 is None:
+            sha256 = (fingerprint_file(file_path) or {}).get("sha256")
+        self._store.record(
+            file_path,
+            sha256=sha256,
+            signature_id=self._matched_rule_ids[0] if self._matched_rule_ids else None,
+            offset=self._checksum_offset_start if self._matched_rule_ids else None,
+            patched=bool(is_patched),
+            backup=backup_file if os.path.exists(backup_file) else None,
+            timings=timings
+        )
+
+    def _source_sha256(self, file_path) -> Union[str, None]:
+        """
+        sha256 of file_path, from its install store record while that is current, otherwise hashed (and cached).
+        """
+        record = self._store.get(file_path)
+        if record.get("sha256") and self._store.is_current(record):
+            return record["sha256"]
+
+        fingerprint = fingerprint_file(file_path)
+        return fingerprint.get("sha256") if fingerprint else None
+
+    def _use_known_build(self, file_path, entry: dict) -> None:
+        """
+        Stages the edits of a known build as if a scan had found them.
+        """
+        signature_id = entry.get("signature_id") or "known-build"
+        for offset, old, new in entry["edits"]:
+            self._transaction.stage(offset, old, new, signature_id)
+
+        self._matched_rule_ids.append(signature_id)
+        self._match_offsets.append(entry.get("offset") or entry["edits"][0][0])
+        self._checksum_offset_start = self._match_offsets[-1]
+        self._loaded_file_path = file_path
+        logger.info(f"Known build {entry['sha256'][:12]}, patching without scanning.")
+
+    def _select_build(self, sha256) -> None:
+        """
+        Switches to the profile build listing sha256 among its hashes, or back to the default build.
+        """
+        if not self._auto_build:
+            return
+
+        build = self.profile.build_for_hash(sha256) or self.profile.default_build
+        if build != self.build:
+            logger.info(f"Using the signatures of {self.title_name} build {build}.")
+            self.build = build
+            self.patch_rules = self.profile.rules(build)
+
+    def _acquire_known_build(self) -> bool:
+        """
+        Stages the edits of the known build matching the loaded data, verified against it. Sets is_patched if the
+        loaded data is a known patched build. Selects the profile build of the loaded data first.
+        """
+        sha256 = self._source_sha256(self._loaded_file_path)
+        self._select_build(sha256)
+
+        entry = self._known_builds.get(sha256)
+        if not entry or not self._is_profile_build(entry):
+            if self._known_builds.find_patched(sha256):
+                self.is_patched = True
+            return False
+
+        for offset, old, new in entry["edits"]:
+            if bytes(self.file_data[offset:offset + len(old)]) != old:
+                logger.debug("Known build %s does not hold the expected bytes at %d.", sha256, offset)
+                return False
+
+        self._known_builds.hit(sha256)
+        self._use_known_build(self._loaded_file_path, entry)
+
         return True
-    
+
+    def _is_profile_build(self, entry: dict) -> bool:
+        return not entry.get("profile_id") or entry["profile_id"] == self.profile.profile_id
+
+    def _known_build_candidates(self, file_path) -> list:
+        """
+        Known builds of this profile with the size of file_path whose edit sites hold their original or their patched
+        bytes, as [(entry, MATCH_PENDING or MATCH_APPLIED), ...]. Uses positioned reads only, nothing is hashed.
+        """
+        try:
+            size = os.path.getsize(file_path)
+            candidates = []
+            with open(file_path, "rb") as f:
+                for entry in self._known_builds.find_by_size(size):
+                    if not self._is_profile_build(entry):
+                        continue
+                    current = [pread(f.fileno(), len(old), offset) for offset, old, _ in entry["edits"]]
+                    if current == [old for _, old, _ in entry["edits"]]:
+                        candidates.append((entry, MATCH_PENDING))
+                    elif current == [new for _, _, new in entry["edits"]]:
+                        candidates.append((entry, MATCH_APPLIED))
+        except OSError as e:
+            logger.debug_error(e)
+            return []
+
+        return candidates
+
+    def _patch_known_build(self, file_path, entry: dict, token=None, progress=None) -> Union[dict, None]:
+        """
+        Writes the patched executable of a known build in a single pass: file_path is copied block by block with the
+        edits applied, hashing the original and the patched bytes on the way. The copy only becomes the patched
+        executable if both hashes are the ones of the known build.
+
+        :return: {"source": fingerprint, "target": fingerprint} of the original and the patched file, or None.
+        """
+        self._generate_missing_paths(self.exe_out_directory)
+        dest = self.get_patched_file_path()
+        tmp_dest = f"{dest}.tmp"
+
+        source_sha = hashlib.sha256()
+        target_sha = hashlib.sha256()
+        reporter = ProgressReporter("write", entry["size"], progress, token)
+        try:
+            with open(file_path, "rb") as src, open(tmp_dest, "wb") as out:
+                position = 0
+                while True:
+                    block = src.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    source_sha.update(block)
+
+                    end = position + len(block)
+                    for offset, old, new in entry["edits"]:
+                        if offset < end and offset + len(new) > position:
+                            block = bytearray(block)
+                            start, stop = max(offset, position), min(offset + len(new), end)
+                            block[start - position:stop - position] = new[start - offset:stop - offset]
+
+                    target_sha.update(block)
+                    out.write(block)
+                    position = end
+                    reporter.update(position)
+
+            fingerprints = {"source": {"size": position, "sha256": source_sha.hexdigest()},
+                            "target": {"size": position, "sha256": target_sha.hexdigest()}}
+            if fingerprints["source"]["sha256"] != entry["sha256"]:
+                logger.debug("%s is not known build %s.", file_path, entry["sha256"])
+                os.remove(tmp_dest)
+                return None
+            if entry.get("patched_sha256") and fingerprints["target"]["sha256"] != entry["patched_sha256"]:
+                logger.error(f"Patched copy of known build {entry['sha256'][:12]} does not have the expected hash.")
+                os.remove(tmp_dest)
+                return None
+
+            os.replace(tmp_dest, dest)
+        except (OSError, PatchCancelled) as e:
+            if os.path.exists(tmp_dest):
+                os.remove(tmp_dest)
+            if isinstance(e, PatchCancelled):
+                raise
+            logger.error(f"Unable to write {dest}.")
+            logger.debug_error(e)
+            return None
+
+        reporter.finish()
+        self._known_builds.hit(entry["sha256"])
+        self._use_known_build(file_path, entry)
+        logger.info(f"Writing {self.exe_modified_filename}.exe to: {self.exe_out_directory}")
+
+        return fingerprints
+
+    def _learn_known_build(self) -> None:
+        """
+        Remembers the edits found by the last scan under the hash of the loaded file.
+        """
+        source = fingerprint_file(self._loaded_file_path)
+        target = fingerprint_file(self.get_patched_file_path())
+        if not source or not target:
+            return
+
+        self._known_builds.record(source["sha256"], source["size"], self._transaction.edits,
+                                  patched_sha256=target["sha256"], profile_id=self.profile.profile_id,
+                                  build=self.build,
+                                  signature_id=self._matched_rule_ids[0] if self._matched_rule_ids else None,
+                                  offset=self._checksum_offset_start if self._matched_rule_ids else None)
+        logger.debug("Added known build %s", source["sha256"])
+
     # ===============================================
     # ============== Regular Functions ==============
     # ===============================================
         
     def clear_caches(self):
-        self._hex_data_list_working.clear()
+        self._transaction.clear()
         self._checksum_block.clear()
         self._checksum_offset_start = 0
         self._checksum_offset_end = 0
+        self._match_offsets.clear()
+        self._matched_rule_ids.clear()
         self.is_patched = False
         
     def locate_game_install(self) -> Union[str, None]:
@@ -227,20 +387,29 @@ class StellarisChecksumPatcher:
         Returns path to game executable.
         """
         logger.info("Locating game install...")
-        stellaris_install_path = self._steam.get_game_install_path(self.title_name)
+        stellaris_install_path = self._steam.get_game_install_path(self.title_name, app_id=self.steam_app_id)
         
         if stellaris_install_path:
-            game_executable = os.path.join(stellaris_install_path, self.exe_default_filename)
-            if not os.path.exists(game_executable):
-                return None
-            return game_executable
+            # Executable names of this platform, in order of preference.
+            for exe_filename in self.profile.executable_names():
+                game_executable = os.path.join(stellaris_install_path, exe_filename)
+                if os.path.exists(game_executable):
+                    return game_executable
         
         return None
     
-    def load_file_hex(self, file_path=None) -> bool:
+    def load_file_hex(self, file_path=None, token=None, progress=None) -> bool:
+        """
+        Reads file_path into memory one block at a time.
+
+        :param token: CancellationToken checked between blocks.
+        :param progress: Called as progress("load", bytes_read, file_size), throttled.
+        :raises PatchCancelled: When token is cancelled. Nothing stays loaded.
+        """
         logger.info("Loading file Hex.")
         
-        file_path = str(file_path).replace('/', '\\')
+        if file_path:
+            file_path = os.path.normpath(str(file_path))
         
         if not file_path:
             file_path = os.path.join(self._base_dir, self.exe_default_filename)
@@ -249,43 +418,334 @@ class StellarisChecksumPatcher:
                 logger.error(f"Unable to find required file: {file_path}")
                 return False
         
-        self.hex_data_list.clear()
+        self.file_data = b""
+        self.data_loaded = False
         
         if not os.path.exists(file_path):
             logger.error(f"{file_path} does not exist.")
             return False
         
         with open(file_path, "rb") as f:
-            logger.info("Streaming File Hex Info...")
-            while True:
-                hex_data = f.read(16).hex()
-                if len(hex_data) == 0:
-                    break
-                self.hex_data_list.append(hex_data.upper())
+            logger.info("Reading File Data...")
+            size = os.fstat(f.fileno()).st_size
+            load_progress = ProgressReporter("load", size, progress, token)
+            data = bytearray(size)
+            view = memoryview(data)
+            position = 0
+            try:
+                while position < size:
+                    read = f.readinto(view[position:position + BLOCK_SIZE])
+                    if not read:
+                        break
+                    position += read
+                    load_progress.update(position)
+            finally:
+                view.release()
+
+            if position < size: # The file shrank while reading.
+                del data[position:]
+            load_progress.finish()
+            self.file_data = data
 
         self.data_loaded = True
+        self._loaded_file_path = file_path
         logger.info("Read Finished.")
         
         return True
     
-    def write_hex_to_file(self, directory, filename, working_set=False):
+    def write_hex_to_file(self, directory, filename, working_set=False, radius=512) -> Union[str, None]:
+        """
+        Writes a hexdump of the loaded executable to <directory>/<filename>.txt.
+
+        Only radius bytes around each match of the last scan are dumped, read with positioned reads and streamed to
+        the file. The patched bytes of the staged edits are shown next to the original bytes.
+
+        :param working_set: Show the bytes of the compiled patched executable instead of the staged edits.
+        :param radius: Bytes to dump on each side of a match. None dumps the whole file.
+        :return: Path to the written dump.
+        """
+        if not self._loaded_file_path:
+            logger.error("No executable loaded.")
+            return None
+
         dest = os.path.join(directory, f"{filename}.txt")
         
         self._generate_missing_paths(directory)
-        
-        to_write = self.hex_data_list
-        
-        if working_set:
-            to_write = self._hex_data_list_working
-        
-        with open(dest, 'w') as f:
-            for chunk in to_write:
-                f.write(chunk + '\n')
-        
-    def patch(self) -> bool:
+
+        self.write_hexdump(dest, radius=radius, working_set=working_set)
+
+        return dest
+
+    def write_hexdump(self, out=None, radius=512, offsets=None, working_set=False) -> int:
+        """
+        Streams a side by side hexdump of the loaded executable to out (path or text stream, stdout by default).
+
+        :param offsets: Offsets to dump around. Defaults to the matches of the last scan.
+        :return: Number of lines written.
+        """
+        file_size = os.path.getsize(self._loaded_file_path)
+
+        if radius is None:
+            ranges = merge_ranges([(0, file_size)], file_size)
+        else:
+            if offsets is None:
+                offsets = self._match_offsets or [offset for offset, _, _ in self._transaction.edits]
+            ranges = windows_around(offsets, radius, file_size)
+
+        patched_path = None
+        if working_set and os.path.isfile(self.get_patched_file_path()):
+            patched_path = self.get_patched_file_path()
+
+        logger.debug(f"Dumping {len(ranges)} range(s) of {self._loaded_file_path}")
+
+        return write_hexdump(self._loaded_file_path, ranges, out=out,
+                             edits=self._transaction.edits, patched_path=patched_path)
+
+    def get_patched_file_path(self) -> str:
+        return os.path.join(self.exe_out_directory, f"{self.exe_modified_filename}.exe")
+
+    def export_patch_file(self, dest=None) -> Union[str, None]:
+        """
+        Exports the edits of the last successful patch as a portable patch file, so the same build can later be
+        patched with apply_patch_file without scanning.
+
+        :param dest: Path of the patch file. Defaults to the patched executable name with the patch extension.
+        :return: Path to the written patch file.
+        """
+        patched_file = self.get_patched_file_path()
+
+        if not self._transaction or not self._loaded_file_path or not os.path.isfile(patched_file):
+            logger.error("Nothing to export. Patch an executable first.")
+            return None
+
+        if not dest:
+            dest = os.path.join(self.exe_out_directory, f"{self.exe_modified_filename}{PATCH_FILE_EXTENSION}")
+
+        patch_file = PatchFile(title=self.title_name,
+                               source=fingerprint_file(self._loaded_file_path),
+                               target=fingerprint_file(patched_file),
+                               edits=self._transaction.edits)
+
+        return patch_file.save(dest)
+
+    def apply_patch_file(self, patch_file_path, file_path) -> bool:
+        """
+        Applies a previously exported patch file to file_path, writing the patched executable to the output
+        directory. No scan is performed; the source and target fingerprints are verified instead.
+        """
+        self.clear_caches()
+
+        try:
+            patch_file = PatchFile.load(patch_file_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Unable to read patch file {patch_file_path}.")
+            logger.debug_error(e)
+            return False
+
+        self._generate_missing_paths(self.exe_out_directory)
+
+        if not patch_file.apply(file_path, self.get_patched_file_path()):
+            logger.error(f"Patch failed.".upper())
+            return False
+
+        for offset, old, new in patch_file.edits:
+            self._transaction.stage(offset, old, new, os.path.basename(patch_file_path))
+        self._loaded_file_path = file_path
+        logger.info(f"Patch successful.".upper())
+
+        return True
+
+    def probe(self) -> dict:
+        """
+        Scans the loaded executable without writing anything.
+
+        :return: {"state": "unpatched" | "patched" | "unknown", "matches": [offsets]}
+        """
+        self.clear_caches()
+
+        if not self.data_loaded:
+            logger.error("Unable to load data.")
+            return {"state": "unknown", "matches": []}
+
+        if self._acquire_checksum_block():
+            state = "unpatched"
+        elif self.is_patched:
+            state = "patched"
+        else:
+            state = "unknown"
+
+        return {"state": state, "matches": list(self._match_offsets)}
+
+    def replace_original_file(self, original_file) -> bool:
+        """
+        Backs up original_file to <original_file>.orig (unless a backup already exists) and copies the patched
+        executable in its place. The patched executable is removed afterwards.
+        """
+        patched_file = self.get_patched_file_path()
+
+        # Rename original file
+        renamed = False
+        logger.info("Backing up original file.")
+        try:
+            backup_file = f"{original_file}.orig"
+            if not os.path.exists(backup_file):
+                logger.debug(f"Renaming {original_file} -> {backup_file}")
+                os.rename(original_file, backup_file)
+            else:
+                logger.info("Backed up file already exists.")
+            renamed = True
+        except Exception as e:
+            logger.error("Failed to rename original file.")
+            logger.debug_error(e)
+
+        if not renamed:
+            return False
+
+        # Copy patched file and rename
+        copied = False
+        logger.info("Moving patched file.")
+        try:
+            logger.debug(f"{patched_file} -> {original_file}")
+            shutil.copy(patched_file, original_file)
+            copied = True
+        except Exception as e:
+            logger.error("Failed to move patched file.")
+            logger.debug_error(e)
+
+        if not copied:
+            return False
+
+        try:
+            os.remove(patched_file)
+        except Exception:
+            logger.error("Unable to delete patched file.")
+
+        return True
+
+    def restore_original_file(self, original_file) -> bool:
+        """
+        Restores <original_file>.orig over original_file.
+        """
+        backup_file = f"{original_file}.orig"
+
+        if not os.path.exists(backup_file):
+            logger.error(f"No backup found for {original_file}.")
+            return False
+
+        try:
+            with FileLock(original_file):
+                os.replace(backup_file, original_file)
+        except (OSError, TimeoutError) as e:
+            logger.error("Failed to restore original file.")
+            logger.debug_error(e)
+            return False
+
+        self._store.record(original_file, patched=False, backup=None, sha256=None, signature_id=None, offset=None)
+
+        logger.info(f"Restored original file {original_file}")
+
+        return True
+
+    def patch_executable(self, file_path, replace=False, token=None, progress=None) -> dict:
+        """
+        Loads, patches and optionally replaces file_path while holding its cross-process file lock.
+
+        An executable the install store recorded as patched, and unchanged since, is reported as already patched
+        without being read. A known build is recognised by its size and the bytes at its edit sites, then copied with
+        its edits in a single pass that verifies the original and patched hashes, without being loaded or scanned.
+        Every run updates its install store record.
+
+        :param replace: Replace file_path with the patched executable, keeping a .orig backup.
+        :param token: CancellationToken checked between blocks of every stage. A cancelled run leaves no output behind
+        and does not replace file_path.
+        :param progress: Called as progress(stage, done, total) with the bytes processed by the "load", "scan" and
+        "write" stages, at most PROGRESS_UPDATES_PER_SECOND times per stage and second.
+        :return: {"executable": str, "loaded": bool, "patched": bool, "already_patched": bool, "replaced": bool,
+        "cancelled": bool, "known_build": bool}
+        """
+        result = {"executable": file_path, "loaded": False, "patched": False, "already_patched": False,
+                  "replaced": False, "cancelled": False, "known_build": False}
+
+        try:
+            with FileLock(file_path):
+                record = self._store.get(file_path)
+                if record.get("patched") and self._store.is_current(record):
+                    logger.info("Executable already patched.".upper())
+                    self.is_patched = True
+                    result["loaded"] = True
+                    result["already_patched"] = True
+                    return result
+
+                started = time.perf_counter()
+                self.clear_caches()
+
+                candidates = self._known_build_candidates(file_path) if os.path.isfile(file_path) else []
+                fingerprints = None
+                for entry, state in candidates:
+                    if state == MATCH_PENDING:
+                        fingerprints = self._patch_known_build(file_path, entry, token=token, progress=progress)
+                        if fingerprints:
+                            break
+
+                applied = {entry["patched_sha256"] for entry, state in candidates if state == MATCH_APPLIED}
+                if fingerprints:
+                    loaded = time.perf_counter()
+                    result["loaded"] = True
+                    result["patched"] = True
+                    result["known_build"] = True
+                    logger.info(f"Patch successful.".upper())
+                elif applied and self._source_sha256(file_path) in applied:
+                    loaded = time.perf_counter()
+                    logger.info("Executable already patched.".upper())
+                    self.is_patched = True
+                    result["loaded"] = True
+                    result["already_patched"] = True
+                    result["known_build"] = True
+                else:
+                    result["loaded"] = self.load_file_hex(file_path=file_path, token=token, progress=progress)
+                    if not result["loaded"]:
+                        return result
+                    loaded = time.perf_counter()
+
+                    result["patched"] = self.patch(token=token, progress=progress)
+                    result["already_patched"] = self.is_patched
+                patched = time.perf_counter()
+
+                if result["patched"] and replace:
+                    if token is not None:
+                        token.raise_if_cancelled()
+                    result["replaced"] = self.replace_original_file(file_path)
+
+                timings = {
+                    "load_ms": round((loaded - started) * 1000, 3),
+                    "patch_ms": round((patched - loaded) * 1000, 3),
+                    "replace_ms": round((time.perf_counter() - patched) * 1000, 3),
+                }
+                # The known build pass hashed both files already.
+                on_disk = None
+                if fingerprints:
+                    on_disk = fingerprints["target" if result["replaced"] else "source"]["sha256"]
+                self._record_install(file_path, result, timings, sha256=on_disk)
+        except TimeoutError as e:
+            logger.error("Another patcher is still working on this executable.")
+            logger.debug_error(e)
+        except PatchCancelled:
+            logger.info("Patch cancelled.".upper())
+            self.clear_caches()
+            self.file_data = b""
+            self.data_loaded = False
+            result["patched"] = False
+            result["cancelled"] = True
+
+        return result
+
+    def patch(self, token=None, progress=None) -> bool:
         """
         Perform all necessary actions in bulk to patch the executable.
 
+        :param token: CancellationToken checked between blocks of the scan and the write.
+        :param progress: Called as progress(stage, done, total), see patch_executable.
+        :raises PatchCancelled: When token is cancelled. The patched executable is not written.
         :return:
         """
 
@@ -300,28 +760,37 @@ class StellarisChecksumPatcher:
         # The else will refer to the error of the previous operation.
 
         if op_success: # Data was loaded.
-            op_success = self._acquire_checksum_block()
+            # Known builds are looked up by hash before scanning. A known patched build is not scanned either.
+            is_known_build = self._acquire_known_build()
+            if is_known_build:
+                op_success = True
+            elif self.is_patched:
+                op_success = False
+            else:
+                op_success = self._acquire_checksum_block(token=token, progress=progress)
             
             if op_success: # Checksum block was acquired.
                 op_success = self._modify_checksum()
             
             if op_success: # Checksum block was modified.
-                op_success = self.compile_hex_file()
+                op_success = self.compile_hex_file(token=token, progress=progress)
+
+            if op_success and not is_known_build:
+                self._learn_known_build()
         else: # Data was not loaded.
             logger.error("Unable to load data.")
             return False
         
         if op_success: # Patched exe file was generated.
-            print("\n")
             logger.info(f"Patch successful.".upper())
             return True
         else: # Patched exe file was not generated.
-            print("\n")
             # Here we could have failed because the file was already patched
             if self.is_patched:
                 logger.info(f"Executable already patched.".upper())
             else:
                 logger.error(f"Patch failed.".upper())
+                logger.dump_debug_buffer(reason=f"Patch of {self._loaded_file_path} failed.")
     
         return False
         
@@ -1,12 +1,16 @@
 # built-ins
 import os
 import sys
+import pathlib
 import binascii
-import winreg
+import shutil
 import json
+import time
 from typing import Union
 
 # 3rd-party
-from utils.global_defines import logger, is_debug
-from . import registry_helper
+from utils.global_defines import is_debug, config_folder, LazySingleton
+
+# Created on first use, importing the engine starts no logger thread and opens no database.
+logger = LazySingleton("logger")
 from . import steam_helper
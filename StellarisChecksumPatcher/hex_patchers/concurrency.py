@@ -0,0 +1,242 @@
+import queue
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from . import *
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+LOCK_FOLDER = "locks" # Inside the config folder, one lock file per target path.
+LOCK_FILE_SUFFIX = ".lock"
+LOCK_TIMEOUT = 120 # Seconds to wait for another process to release a target file.
+LOCK_POLL_INTERVAL = 0.1
+MAX_PROBE_WORKERS = 8 # Probes running at once, the others wait for a free worker.
+
+_thread_locks = {} # {lock_path: threading.Lock}, serialises threads of this process before taking the OS lock.
+_thread_locks_guard = threading.Lock()
+
+
+def default_lock_file(target) -> pathlib.Path:
+    key = hashlib.sha1(os.path.realpath(target).encode("utf-8")).hexdigest()[:16]
+    return pathlib.Path(config_folder) / LOCK_FOLDER / f"{key}{LOCK_FILE_SUFFIX}"
+
+
+def _thread_lock_for(lock_path) -> threading.Lock:
+    with _thread_locks_guard:
+        lock = _thread_locks.get(lock_path)
+        if lock is None:
+            lock = threading.Lock()
+            _thread_locks[lock_path] = lock
+        return lock
+
+
+class FileLock:
+    """
+    Advisory, cross-process lock on a target file, held through a lock file in the config folder named after the hash
+    of the target's real path, so nothing is written next to the game executable.
+
+    Every patcher instance (GUI, CLI, service) takes this lock around load/patch/replace of an executable, so two
+    instances never rewrite the same file at the same time. The lock file itself is left in place; removing it would
+    race with other processes waiting on it.
+    """
+
+    def __init__(self, target, timeout: Union[float, None] = LOCK_TIMEOUT) -> None:
+        self.target = os.path.abspath(target)
+        self.lock_path = str(default_lock_file(target))
+        self.timeout = timeout
+        self._fd = None
+        self._thread_lock = _thread_lock_for(self.lock_path)
+
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError(f"Timed out waiting for lock {self.lock_path}")
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def _try_os_lock(self) -> bool:
+        try:
+            if os.name == "nt":
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self) -> bool:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        if not self._thread_lock.acquire(timeout=-1 if self.timeout is None else self.timeout):
+            return False
+
+        try:
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+            self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            logger.error(f"Unable to create lock file {self.lock_path}.")
+            logger.debug_error(e)
+            self._thread_lock.release()
+            return False
+
+        logged = False
+        while not self._try_os_lock():
+            if deadline is not None and time.monotonic() >= deadline:
+                os.close(self._fd)
+                self._fd = None
+                self._thread_lock.release()
+                return False
+            if not logged:
+                logger.info(f"Waiting for another patcher to release {self.target}...")
+                logged = True
+            time.sleep(LOCK_POLL_INTERVAL)
+
+        logger.debug("Acquired lock %s", self.lock_path)
+
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+
+        try:
+            if os.name == "nt":
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._thread_lock.release()
+            logger.debug("Released lock %s", self.lock_path)
+
+
+class JobCoalescer:
+    """
+    Coalesces duplicate in-process jobs. While a job for a key is running, further requests for the same key wait for
+    its result instead of running again.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._in_flight = {} # {key: Future}
+
+    def run(self, key, job_function, *args, **kwargs):
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            logger.debug("Joining running job %s", key)
+            return future.result()
+
+        try:
+            future.set_result(job_function(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+        return future.result()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+
+def probe_in_parallel(items, probe_function, timeout: float, first_match: bool = False, stop=None) -> tuple:
+    """
+    Runs probe_function(item) for every item on a pool of at most MAX_PROBE_WORKERS threads, so a probe stuck on a
+    sleeping disk or network mount does not block the others.
+
+    :param timeout: Seconds to wait for each item, counted from when its probe starts, so items waiting for a free
+    worker are not charged for it. Items still waiting once every worker is stuck on a timed out probe are unreachable.
+    :param first_match: Return as soon as a probe returns a truthy result.
+    :param stop: threading.Event set on return. Probes not started yet are dropped, and running probes can check it to
+    stop early and to discard results nobody will read.
+    :return: ({item: result}, [unreachable items]). Items whose probe raised or timed out are unreachable.
+    """
+    items = list(dict.fromkeys(items))
+    results = {}
+    unreachable = []
+
+    if not items:
+        return results, unreachable
+
+    stop = stop or threading.Event()
+    finished = queue.Queue()
+    started = {} # {item: monotonic time its probe started}
+
+    def _worker(item):
+        if stop.is_set():
+            return
+        started[item] = time.monotonic()
+        try:
+            finished.put((item, probe_function(item), None))
+        except Exception as e:
+            finished.put((item, None, e))
+
+    workers = min(len(items), MAX_PROBE_WORKERS)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Probe")
+    try:
+        for item in items:
+            executor.submit(_worker, item)
+
+        pending = set(items)
+        stuck = set() # Timed out probes, still holding their worker.
+        while pending:
+            now = time.monotonic()
+            deadlines = []
+            for item in [item for item in items if item in pending and item in started]:
+                if started[item] + timeout > now:
+                    deadlines.append(started[item] + timeout)
+                    continue
+                logger.error(f"{item} did not respond within {timeout} seconds.")
+                pending.discard(item)
+                stuck.add(item)
+                unreachable.append(item)
+
+            if not pending or (not deadlines and len(stuck) >= workers):
+                break
+
+            # Nothing running yet means the next probes are about to start, check again shortly.
+            wait = min(deadlines) - now if deadlines else LOCK_POLL_INTERVAL
+            try:
+                item, result, error = finished.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+            stuck.discard(item) # A late probe frees its worker, its result is not used.
+            if item not in pending:
+                continue
+
+            pending.discard(item)
+            if error is not None:
+                logger.debug_error("Probe of %s failed: %s", item, error)
+                unreachable.append(item)
+                continue
+
+            results[item] = result
+            if first_match and result:
+                return results, unreachable
+
+        for item in items:
+            if item in pending:
+                logger.error(f"{item} was not probed, every worker is stuck on an unresponsive item.")
+                unreachable.append(item)
+
+        return results, unreachable
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,226 @@
+import platform
+import threading
+
+from . import *
+from .patch_rules import PatchRule, PatchEdit
+
+PROFILE_FILE_VERSION = 1
+PROFILE_FILE_EXTENSION = ".json"
+BUILTIN_PROFILES_FOLDER = os.path.join(os.path.dirname(__file__), "profiles")
+USER_PROFILES_FOLDER = "profiles" # Inside the config folder. Profiles there override built-in ones with the same ID.
+
+
+DEFAULT_PROFILE_ID = "stellaris"
+DEFAULT_EXECUTABLES_KEY = "default"
+
+
+def _platform_key() -> str:
+    return platform.system().lower()
+
+
+class GameProfile:
+    """
+    Everything the patcher needs to know about one game: Steam title and app ID, executable names per platform and
+    the patch rules of every known build.
+
+    Profiles are described by JSON data files and validated and compiled once by from_dict, so a new build or title is
+    a data change only.
+    """
+
+    def __init__(self, profile_id: str, title: str, steam_app_id: str, executables: dict, builds: dict,
+                 default_build: str, patched_filename: str, build_hashes: dict = None, source: str = "") -> None:
+        self.profile_id = profile_id
+        self.title = title
+        self.steam_app_id = steam_app_id
+        self.executables = executables # {platform: [exe names in order of preference]}
+        self.builds = builds # {build_id: [PatchRule, ...]}
+        self.default_build = default_build
+        self.patched_filename = patched_filename
+        self.build_hashes = build_hashes or {} # {sha256: build_id}
+        self.source = source
+
+    def __repr__(self) -> str:
+        return f"GameProfile({self.profile_id}, {self.title}, builds={list(self.builds)})"
+
+    @staticmethod
+    def _parse_rule(rule_data: dict) -> PatchRule:
+        edits = [PatchEdit(edit["offset"], edit["old"], edit["new"]) for edit in rule_data["edits"]]
+        return PatchRule(rule_data["rule_id"], rule_data["signature"], edits=edits,
+                         max_matches=rule_data.get("max_matches", 1))
+
+    @classmethod
+    def from_dict(cls, profile_data: dict, source: str = ""):
+        """
+        Validates profile_data and compiles the patch rules of every build.
+
+        :raises ValueError: With the reason the profile is invalid.
+        """
+        try:
+            if profile_data.get("version", 0) > PROFILE_FILE_VERSION:
+                raise ValueError(f"Unsupported profile version {profile_data.get('version')}.")
+
+            profile_id = str(profile_data["profile_id"])
+            steam_app_id = str(profile_data["steam_app_id"])
+            if not steam_app_id.isdigit():
+                raise ValueError(f"Steam app ID {steam_app_id} is not numeric.")
+
+            executables = {}
+            for platform_key, names in profile_data["executables"].items():
+                names = [names] if isinstance(names, str) else list(names)
+                if not names or not all(isinstance(name, str) and name for name in names):
+                    raise ValueError(f"Executable names of {platform_key} must be non empty strings.")
+                executables[platform_key.lower()] = names
+            if not executables:
+                raise ValueError("No executable names.")
+
+            builds = {}
+            build_hashes = {}
+            for build_id, build_data in profile_data["builds"].items():
+                rules = [cls._parse_rule(rule_data) for rule_data in build_data["rules"]]
+                if not rules:
+                    raise ValueError(f"Build {build_id} has no rules.")
+                rule_ids = [rule.rule_id for rule in rules]
+                if len(set(rule_ids)) != len(rule_ids):
+                    raise ValueError(f"Build {build_id} has duplicate rule IDs.")
+                builds[str(build_id)] = rules
+
+                for sha256 in build_data.get("sha256", []):
+                    build_hashes[str(sha256).lower()] = str(build_id)
+
+            default_build = str(profile_data.get("default_build", next(iter(builds), "")))
+            if default_build not in builds:
+                raise ValueError(f"Default build {default_build} is not defined.")
+
+            return cls(profile_id=profile_id,
+                       title=str(profile_data["title"]),
+                       steam_app_id=steam_app_id,
+                       executables=executables,
+                       builds=builds,
+                       default_build=default_build,
+                       patched_filename=str(profile_data.get("patched_filename") or f"{profile_id}-patched"),
+                       build_hashes=build_hashes,
+                       source=source)
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Missing or malformed field {e}.")
+
+    def executable_names(self, platform_key=None) -> list:
+        platform_key = platform_key or _platform_key()
+        return list(self.executables.get(platform_key) or self.executables.get(DEFAULT_EXECUTABLES_KEY)
+                    or next(iter(self.executables.values())))
+
+    def executable_name(self, platform_key=None) -> str:
+        return self.executable_names(platform_key)[0]
+
+    def rules(self, build=None) -> list:
+        """
+        Compiled patch rules of build, or of the default build.
+
+        :raises ValueError: If the profile has no such build.
+        """
+        build = build or self.default_build
+        if build not in self.builds:
+            raise ValueError(f"{self.title} has no build {build}. Known builds: {', '.join(self.builds)}.")
+
+        return list(self.builds[build])
+
+    def build_for_hash(self, sha256) -> Union[str, None]:
+        return self.build_hashes.get(str(sha256).lower()) if sha256 else None
+
+
+class GameProfileRegistry:
+    """
+    Loads every profile data file of the built-in and the user profile folders.
+
+    The compiled profiles are kept together with the size and modification time of every data file, and reused while
+    none of them changed.
+    """
+
+    def __init__(self, folders=None) -> None:
+        self.folders = folders or [BUILTIN_PROFILES_FOLDER, os.path.join(str(config_folder), USER_PROFILES_FOLDER)]
+
+        self._profiles = None # {profile_id: GameProfile}
+        self._stamp = None # [(path, size, mtime_ns), ...] of the data files the profiles were loaded from.
+        self._lock = threading.Lock()
+
+    # =============================================
+    # ============== Class Functions ==============
+    # =============================================
+
+    def _data_files(self) -> list:
+        data_files = []
+        for folder in self.folders:
+            try:
+                names = sorted(name for name in os.listdir(folder) if name.endswith(PROFILE_FILE_EXTENSION))
+            except OSError:
+                continue
+            data_files.extend(os.path.join(folder, name) for name in names)
+
+        return data_files
+
+    def _current_stamp(self) -> list:
+        stamp = []
+        for data_file in self._data_files():
+            try:
+                stat = os.stat(data_file)
+            except OSError:
+                continue
+            stamp.append((os.path.abspath(data_file), stat.st_size, stat.st_mtime_ns))
+
+        return stamp
+
+    @staticmethod
+    def _compile(stamp: list) -> dict:
+        profiles = {}
+        for data_file, _, _ in stamp:
+            try:
+                with open(data_file, "r") as f:
+                    profile = GameProfile.from_dict(json.load(f), source=data_file)
+            except (OSError, ValueError) as e:
+                logger.error(f"Skipping invalid game profile {data_file}: {e}")
+                continue
+
+            # Later folders (user profiles) override earlier ones (built-in).
+            profiles[profile.profile_id] = profile
+
+        return profiles
+
+    # ===============================================
+    # ============== Regular Functions ==============
+    # ===============================================
+
+    def load(self) -> dict:
+        """
+        Returns {profile_id: GameProfile}, recompiling only when a data file was added, removed or changed.
+        """
+        with self._lock:
+            stamp = self._current_stamp()
+            if self._profiles is not None and stamp == self._stamp:
+                return self._profiles
+
+            logger.debug("Compiling %d game profile(s).", len(stamp))
+            self._profiles = self._compile(stamp)
+            self._stamp = stamp
+
+            return self._profiles
+
+    def get(self, profile_id: str = DEFAULT_PROFILE_ID) -> Union[GameProfile, None]:
+        return self.load().get(profile_id)
+
+    def all(self) -> list:
+        return list(self.load().values())
+
+
+_profile_registry = None
+_profile_registry_lock = threading.Lock()
+
+
+def get_profile_registry() -> GameProfileRegistry:
+    """
+    The registry shared by every patcher of this process, created on first use.
+    """
+    global _profile_registry
+    with _profile_registry_lock:
+        if _profile_registry is None:
+            _profile_registry = GameProfileRegistry()
+
+    return _profile_registry
@@ -0,0 +1,130 @@
+from . import *
+from .patch_file import pread
+
+HEXDUMP_LINE_LEN = 16 # Bytes per hexdump line.
+HEXDUMP_READ_SIZE = 64 * 1024 # Bytes read per positioned read. Windows larger than this are streamed in blocks.
+
+
+def windows_around(offsets, radius: int, file_size: int) -> list:
+    """
+    Builds [start, end) byte ranges of radius bytes around each offset, aligned to whole hexdump lines and merged
+    where they overlap.
+    """
+    ranges = []
+    for offset in offsets:
+        start = max(0, offset - radius)
+        end = min(file_size, offset + radius)
+        ranges.append((start, end))
+
+    return merge_ranges(ranges, file_size)
+
+
+def merge_ranges(ranges, file_size: int) -> list:
+    aligned = []
+    for start, end in ranges:
+        start = max(0, start - start % HEXDUMP_LINE_LEN)
+        end = min(file_size, end + (-end) % HEXDUMP_LINE_LEN)
+        if start < end:
+            aligned.append((start, end))
+
+    merged = []
+    for start, end in sorted(aligned):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def _overlay_edits(block: bytes, block_start: int, edits) -> bytes:
+    block_end = block_start + len(block)
+    patched = None
+    for offset, _, new in edits:
+        if offset >= block_end or offset + len(new) <= block_start:
+            continue
+        if patched is None:
+            patched = bytearray(block)
+        for i, value in enumerate(new):
+            if block_start <= offset + i < block_end:
+                patched[offset + i - block_start] = value
+
+    return block if patched is None else bytes(patched)
+
+
+def _format_line(offset: int, original: bytes, patched: bytes) -> str:
+    original_hex = " ".join(f"{value:02X}" for value in original).ljust(HEXDUMP_LINE_LEN * 3 - 1)
+    patched_hex = " ".join(f"{value:02X}" for value in patched).ljust(HEXDUMP_LINE_LEN * 3 - 1)
+    text = "".join(chr(value) if 32 <= value < 127 else "." for value in patched)
+    marker = "*" if original != patched else " "
+
+    return f"{marker}{offset:08X}  {original_hex}  |  {patched_hex}  |{text}"
+
+
+def iter_hexdump(source_path, ranges, edits=None, patched_path=None):
+    """
+    Yields hexdump lines of the requested byte ranges, original and patched bytes side by side.
+
+    Only the requested ranges are read, with positioned reads. Patched bytes are taken from patched_path when given,
+    otherwise the edits [(offset, old, new), ...] are overlaid on the original bytes. Lines where both differ are
+    marked with '*'.
+    """
+    edits = sorted(edits or [], key=lambda edit: edit[0])
+
+    with open(source_path, "rb") as source:
+        patched = open(patched_path, "rb") if patched_path else None
+        try:
+            for index, (start, end) in enumerate(ranges):
+                if index:
+                    yield "--"
+
+                position = start
+                while position < end:
+                    size = min(HEXDUMP_READ_SIZE, end - position)
+                    original_block = pread(source.fileno(), size, position)
+                    if not original_block:
+                        break
+
+                    if patched:
+                        patched_block = pread(patched.fileno(), len(original_block), position)
+                    else:
+                        patched_block = _overlay_edits(original_block, position, edits)
+
+                    for line_start in range(0, len(original_block), HEXDUMP_LINE_LEN):
+                        yield _format_line(position + line_start,
+                                           original_block[line_start:line_start + HEXDUMP_LINE_LEN],
+                                           patched_block[line_start:line_start + HEXDUMP_LINE_LEN])
+
+                    position += len(original_block)
+        finally:
+            if patched:
+                patched.close()
+
+
+def write_hexdump(source_path, ranges, out=None, edits=None, patched_path=None) -> int:
+    """
+    Streams the hexdump of the requested ranges to out, a path or a writable text stream. Defaults to stdout.
+
+    :return: Number of lines written.
+    """
+    header = f"# {source_path}"
+    if patched_path:
+        header += f" | {patched_path}"
+
+    lines_written = 0
+
+    if out is None or hasattr(out, "write"):
+        stream = out or sys.stdout
+        stream.write(header + "\n")
+        for line in iter_hexdump(source_path, ranges, edits=edits, patched_path=patched_path):
+            stream.write(line + "\n")
+            lines_written += 1
+        stream.flush()
+    else:
+        with open(out, "w") as stream:
+            stream.write(header + "\n")
+            for line in iter_hexdump(source_path, ranges, edits=edits, patched_path=patched_path):
+                stream.write(line + "\n")
+                lines_written += 1
+
+    return lines_written
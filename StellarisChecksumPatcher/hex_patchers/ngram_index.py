@@ -0,0 +1,312 @@
+import re
+import mmap
+import struct
+import hashlib
+import itertools
+from array import array
+
+from . import *
+from .patch_file import fingerprint_file
+from .patch_rules import parse_signature
+from .progress import ProgressReporter, BLOCK_SIZE
+
+INDEX_FOLDER = "ngram-index" # Inside the config folder, one index file per executable path.
+INDEX_FILE_EXTENSION = ".ngram"
+INDEX_MAGIC = b"SCPNGRAM"
+INDEX_VERSION = 1
+
+GRAM_SIZE = 4
+DEFAULT_STRIDE = 4 # Index the gram at every 4th offset. Queries then need a fixed run of GRAM_SIZE + stride - 1 bytes.
+INDEX_STRIDES = (1, 2, 4, 8, 16)
+GRAMS_PER_BUCKET = 8
+MIN_BUCKETS = 4096
+MAX_BUCKETS = 1 << 20
+
+INTERSECT_UNTIL = 32 # Candidates below which the remaining postings are not intersected, only verified.
+
+# magic, version, gram size, stride, buckets, executable size, executable mtime_ns, executable sha256
+_HEADER = struct.Struct("<8sIIIIQQ32s")
+
+
+def default_index_file(executable) -> pathlib.Path:
+    key = hashlib.sha1(os.path.abspath(executable).encode("utf-8")).hexdigest()[:16]
+    return pathlib.Path(config_folder) / INDEX_FOLDER / f"{key}{INDEX_FILE_EXTENSION}"
+
+
+def _compile_query(parsed_signature: list) -> re.Pattern:
+    pattern = b"".join(b"." if value is None else re.escape(bytes([value])) for value in parsed_signature)
+    return re.compile(pattern, re.DOTALL)
+
+
+def _as_words(view: memoryview) -> memoryview:
+    words = view.cast("I")
+    if sys.byteorder != "little":
+        swapped = array("I", words)
+        swapped.byteswap()
+        words.release()
+        return memoryview(swapped)
+    return words
+
+
+def build_index(executable, index_file=None, stride: int = DEFAULT_STRIDE, token=None, progress=None) -> dict:
+    """
+    Writes a GRAM_SIZE-gram posting index of executable: for every hash bucket of grams, the offsets (every stride
+    bytes) holding a gram of that bucket.
+
+    File layout, little-endian: header, bucket offsets (buckets + 1 uint32) into the postings, postings (uint32).
+
+    :raises ValueError: If stride is not one of INDEX_STRIDES or the executable does not fit uint32 offsets.
+    :return: Header fields of the written index.
+    """
+    if stride not in INDEX_STRIDES:
+        raise ValueError(f"Stride must be one of {', '.join(str(s) for s in INDEX_STRIDES)}.")
+
+    executable = os.path.abspath(executable)
+    index_file = pathlib.Path(index_file) if index_file else default_index_file(executable)
+    fingerprint = fingerprint_file(executable)
+    if fingerprint is None:
+        raise FileNotFoundError(executable)
+
+    size = fingerprint["size"]
+    if size >= 1 << 32:
+        raise ValueError("Executables of 4 GiB or more are not supported.")
+
+    grams = max(0, size - GRAM_SIZE + stride) // stride
+    bucket_count = min(MAX_BUCKETS, max(MIN_BUCKETS, grams // GRAMS_PER_BUCKET)) | 1
+    buckets = [array("I") for _ in range(bucket_count)]
+    appends = [bucket.append for bucket in buckets]
+
+    reporter = ProgressReporter("index", size, progress, token)
+    started = time.perf_counter()
+
+    with open(executable, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        try:
+            for start in range(0, size, BLOCK_SIZE):
+                end = min(start + BLOCK_SIZE, size)
+                chunk = data[start:end + GRAM_SIZE - 1]
+                # Grams at offsets shift, shift + 4, ... are the words of chunk[shift:].
+                for shift in range(0, GRAM_SIZE, stride) if stride < GRAM_SIZE else (0,):
+                    view = chunk[shift:]
+                    count = min(len(view) // GRAM_SIZE, (end - start - shift + GRAM_SIZE - 1) // GRAM_SIZE)
+                    words = array("I")
+                    words.frombytes(view[:count * GRAM_SIZE])
+                    if sys.byteorder != "little":
+                        words.byteswap()
+                    step = max(1, stride // GRAM_SIZE)
+                    for position, word in zip(range(start + shift, end, GRAM_SIZE * step), words[::step]):
+                        appends[word % bucket_count](position)
+                reporter.update(end)
+        finally:
+            if size:
+                data.close()
+
+    reporter.finish()
+
+    offsets = array("I", [0])
+    offsets.extend(itertools.accumulate(len(bucket) for bucket in buckets))
+    header = _HEADER.pack(INDEX_MAGIC, INDEX_VERSION, GRAM_SIZE, stride, bucket_count, size,
+                          os.stat(executable).st_mtime_ns, bytes.fromhex(fingerprint["sha256"]))
+
+    if not index_file.parent.exists():
+        os.makedirs(index_file.parent)
+
+    tmp_file = index_file.with_name(f"{index_file.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_file, "wb") as f:
+            f.write(header)
+            for words in [offsets] + buckets:
+                if sys.byteorder != "little":
+                    words.byteswap()
+                f.write(words.tobytes())
+        os.replace(tmp_file, index_file)
+    finally:
+        if tmp_file.exists():
+            tmp_file.unlink()
+
+    logger.info(f"Indexed {offsets[-1]} gram(s) of {executable} in {bucket_count} bucket(s) "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms: {index_file}")
+
+    return {"index_file": str(index_file), "executable": executable, "size": size, "stride": stride,
+            "buckets": bucket_count, "grams": offsets[-1], "sha256": fingerprint["sha256"]}
+
+
+class NgramIndex:
+    """
+    A posting index built by build_index, memory-mapped together with its executable.
+
+    find() looks up the postings of the fixed grams of a wildcard signature, intersects them and verifies only the
+    remaining candidates, instead of scanning the executable. The index is only used while the size and sha256 of the
+    executable match the ones it was built from.
+    """
+
+    def __init__(self, executable, index_file=None) -> None:
+        self.executable = os.path.abspath(executable)
+        self.index_file = pathlib.Path(index_file) if index_file else default_index_file(self.executable)
+
+        self.stride = None
+        self.bucket_count = None
+        self.size = None
+        self.sha256 = None
+
+        self._files = []
+        self._maps = []
+        self._views = []
+        self._data = None
+        self._offsets = None
+        self._postings = None
+
+    # =============================================
+    # ============== Class Functions ==============
+    # =============================================
+
+    def _map(self, file_path) -> mmap.mmap:
+        f = open(file_path, "rb")
+        self._files.append(f)
+        self._maps.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return self._maps[-1]
+
+    def _read_header(self) -> Union[tuple, None]:
+        try:
+            with open(self.index_file, "rb") as f:
+                fields = _HEADER.unpack(f.read(_HEADER.size))
+        except (OSError, struct.error):
+            return None
+
+        if fields[0] != INDEX_MAGIC or fields[1] != INDEX_VERSION or fields[2] != GRAM_SIZE:
+            return None
+
+        return fields
+
+    def _is_current(self, header: tuple) -> bool:
+        _, _, _, _, _, size, mtime_ns, sha256 = header
+        try:
+            stat = os.stat(self.executable)
+        except OSError:
+            return False
+
+        if stat.st_size != size:
+            return False
+        if stat.st_mtime_ns == mtime_ns:
+            return True
+
+        # Touched but maybe unchanged, compare contents.
+        fingerprint = fingerprint_file(self.executable)
+        return fingerprint is not None and fingerprint["sha256"] == sha256.hex()
+
+    def _bucket_postings(self, bucket: int) -> memoryview:
+        return self._postings[self._offsets[bucket]:self._offsets[bucket + 1]]
+
+    def _scan(self, parsed_signature: list, limit) -> list:
+        # Leading wildcards would keep re from searching for the first fixed bytes as a literal.
+        lead = next((i for i, value in enumerate(parsed_signature) if value is not None), len(parsed_signature))
+        if lead == len(parsed_signature):
+            return list(range(max(0, self.size - lead + 1))[:limit])
+
+        pattern = _compile_query(parsed_signature[lead:])
+        offsets = []
+        match = pattern.search(self._data, lead)
+        while match is not None and (limit is None or len(offsets) < limit):
+            offsets.append(match.start() - lead)
+            match = pattern.search(self._data, match.start() + 1)
+
+        return offsets
+
+    # ===============================================
+    # ============== Regular Functions ==============
+    # ===============================================
+
+    def open(self, build: bool = True, stride: int = DEFAULT_STRIDE) -> bool:
+        """
+        Maps the index and the executable. A missing index, or one of another version of the executable, is rebuilt
+        if build is set.
+        """
+        self.close()
+
+        header = self._read_header()
+        if header is None or not self._is_current(header):
+            if not build:
+                logger.error(f"No current index of {self.executable}.")
+                return False
+            if header is not None:
+                logger.info(f"{self.executable} changed, rebuilding its index.")
+                stride = header[3]
+            try:
+                build_index(self.executable, self.index_file, stride=stride)
+            except (OSError, ValueError) as e:
+                logger.error(f"Unable to index {self.executable}: {e}")
+                return False
+            header = self._read_header()
+
+        _, _, _, self.stride, self.bucket_count, self.size, _, sha256 = header
+        self.sha256 = sha256.hex()
+
+        self._views.append(memoryview(self._map(self.index_file))[_HEADER.size:])
+        self._views.append(_as_words(self._views[-1]))
+        self._offsets = self._views[-1][:self.bucket_count + 1]
+        self._postings = self._views[-1][self.bucket_count + 1:]
+        self._data = self._map(self.executable) if self.size else b""
+
+        return True
+
+    def find(self, signature, limit: int = None) -> list:
+        """
+        Every offset where signature (in the patcher's format) matches, overlapping matches included.
+
+        Signatures without a gram of GRAM_SIZE fixed bytes at every offset modulo stride fall back to a scan.
+        """
+        parsed = parse_signature(signature)
+        pattern = _compile_query(parsed)
+
+        # Fixed grams of the signature by their offset modulo stride. A match at m has its gram at offset o indexed
+        # when m + o is a multiple of stride.
+        grams = {}
+        for offset in range(len(parsed) - GRAM_SIZE + 1):
+            gram = parsed[offset:offset + GRAM_SIZE]
+            if None not in gram:
+                key = int.from_bytes(bytes(gram), "little") % self.bucket_count
+                grams.setdefault(offset % self.stride, []).append((offset, key))
+
+        if len(grams) < self.stride:
+            logger.debug("No indexed gram for every alignment of %s, scanning.", signature)
+            return self._scan(parsed, limit)
+
+        matches = []
+        for residue_grams in grams.values():
+            postings = sorted(((offset, self._bucket_postings(key)) for offset, key in residue_grams),
+                              key=lambda entry: len(entry[1]))
+
+            offset, posting = postings[0]
+            candidates = {position - offset for position in posting if position >= offset}
+            for offset, posting in postings[1:]:
+                if len(candidates) <= INTERSECT_UNTIL:
+                    break
+                candidates.intersection_update(position - offset for position in posting)
+
+            matches.extend(candidate for candidate in candidates if pattern.match(self._data, candidate))
+
+        matches.sort()
+
+        return matches if limit is None else matches[:limit]
+
+    def info(self) -> dict:
+        return {"index_file": str(self.index_file), "executable": self.executable, "size": self.size,
+                "stride": self.stride, "buckets": self.bucket_count, "grams": len(self._postings or []),
+                "sha256": self.sha256}
+
+    def close(self) -> None:
+        # Views first, a map with exported views cannot be closed.
+        for view in [self._offsets, self._postings] + self._views[::-1]:
+            if view is not None:
+                view.release()
+        self._offsets = None
+        self._postings = None
+        self._views = []
+        self._data = None
+
+        for mapped in self._maps:
+            mapped.close()
+        for f in self._files:
+            f.close()
+        self._maps = []
+        self._files = []
@@ -0,0 +1,199 @@
+import hashlib
+import shutil
+
+from . import *
+
+PATCH_FILE_FORMAT = "stellaris-checksum-patch"
+PATCH_FILE_VERSION = 1
+PATCH_FILE_EXTENSION = ".scpatch"
+
+HASH_CHUNK_SIZE = 1024 * 1024 # Read files in 1 MiB chunks when hashing.
+
+_fingerprint_cache = {} # {path: ((size, mtime_ns), fingerprint)}
+
+
+def fingerprint_file(file_path) -> Union[dict, None]:
+    """
+    Returns the size and sha256 of a file as {"size": int, "sha256": str}.
+
+    Results are cached by path, size and modification time so unchanged files are only hashed once per session.
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        logger.error(f"Unable to fingerprint {file_path}.")
+        return None
+
+    file_path = os.path.abspath(file_path)
+    stat_key = (stat.st_size, stat.st_mtime_ns)
+
+    cached = _fingerprint_cache.get(file_path)
+    if cached and cached[0] == stat_key:
+        return dict(cached[1])
+
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+
+    fingerprint = {"size": stat.st_size, "sha256": sha.hexdigest()}
+    _fingerprint_cache[file_path] = (stat_key, fingerprint)
+
+    return dict(fingerprint)
+
+
+def pwrite(fd, data: bytes, offset: int) -> int:
+    """
+    Positioned write. Falls back to seek + write where os.pwrite is unavailable (Windows).
+    """
+    if hasattr(os, "pwrite"):
+        return os.pwrite(fd, data, offset)
+
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.write(fd, data)
+
+
+def pread(fd, size: int, offset: int) -> bytes:
+    """
+    Positioned read. Falls back to seek + read where os.pread is unavailable (Windows).
+    """
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+class PatchFile:
+    """
+    Compact description of a binary patch: the fingerprint of the file it applies to, the list of byte edits and
+    the fingerprint of the expected result. Stored as JSON with hex encoded bytes.
+    """
+
+    def __init__(self, title="", source=None, target=None, edits=None) -> None:
+        self.title = title
+        self.source = source or {} # {"size": int, "sha256": str}
+        self.target = target or {} # {"size": int, "sha256": str}
+        self.edits = [] # [(offset, old_bytes, new_bytes), ...]
+
+        for offset, old, new in edits or []:
+            self.add_edit(offset, old, new)
+
+    def add_edit(self, offset: int, old: bytes, new: bytes) -> None:
+        if len(old) != len(new):
+            raise ValueError(f"Edit at offset {offset} changes length ({len(old)} -> {len(new)}).")
+        self.edits.append((int(offset), bytes(old), bytes(new)))
+        self.edits.sort(key=lambda edit: edit[0])
+
+    def to_dict(self) -> dict:
+        return {
+            "format": PATCH_FILE_FORMAT,
+            "version": PATCH_FILE_VERSION,
+            "title": self.title,
+            "source": self.source,
+            "target": self.target,
+            "edits": [
+                {"offset": offset, "old": old.hex().upper(), "new": new.hex().upper()}
+                for offset, old, new in self.edits
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, patch_data: dict):
+        if patch_data.get("format") != PATCH_FILE_FORMAT:
+            raise ValueError("Not a Stellaris Checksum Patcher patch file.")
+        if patch_data.get("version", 0) > PATCH_FILE_VERSION:
+            raise ValueError(f"Unsupported patch file version {patch_data.get('version')}.")
+
+        edits = [
+            (edit["offset"], bytes.fromhex(edit["old"]), bytes.fromhex(edit["new"]))
+            for edit in patch_data.get("edits", [])
+        ]
+
+        return cls(title=patch_data.get("title", ""),
+                   source=patch_data.get("source"),
+                   target=patch_data.get("target"),
+                   edits=edits)
+
+    def save(self, file_path) -> str:
+        directory = os.path.dirname(os.path.abspath(file_path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        with open(file_path, "w") as f:
+            f.write(json.dumps(self.to_dict(), indent=2))
+        logger.info(f"Saved patch file to {file_path}")
+
+        return file_path
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+    def matches_source(self, file_path) -> bool:
+        """
+        Checks the file against the source fingerprint. The size is compared first so mismatching builds
+        are rejected with a single stat call.
+        """
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            logger.error(f"{file_path} does not exist.")
+            return False
+
+        if size != self.source.get("size"):
+            logger.debug(f"Source size mismatch: {size} != {self.source.get('size')}")
+            return False
+
+        fingerprint = fingerprint_file(file_path)
+
+        return bool(fingerprint) and fingerprint.get("sha256") == self.source.get("sha256")
+
+    def apply(self, source_path, dest_path) -> bool:
+        """
+        Applies the patch to source_path, writing the result to dest_path.
+
+        The source fingerprint is verified first, the edits are written with positioned writes into a temporary copy
+        and the copy is only moved to dest_path once its hash matches the target fingerprint.
+        """
+        logger.info(f"Applying patch file to {source_path}")
+
+        if not self.matches_source(source_path):
+            logger.error("Source file does not match the patch file fingerprint.")
+            return False
+
+        dest_dir = os.path.dirname(os.path.abspath(dest_path))
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+
+        tmp_path = f"{dest_path}.tmp"
+        try:
+            shutil.copyfile(source_path, tmp_path)
+
+            with open(tmp_path, "r+b") as f:
+                for offset, old, new in self.edits:
+                    pwrite(f.fileno(), new, offset)
+                    logger.debug(lambda offset=offset, old=old, new=new:
+                                 f"({offset}) {old.hex().upper()} -> {new.hex().upper()}")
+
+            result = fingerprint_file(tmp_path)
+            if not result or result.get("sha256") != self.target.get("sha256"):
+                logger.error("Patched file does not match the patch file target hash.")
+                os.remove(tmp_path)
+                return False
+
+            os.replace(tmp_path, dest_path)
+        except OSError as e:
+            logger.error(f"Unable to apply patch file.")
+            logger.debug_error(e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        logger.info(f"Patch file applied to {dest_path}")
+
+        return True
@@ -0,0 +1,263 @@
+import re
+
+from . import *
+from .progress import BLOCK_SIZE, PatchCancelled
+
+WILDCARD = "??"
+
+MATCH_PENDING = "pending" # All edits of the match still hold the original bytes.
+MATCH_APPLIED = "applied" # All edits of the match already hold the patched bytes.
+MATCH_CONFLICT = "conflict" # Some edits hold neither, or a mix of original and patched bytes.
+
+
+def parse_signature(signature) -> list:
+    """
+    Parses a signature in the patcher's format into a list of byte values, with None for wildcards.
+
+    Accepts a string "48 8B 12 ?? ?? 85 C0" or a list ["48", "8B", "12", "??", "??", "85", "C0"].
+    """
+    if isinstance(signature, str):
+        signature = signature.split()
+
+    parsed = []
+    for token in signature:
+        token = str(token).strip().upper()
+        if token in (WILDCARD, "?"):
+            parsed.append(None)
+        else:
+            parsed.append(int(token, 16))
+
+    if not parsed:
+        raise ValueError("Empty signature.")
+
+    return parsed
+
+
+def format_signature(parsed_signature: list) -> str:
+    return " ".join(WILDCARD if value is None else f"{value:02X}" for value in parsed_signature)
+
+
+def _hex_to_bytes(value) -> bytes:
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if isinstance(value, (list, tuple)):
+        value = "".join(value)
+    return bytes.fromhex(str(value))
+
+
+class PatchEdit:
+    """
+    A single byte edit relative to the start of a signature match.
+    """
+
+    def __init__(self, offset: int, old, new) -> None:
+        self.offset = int(offset)
+        self.old = _hex_to_bytes(old)
+        self.new = _hex_to_bytes(new)
+
+        if len(self.old) != len(self.new):
+            raise ValueError(f"Edit at offset {self.offset} changes length ({len(self.old)} -> {len(self.new)}).")
+
+    def __repr__(self) -> str:
+        return f"PatchEdit({self.offset}, {self.old.hex().upper()} -> {self.new.hex().upper()})"
+
+
+class PatchRule:
+    """
+    A signature plus the edits to perform on each match of it.
+
+    The compiled pattern accepts both the original and the patched bytes at edited positions, so a single scan finds
+    unpatched and already patched sites alike.
+
+    :param max_matches: Maximum number of matches to patch. None patches every match in the file.
+    """
+
+    def __init__(self, rule_id: str, signature, edits: list, max_matches: Union[int, None] = 1) -> None:
+        self.rule_id = rule_id
+        self.signature = parse_signature(signature)
+        self.edits = sorted(edits, key=lambda edit: edit.offset)
+        self.max_matches = max_matches
+
+        self._validate()
+        self.pattern = self._compile()
+
+    def __repr__(self) -> str:
+        return f"PatchRule({self.rule_id}, {format_signature(self.signature)})"
+
+    def _validate(self) -> None:
+        if not self.edits:
+            raise ValueError(f"Rule {self.rule_id} has no edits.")
+
+        previous_end = 0
+        for edit in self.edits:
+            if edit.offset < previous_end:
+                raise ValueError(f"Rule {self.rule_id} has overlapping edits at offset {edit.offset}.")
+            if edit.offset + len(edit.old) > len(self.signature):
+                raise ValueError(f"Rule {self.rule_id} edit at offset {edit.offset} is outside of the signature.")
+
+            for i, old_byte in enumerate(edit.old):
+                expected = self.signature[edit.offset + i]
+                if expected is not None and expected != old_byte:
+                    raise ValueError(f"Rule {self.rule_id} edit at offset {edit.offset} does not match the signature.")
+
+            previous_end = edit.offset + len(edit.old)
+
+    def _compile(self) -> re.Pattern:
+        alternatives = {}
+        for edit in self.edits:
+            for i in range(len(edit.old)):
+                alternatives[edit.offset + i] = {edit.old[i], edit.new[i]}
+
+        pattern = b""
+        for position, value in enumerate(self.signature):
+            if position in alternatives:
+                accepted = alternatives[position]
+                if value is None:
+                    pattern += b"."
+                elif len(accepted) == 1:
+                    pattern += re.escape(bytes([value]))
+                else:
+                    pattern += b"[" + b"".join(re.escape(bytes([a])) for a in sorted(accepted)) + b"]"
+            elif value is None:
+                pattern += b"."
+            else:
+                pattern += re.escape(bytes([value]))
+
+        return re.compile(pattern, re.DOTALL)
+
+    def match_state(self, data, match_offset: int) -> str:
+        states = set()
+        for edit in self.edits:
+            start = match_offset + edit.offset
+            current = bytes(data[start:start + len(edit.old)])
+            if current == edit.old:
+                states.add(MATCH_PENDING)
+            elif current == edit.new:
+                states.add(MATCH_APPLIED)
+            else:
+                states.add(MATCH_CONFLICT)
+
+        if len(states) == 1:
+            return states.pop()
+
+        return MATCH_CONFLICT
+
+    def find_matches(self, data, checkpoint=None) -> list:
+        """
+        Scans data for the signature, one block at a time. Blocks overlap by the signature length, so matches across
+        block boundaries are found once.
+
+        :param checkpoint: Called with the number of bytes scanned after every block. May raise to stop the scan.
+        :return: A list of (match_offset, state) tuples.
+        """
+        matches = []
+        size = len(data)
+        overlap = len(self.signature) - 1
+        position = 0
+        last_end = 0 # Matches never overlap, as with a single finditer over the whole data.
+
+        while position < size:
+            block_end = min(position + BLOCK_SIZE, size)
+            for match in self.pattern.finditer(data, max(position, last_end), min(block_end + overlap, size)):
+                if match.start() >= block_end:
+                    break
+                matches.append((match.start(), self.match_state(data, match.start())))
+                last_end = match.end()
+                if self.max_matches is not None and len(matches) >= self.max_matches:
+                    return matches
+
+            position = block_end
+            if checkpoint is not None:
+                checkpoint(position)
+
+        return matches
+
+
+class PatchTransaction:
+    """
+    Collects absolute edits from any number of rules and matches, validates them together and writes them in a single
+    pass over the output. Nothing is written if any edit fails validation.
+    """
+
+    def __init__(self) -> None:
+        self._edits = [] # [(offset, old, new, rule_id), ...]
+
+    def __len__(self) -> int:
+        return len(self._edits)
+
+    @property
+    def edits(self) -> list:
+        return [(offset, old, new) for offset, old, new, _ in sorted(self._edits, key=lambda edit: edit[0])]
+
+    def clear(self) -> None:
+        self._edits.clear()
+
+    def stage(self, offset: int, old: bytes, new: bytes, rule_id: str = "") -> None:
+        self._edits.append((int(offset), bytes(old), bytes(new), rule_id))
+
+    def stage_match(self, rule: PatchRule, match_offset: int) -> None:
+        for edit in rule.edits:
+            self.stage(match_offset + edit.offset, edit.old, edit.new, rule.rule_id)
+
+    def validate(self, data) -> bool:
+        previous_end = 0
+        previous_rule = ""
+        for offset, old, new, rule_id in sorted(self._edits, key=lambda edit: edit[0]):
+            if len(old) != len(new):
+                logger.error(f"[{rule_id}] Edit at {offset} changes the file length.")
+                return False
+            if offset < previous_end:
+                logger.error(f"[{rule_id}] Edit at {offset} overlaps an edit of [{previous_rule}].")
+                return False
+            if offset + len(old) > len(data):
+                logger.error(f"[{rule_id}] Edit at {offset} is out of bounds.")
+                return False
+            if bytes(data[offset:offset + len(old)]) != old:
+                logger.error(f"[{rule_id}] Unexpected bytes at {offset}.")
+                return False
+
+            previous_end = offset + len(old)
+            previous_rule = rule_id
+
+        return True
+
+    def write(self, data, dest, checkpoint=None) -> bool:
+        """
+        Validates all staged edits against data and writes data with the edits applied to dest in one pass.
+
+        The output is written to a temporary file first and moved into place, so dest is never left half written,
+        not even when checkpoint raises PatchCancelled.
+
+        :param checkpoint: Called with the number of bytes written after every block. May raise to stop the write.
+        """
+        if not self.validate(data):
+            logger.error("Patch validation failed. Nothing was written.")
+            return False
+
+        view = memoryview(data)
+        tmp_dest = f"{dest}.tmp"
+        try:
+            with open(tmp_dest, "wb") as out:
+                position = 0
+                for offset, old, new in self.edits + [(len(view), b"", b"")]:
+                    while position < offset:
+                        block_end = min(position + BLOCK_SIZE, offset)
+                        out.write(view[position:block_end])
+                        position = block_end
+                        if checkpoint is not None:
+                            checkpoint(position)
+                    out.write(new)
+                    position = offset + len(new)
+            os.replace(tmp_dest, dest)
+        except (OSError, PatchCancelled) as e:
+            if os.path.exists(tmp_dest):
+                os.remove(tmp_dest)
+            if isinstance(e, PatchCancelled):
+                raise
+            logger.error(f"Unable to write {dest}.")
+            logger.debug_error(e)
+            return False
+        finally:
+            view.release()
+
+        return True
@@ -0,0 +1,82 @@
+import threading
+
+from . import *
+
+PROGRESS_UPDATES_PER_SECOND = 10 # Maximum progress callbacks per stage and second.
+BLOCK_SIZE = 4 * 1024 * 1024 # Bytes read, scanned or written between progress updates and cancellation checks.
+
+
+class PatchCancelled(Exception):
+    """
+    Raised between blocks of a long running stage once its CancellationToken is cancelled.
+    """
+
+
+class CancellationToken:
+    """
+    Shared between the thread requesting the cancellation and the thread doing the work, which checks it between
+    blocks. Once cancelled, it stays cancelled.
+
+    :param event: Event to back the token with. A multiprocessing Event shares the token with a child process.
+    """
+
+    def __init__(self, event=None) -> None:
+        self._event = event if event is not None else threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise PatchCancelled()
+
+
+class ProgressReporter:
+    """
+    Reports the bytes processed by one stage ("load", "scan", "write") to callback(stage, done, total), at most
+    rate times per second. The first update and the completed stage are always reported.
+
+    Every update is also a cancellation point: it raises PatchCancelled once token is cancelled.
+    """
+
+    def __init__(self, stage: str, total: int, callback=None, token: Union[CancellationToken, None] = None,
+                 rate: int = PROGRESS_UPDATES_PER_SECOND) -> None:
+        self.stage = stage
+        self.total = max(0, int(total))
+        self.done = 0
+
+        self._callback = callback
+        self._token = token
+        self._interval = 1.0 / rate if rate else 0.0
+        self._last_report = None
+        self._reported = None # Last value passed to callback.
+
+    def _report(self, done: int) -> None:
+        self.done = min(int(done), self.total)
+        if self._callback is None:
+            return
+
+        now = time.monotonic()
+        if self._last_report is not None and self.done < self.total and now - self._last_report < self._interval:
+            return
+
+        self._last_report = now
+        self._reported = self.done
+        self._callback(self.stage, self.done, self.total)
+
+    def update(self, done: int) -> None:
+        if self._token is not None:
+            self._token.raise_if_cancelled()
+
+        self._report(done)
+
+    def finish(self) -> None:
+        """
+        Reports the stage as complete. Not a cancellation point, the work is already done.
+        """
+        if self._reported != self.total:
+            self._report(self.total)
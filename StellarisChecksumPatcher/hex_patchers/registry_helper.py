@@ -1,3 +1,5 @@
+import winreg
+
 from . import *
 
 WINREG_KEY_READ = winreg.KEY_READ
@@ -0,0 +1,268 @@
+import mmap
+import bisect
+import itertools
+from collections import Counter
+
+from . import *
+from .patch_rules import PatchRule, PatchEdit, WILDCARD, MATCH_PENDING
+
+DEFAULT_MAX_RADIUS = 64 # Maximum bytes of context on each side of the patch site.
+ALIGN_RADIUS = 512 # Bytes around the reference site that anchors are taken from.
+ANCHOR_SIZE = 12 # Length of the k-mers used to locate the site in the other samples.
+ANCHOR_STRIDE = 16
+ANCHOR_VOTES = 3 # Anchors agreeing on the same shift needed to accept it.
+
+_UNBOUNDED = float("inf")
+
+
+def _open_sample(file_path) -> mmap.mmap:
+    with open(file_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _edit_candidates(data, old: bytes, new: bytes) -> list:
+    """
+    Every offset where each edited byte holds either its original or its patched value, which is what the compiled
+    PatchRule accepts at edited positions.
+    """
+    variants = {bytes(variant) for variant in itertools.product(*[sorted({o, n}) for o, n in zip(old, new)])}
+
+    positions = set()
+    for variant in variants:
+        position = data.find(variant)
+        while position != -1:
+            positions.add(position)
+            position = data.find(variant, position + 1)
+
+    return sorted(positions)
+
+
+def _is_unique(data, kmer: bytes, expected=None) -> Union[int, None]:
+    first = data.find(kmer)
+    if first == -1 or (expected is not None and first != expected) or data.find(kmer, first + 1) != -1:
+        return None
+    return first
+
+
+def align_site(reference, reference_site: int, sample) -> Union[int, None]:
+    """
+    Locates the patch site of reference in sample. k-mers around the reference site that occur exactly once in both
+    files vote for the shift between them; code moves between builds, but mostly as a block.
+    """
+    votes = Counter()
+    start = max(0, reference_site - ALIGN_RADIUS)
+    end = min(len(reference) - ANCHOR_SIZE, reference_site + ALIGN_RADIUS)
+
+    # Nearest anchors first, they are the most likely to have moved together with the site.
+    for anchor in sorted(range(start, end + 1, ANCHOR_STRIDE), key=lambda offset: abs(offset - reference_site)):
+        kmer = reference[anchor:anchor + ANCHOR_SIZE]
+        if len(set(kmer)) < 3: # Padding and zero runs are never unique anchors.
+            continue
+
+        found = _is_unique(sample, kmer)
+        if found is None or _is_unique(reference, kmer, expected=anchor) is None:
+            continue
+
+        votes[found - anchor] += 1
+        if votes[found - anchor] >= ANCHOR_VOTES:
+            break
+
+    if not votes:
+        return None
+
+    shift, count = votes.most_common(1)[0]
+    logger.debug("Site shift %d with %d anchor vote(s).", shift, count)
+
+    return reference_site + shift
+
+
+def _consensus(samples: list, edit_length: int, radius: int) -> dict:
+    """
+    {relative offset: byte} of the context bytes every sample agrees on around its site. Other offsets are wildcards.
+    """
+    consensus = {}
+    for relative in range(-radius, edit_length + radius):
+        values = set()
+        for data, site in samples:
+            position = site + relative
+            values.add(data[position] if 0 <= position < len(data) else None)
+        if len(values) == 1 and None not in values:
+            consensus[relative] = values.pop()
+
+    return consensus
+
+
+def _required_extents(data, site: int, candidates: list, left: list, right: list, edit_length: int) -> list:
+    """
+    For every candidate other than site: (left, right) extension of the window beyond the edit that first includes a
+    fixed byte the candidate does not hold. A window excludes the candidate if it reaches either.
+    """
+    size = len(data)
+    extents = []
+
+    for candidate in candidates:
+        if candidate == site:
+            continue
+
+        needed_left = _UNBOUNDED
+        for distance, value in left:
+            position = candidate - distance
+            if position < 0 or data[position] != value:
+                needed_left = distance
+                break
+
+        needed_right = _UNBOUNDED
+        for relative, value in right:
+            position = candidate + relative
+            if position >= size or data[position] != value:
+                needed_right = relative - edit_length + 1
+                break
+
+        extents.append((needed_left, needed_right))
+
+    return extents
+
+
+def _shortest_window(extents: list) -> Union[tuple, None]:
+    """
+    Smallest left + right extension that excludes every candidate, i.e. for each (l, r): left >= l or right >= r.
+    """
+    extents = sorted(extents)
+    needed_lefts = [l for l, _ in extents]
+    # suffix_right[i]: right extension that excludes the candidates i.. the left extension does not reach.
+    suffix_right = [0] * (len(extents) + 1)
+    for i in range(len(extents) - 1, -1, -1):
+        suffix_right[i] = max(suffix_right[i + 1], extents[i][1])
+
+    best = None
+    for left in sorted({0} | {l for l in needed_lefts if l != _UNBOUNDED}):
+        right = suffix_right[bisect.bisect_right(needed_lefts, left)]
+        if right == _UNBOUNDED:
+            continue
+        if best is None or left + right < best[0] + best[1]:
+            best = (left, right)
+
+    return best
+
+
+def locate_site(file_path, rules: list) -> Union[tuple, None]:
+    """
+    (site offset, PatchEdit) of the first edit of the first rule that matches file_path exactly once, unpatched.
+    """
+    data = _open_sample(file_path)
+    try:
+        for rule in rules:
+            matches = rule.find_matches(data)
+            if len(matches) == 1 and matches[0][1] == MATCH_PENDING and rule.edits:
+                return matches[0][0] + rule.edits[0].offset, rule.edits[0]
+    finally:
+        data.close()
+
+    return None
+
+
+def _derive_window(reference_path, reference_site: int, old: bytes, new: bytes, sample_paths, sample_sites: dict,
+                   max_radius: int, samples: list) -> tuple:
+    """
+    Opens and aligns the samples into samples, then returns ((left, right) extension, consensus) or (error, None).
+    """
+    reference = _open_sample(reference_path)
+    samples.append((reference_path, reference, reference_site))
+    if reference[reference_site:reference_site + len(old)] != old:
+        return f"{reference_path} does not hold {old.hex().upper()} at {reference_site}.", None
+
+    for sample_path in sample_paths:
+        data = _open_sample(sample_path)
+        site = sample_sites.get(sample_path)
+        if site is None:
+            site = align_site(reference, reference_site, data)
+        samples.append((sample_path, data, site))
+        if site is None:
+            return f"Unable to locate the patch site in {sample_path}.", None
+        if data[site:site + len(old)] != old:
+            return f"{sample_path} does not hold {old.hex().upper()} at its site {site}.", None
+        logger.info(f"Patch site of {sample_path} at {site}.")
+
+    consensus = _consensus([(data, site) for _, data, site in samples], len(old), max_radius)
+    left = [(distance, consensus[-distance]) for distance in range(1, max_radius + 1) if -distance in consensus]
+    right = [(relative, consensus[relative]) for relative in range(len(old), len(old) + max_radius)
+             if relative in consensus]
+
+    extents = []
+    for sample_path, data, site in samples:
+        candidates = _edit_candidates(data, old, new)
+        logger.info(f"{sample_path}: {len(candidates)} candidate site(s).")
+        extents.extend(_required_extents(data, site, candidates, left, right, len(old)))
+
+    window = _shortest_window(extents)
+    if window is None:
+        return f"No signature within {max_radius} bytes of the site matches only once.", None
+
+    return window, consensus
+
+
+def derive_signature(reference_path, reference_site: int, old: bytes, new: bytes, sample_paths=(),
+                     sample_sites: dict = None, max_radius: int = DEFAULT_MAX_RADIUS,
+                     rule_id: str = "checksum") -> dict:
+    """
+    Derives the shortest wildcarded signature around a known patch site that matches exactly once in the reference
+    and in every sample. Bytes that differ between the samples become wildcards.
+
+    :param reference_site: Offset of the edited bytes in the reference executable.
+    :param old: Original bytes at the site. new: Patched bytes.
+    :param sample_sites: {sample path: site offset} for samples whose site is known. Others are aligned by k-mers.
+    :return: {"signature": str, "edit_offset": int, "length": int, "wildcards": int, "sites": {path: offset},
+    "verified": bool, "rule": dict} or {"error": str}.
+    """
+    sample_sites = dict(sample_sites or {})
+    old, new = bytes(old), bytes(new)
+    if len(old) != len(new) or not old:
+        return {"error": "Original and patched bytes must have the same, non zero length."}
+
+    samples = [] # [(path, data, site), ...], the reference first.
+    try:
+        window, consensus = _derive_window(reference_path, reference_site, old, new, sample_paths, sample_sites,
+                                           max_radius, samples)
+        if isinstance(window, str):
+            return {"error": window}
+
+        left_extent, right_extent = window
+        signature = " ".join(f"{consensus[relative]:02X}" if relative in consensus else WILDCARD
+                             for relative in range(-left_extent, len(old) + right_extent))
+
+        # Verify with the patcher's own matching.
+        rule = PatchRule(rule_id, signature, edits=[PatchEdit(left_extent, old, new)], max_matches=None)
+        verified = all(rule.find_matches(data) == [(site - left_extent, MATCH_PENDING)] for _, data, site in samples)
+        sites = {sample_path: site for sample_path, _, site in samples}
+    finally:
+        for _, data, _ in samples:
+            data.close()
+
+    return {
+        "signature": signature,
+        "edit_offset": left_extent,
+        "length": left_extent + len(old) + right_extent,
+        "wildcards": signature.split().count(WILDCARD),
+        "sites": sites,
+        "verified": verified,
+        "rule": {
+            "rule_id": rule_id,
+            "signature": signature,
+            "edits": [{"offset": left_extent, "old": old.hex(" ").upper(), "new": new.hex(" ").upper()}],
+            "max_matches": 1,
+        },
+    }
+
+
+def format_report(result: dict) -> str:
+    if "error" in result:
+        return result["error"]
+
+    lines = [f"Signature ({result['length']} bytes, {result['wildcards']} wildcard(s), "
+             f"{'verified' if result['verified'] else 'NOT verified'}):",
+             f"  {result['signature']}",
+             f"Edit offset: {result['edit_offset']}",
+             "Sites:"]
+    lines.extend(f"  {site:>12}  {sample_path}" for sample_path, site in result["sites"].items())
+
+    return "\n".join(lines)
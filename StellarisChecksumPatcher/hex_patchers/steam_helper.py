@@ -1,105 +1,239 @@
+import threading
+
 from . import *
+from .concurrency import probe_in_parallel
+from .steam_index import SteamLibraryIndex
+from .steam_locator import get_steam_locator, find_library_folders_file
+from .vdf_parser import load_vdf, vdf_get, VDFParseError
 from typing import Union
 
 # KEY_LOCAL_MACHINE
 GAME_INSTALL_LOCATION_KEY = "InstallLocation"
 
-# KEY_LOCAL_MACHINE
-STEAM_REGISTRY_PATH_32 = "SOFTWARE\Valve\Steam"
-STEAM_REGISTRY_PATH_64 = "SOFTWARE\WOW6432Node\Valve\Steam"
-STEAM_INSTALL_LOCATION_KEY ="InstallPath"
 STEAM_STEAMAPPS_FOLDER = "steamapps"
+STEAM_COMMON_FOLDER = "common"
 STEAM_APP_MANIFEST_FILE_PREFIX = "appmanifest"
-STEAM_LIBRARY_FOLDERS_FILE_TRAIL = "config\libraryfolders.vdf" # Trail to join to steam install main path
+LIBRARY_PROBE_TIMEOUT = 5.0 # Seconds to wait for a library before reporting it unreachable (sleeping disks, NFS).
 
 class SteamHelper:
-    def __init__(self):
+    def __init__(self, library_index=None, locator=None):
         self.steam_install = None
         self.steam_library_paths = []
+        self.unreachable_library_paths = [] # Libraries that failed or timed out during the last probe.
+        self.library_index = library_index or SteamLibraryIndex()
+        self.locator = locator or get_steam_locator() # Steam root discovery backend for the running platform.
+        self.probe_timeout = LIBRARY_PROBE_TIMEOUT
 
-    @staticmethod
-    def _vdf_line_contains(vdf_line, argument_to_check) -> list:
-        vdf_line = str(vdf_line).lstrip().rstrip()
-        # logger.log_debug(f"{str(argument_to_check).upper()} in {vdf_line.upper()} = {str(argument_to_check).upper() in vdf_line.upper()}")
-        if str(argument_to_check).upper() in vdf_line.upper():
-            return vdf_line.split('"')
-
-        return []
-
-    def _get_game_install_info_from_name(self, game_name) -> dict:
-        # Parse Steam appmanifests (.acf files)
-
-        logger.info(f"Getting installation details for game: {game_name}")
-
+    def _ensure_steam_libraries(self) -> bool:
         if not self.steam_install:
             self.steam_install = self.get_steam_install_path()
             if not self.steam_install:
-                return {}
+                return False
 
         if not self.steam_library_paths:
             self.steam_library_paths = self.get_steam_libraries()
             if not self.steam_library_paths or self.steam_library_paths == []:
                 logger.error("No Steam Libraries found.")
+                return False
+
+        return True
+
+    def _probe_libraries(self, probe_function, stop) -> dict:
+        """
+        Runs probe_function on every library concurrently. The first library returning install details wins and
+        unreachable libraries are reported instead of stalling the lookup. stop is set once the lookup has its result.
+        """
+        results, unreachable = probe_in_parallel(self.steam_library_paths, probe_function, self.probe_timeout,
+                                                 first_match=True, stop=stop)
+        self.unreachable_library_paths = unreachable
+
+        for lib in unreachable:
+            logger.error(f"Steam Library unreachable: {lib}")
+
+        for install_details in results.values():
+            if install_details:
+                return install_details
+
+        return {}
+
+    def _read_app_manifest(self, lib, manifest_file, stop=None) -> dict:
+        """
+        Parses an appmanifest and records it in the library index, unless stop is set because the lookup that started
+        this probe already returned.
+        """
+        app_state = self.get_vdf_value(manifest_file, "AppState")
+        if not isinstance(app_state, dict):
+            return {}
+
+        title = vdf_get(app_state, "name")
+        app_id = vdf_get(app_state, "appid")
+        install_dir = vdf_get(app_state, "installdir", default=title)
+        build_id = vdf_get(app_state, "buildid")
+
+        if not title or not app_id:
+            return {}
+
+        if stop is None or not stop.is_set():
+            self.library_index.record(lib, manifest_file, app_id, title, install_dir, build_id)
+
+        return {
+            "title": title,
+            "app-id": app_id,
+            "install-dir": install_dir,
+            "build-id": build_id,
+            "steam-library": lib
+        }
+
+    def _get_game_install_info_from_app_id(self, app_id) -> dict:
+        # Open appmanifest_<app_id>.acf directly in each library instead of listing them.
+
+        logger.info(f"Getting installation details for App Id: {app_id}")
+
+        indexed = self.library_index.lookup(app_id=app_id)
+        if indexed:
+            logger.debug(f"Found indexed install of {app_id} in library {indexed.get('steam-library')}")
+            return indexed
+
+        if not self._ensure_steam_libraries():
+            return {}
+
+        stop = threading.Event()
+
+        def _probe_library(lib) -> dict:
+            manifest_file = os.path.join(lib, f"{STEAM_APP_MANIFEST_FILE_PREFIX}_{app_id}.acf")
+            if not os.path.isfile(manifest_file):
                 return {}
+            return self._read_app_manifest(lib, manifest_file, stop)
 
-        for lib in self.steam_library_paths:
-            logger.write_to_log_file('\n')
-            logger.debug(f"Checking Library \"{lib}\"")
+        install_details = self._probe_libraries(_probe_library, stop)
+        if install_details:
+            self.library_index.save()
+            logger.info(f'Found game install in {os.path.join(install_details.get("steam-library"), STEAM_COMMON_FOLDER, install_details.get("install-dir"))}')
+            return install_details
+
+        logger.error(f"Unable to determine installation information for App Id {app_id}")
+        return {}
+
+    def _get_game_install_info_from_name(self, game_name) -> dict:
+        # Parse Steam appmanifests (.acf files)
+
+        logger.info(f"Getting installation details for game: {game_name}")
+
+        indexed = self.library_index.lookup(title=game_name)
+        if indexed:
+            logger.debug(f"Found indexed install of {game_name} in library {indexed.get('steam-library')}")
+            return indexed
+
+        if not self._ensure_steam_libraries():
+            return {}
+
+        stop = threading.Event()
+
+        def _probe_library(lib) -> dict:
+            logger.debug("Checking Library \"%s\"", lib)
             for file in os.listdir(lib):
+                if stop.is_set(): # Another library already had the game.
+                    return {}
+
                 fname = file
                 file = os.path.join(lib, fname)
 
-                if not os.path.isfile(file):
-                    logger.debug(f"{file} is not a file.")
-                    continue
-
                 if not STEAM_APP_MANIFEST_FILE_PREFIX in fname:
                     continue
 
-                line_app_id = self.get_from_vdf_file(file, "\"appid\"")
-                line_name = self.get_from_vdf_file(file, "\"name\"")
+                if not os.path.isfile(file):
+                    logger.debug("%s is not a file.", file)
+                    continue
 
-                # Value to look for seems to always be in index 3
-                title = line_name[3]
-                app_id = line_app_id[3]
-                logger.debug(f"{app_id}: {title}")
+                # Every parsed manifest is indexed, so later lookups of other apps skip the listing as well.
+                install_details = self._read_app_manifest(lib, file, stop)
+                title = install_details.get("title")
+                logger.debug("%s: %s", install_details.get("app-id"), title)
                 if title == game_name:
-                    logger.debug(f"Found title match: {title} with App Id {app_id} in {fname} in library {lib}")
-                    logger.info(f'Found game install in {os.path.join(lib, f"common/{title}")}'.replace('/', '\\'))
-                    logger.write_to_log_file('\n')
-                    return {
-                        "title": title,
-                        "app-id": app_id,
-                        "steam-library": lib
-                    }
+                    logger.debug("Found title match: %s with App Id %s in %s in library %s", title, install_details.get("app-id"),
+                                 fname, lib)
+                    return install_details
 
+            return {}
+
+        install_details = self._probe_libraries(_probe_library, stop)
+        if install_details:
+            logger.info(f'Found game install in {os.path.join(install_details.get("steam-library"), STEAM_COMMON_FOLDER, install_details.get("install-dir"))}')
+            logger.write_to_log_file('\n')
+            self.library_index.save()
+            return install_details
+
+        self.library_index.save()
         logger.error(f"Unable to determine installation information for {game_name}")
         logger.write_to_log_file('\n')
         return {}
 
-    def get_from_vdf_file(self, vdf_file, key) -> list:
+    @staticmethod
+    def get_vdf_value(vdf_file, *keys, default=None):
         """
         Retrieve values from Steam's .vdf and .acf files.
 
+        The file is parsed once into nested dicts and cached until it changes on disk.
+
         :param vdf_file:
-        :param key:
-        :return: A list of matching parameters.
+        :param keys: Path of keys to the value, matched case-insensitively. No keys returns the whole document.
+        :return: The value (str or dict) or default.
         """
-        with open(vdf_file, 'r') as f:
-            lines = f.readlines()
-
-        values_out = []
-
-        for line in lines:
-            line = line.lstrip().rstrip()
-
-            value = self._vdf_line_contains(line, key)
+        try:
+            parsed = load_vdf(vdf_file)
+        except (OSError, VDFParseError) as e:
+            logger.error(f"Unable to parse {vdf_file}.")
+            logger.debug_error(e)
+            return default
+
+        return vdf_get(parsed, *keys, default=default)
+
+    def _get_root_libraries(self, steam_root) -> list:
+        library_file = find_library_folders_file(steam_root)
+
+        if not library_file:
+            # Without a library file the root's own steamapps folder is its only library.
+            root_library = os.path.join(steam_root, STEAM_STEAMAPPS_FOLDER)
+            if os.path.isdir(root_library):
+                return [os.path.abspath(root_library)]
+            logger.error(f"Could not locate Steam Library file in {steam_root}.")
+            return []
+
+        cached = self.locator.cache.get_libraries(library_file)
+        if cached is not None:
+            logger.debug(f"Using cached libraries of {library_file}")
+            return cached
+
+        library_folders = self.get_vdf_value(library_file, "libraryfolders")
+
+        if not isinstance(library_folders, dict):
+            return []
+
+        # Current format: "0" { "path" "..." }. Older format: "1" "D:\\SteamLibrary".
+        path_list = []
+        for key, entry in library_folders.items():
+            if isinstance(entry, dict):
+                path_list.append(vdf_get(entry, "path"))
+            elif key.isdigit():
+                path_list.append(entry)
+
+        # Probe every library concurrently so a sleeping disk or network mount does not stall the others.
+        path_list = [item for item in path_list if item]
+        results, unreachable = probe_in_parallel(path_list, os.path.isdir, self.probe_timeout)
+        self.unreachable_library_paths.extend(unreachable)
+
+        libraries = []
+        for item in path_list:
+            if item in unreachable:
+                logger.error(f"Steam Library unreachable: {item}")
+            elif results.get(item):
+                libraries.append(os.path.abspath(os.path.join(item, STEAM_STEAMAPPS_FOLDER)))
 
-            if value:
-                for v in value:
-                    values_out.append(v)
+        # Unreachable libraries are not cached, so they are probed again next time.
+        if not unreachable:
+            self.locator.cache.set_libraries(library_file, libraries)
 
-        return values_out
+        return libraries
 
     def get_steam_libraries(self) -> Union[list, bool]:
         logger.info("Getting available Steam Libraries...")
@@ -109,50 +243,44 @@ class SteamHelper:
             if not self.steam_install:
                 return False
 
-        library_file = os.path.join(self.steam_install, STEAM_LIBRARY_FOLDERS_FILE_TRAIL)
-
-        if not os.path.exists(library_file):
-            logger.error("Could not locate Steam Library file.")
-            return False
+        self.unreachable_library_paths = []
 
-        path_list = self.get_from_vdf_file(library_file, "\"PATH\"")
+        steam_roots = [self.steam_install] + [root for root in self.locator.find_steam_roots()
+                                              if root != self.steam_install]
+        for steam_root in steam_roots:
+            for item in self._get_root_libraries(steam_root):
+                if item not in self.steam_library_paths:
+                    self.steam_library_paths.append(item)
 
-        if not path_list:
+        if not self.steam_library_paths:
             return False
 
-        # So far, path seems to be in the 2nd index of the list but let's iterate over list and check for valid path
-        for item in path_list:
-            if os.path.isdir(item):
-                item = os.path.join(item, STEAM_STEAMAPPS_FOLDER)
-                if item not in self.steam_library_paths:
-                    self.steam_library_paths.append(os.path.abspath(item))
-
-        logger.debug(f"Known paths: {self.steam_library_paths}")
+        logger.debug("Known paths: %s", self.steam_library_paths)
 
         return self.steam_library_paths
 
-    def get_game_install_path(self, game_name) -> Union[str, bool]:
-        logger.info("Acquiring Stellaris installation...")
+    def get_game_install_path(self, game_name, app_id=None) -> Union[str, bool]:
+        logger.info(f"Acquiring {game_name} installation...")
+
+        install_details = {}
+        if app_id:
+            install_details = self._get_game_install_info_from_app_id(app_id)
 
-        install_details = self._get_game_install_info_from_name(game_name)
+        if not install_details:
+            install_details = self._get_game_install_info_from_name(game_name)
 
         if not install_details:
             return False
 
-        title_name = install_details.get("title")
-        install_folder = os.path.join(install_details.get("steam-library"), f"common/{title_name}")
+        install_folder = os.path.join(install_details.get("steam-library"), STEAM_COMMON_FOLDER,
+                                      install_details.get("install-dir"))
 
         return install_folder
 
     def get_steam_install_path(self) -> str:
         logger.info("Acquiring Steam installation...")
 
-        # Try 64-bit first
-        steam = registry_helper.read_key(STEAM_REGISTRY_PATH_64, STEAM_INSTALL_LOCATION_KEY)
-
-        # Try 32-bit if 64 failed.
-        if not steam:
-            steam = registry_helper.read_key(STEAM_REGISTRY_PATH_32, STEAM_INSTALL_LOCATION_KEY)
+        steam = self.locator.find_steam_root()
 
         if steam:
             self.steam_install = steam
@@ -160,4 +288,3 @@ class SteamHelper:
             logger.error("Unable to acquire Steam installation.")
         
         return steam
-        
\ No newline at end of file
@@ -0,0 +1,128 @@
+import threading
+
+from . import *
+
+STEAM_INDEX_FILE = "steam-library-index.json"
+STEAM_INDEX_VERSION = 1
+
+
+def _mtime_ns(path) -> Union[int, None]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class SteamLibraryIndex:
+    """
+    Persistent index of installed apps: app ID and title -> (library, installdir, buildid).
+
+    Entries store the modification times of their library folder and app manifest. An entry is only trusted while
+    both are unchanged, so resolving an install from the index costs two stat calls.
+    """
+
+    def __init__(self, index_file=None) -> None:
+        self.index_file = pathlib.Path(index_file) if index_file else pathlib.Path(config_folder) / STEAM_INDEX_FILE
+        self._apps = {} # {app_id: {"title", "library", "install-dir", "build-id", "manifest", "library-mtime", "manifest-mtime"}}
+        self._titles = {} # {title: app_id}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._loaded = False
+
+    def _load(self) -> None:
+        self._loaded = True
+
+        if not self.index_file.exists():
+            return
+
+        try:
+            with open(self.index_file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.debug_error(f"Discarding unreadable Steam index: {e}")
+            return
+
+        if data.get("version") != STEAM_INDEX_VERSION:
+            return
+
+        self._apps = data.get("apps", {})
+        self._titles = {entry.get("title"): app_id for app_id, entry in self._apps.items()}
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self._load()
+
+    def _is_valid(self, entry: dict) -> bool:
+        return (_mtime_ns(entry.get("library")) == entry.get("library-mtime")
+                and _mtime_ns(entry.get("manifest")) == entry.get("manifest-mtime"))
+
+    def lookup(self, app_id=None, title=None) -> dict:
+        """
+        Returns the indexed install of app_id (or title) if it is still valid on disk, otherwise an empty dict.
+        """
+        with self._lock:
+            self._ensure_loaded()
+
+            if app_id is None and title is not None:
+                app_id = self._titles.get(title)
+            entry = self._apps.get(str(app_id)) if app_id is not None else None
+
+            if not entry:
+                return {}
+
+            if not self._is_valid(entry):
+                logger.debug(f"Steam index entry for {app_id} is stale.")
+                self._apps.pop(str(app_id), None)
+                self._titles.pop(entry.get("title"), None)
+                self._dirty = True
+                return {}
+
+            return {
+                "title": entry.get("title"),
+                "app-id": str(app_id),
+                "install-dir": entry.get("install-dir"),
+                "build-id": entry.get("build-id"),
+                "steam-library": entry.get("library"),
+            }
+
+    def record(self, library, manifest, app_id, title, install_dir, build_id) -> None:
+        entry = {
+            "title": title,
+            "library": library,
+            "install-dir": install_dir,
+            "build-id": build_id,
+            "manifest": manifest,
+            "library-mtime": _mtime_ns(library),
+            "manifest-mtime": _mtime_ns(manifest),
+        }
+
+        with self._lock:
+            self._ensure_loaded()
+            if self._apps.get(str(app_id)) == entry:
+                return
+            self._apps[str(app_id)] = entry
+            self._titles[title] = str(app_id)
+            self._dirty = True
+
+    def save(self) -> bool:
+        with self._lock:
+            if not self._dirty:
+                return True
+
+            data = {"version": STEAM_INDEX_VERSION, "apps": self._apps}
+            tmp_file = self.index_file.with_name(self.index_file.name + ".tmp")
+            try:
+                if not self.index_file.parent.exists():
+                    os.makedirs(self.index_file.parent)
+                with open(tmp_file, "w") as f:
+                    f.write(json.dumps(data, indent=2))
+                os.replace(tmp_file, self.index_file)
+            except OSError as e:
+                logger.error("Unable to save Steam library index.")
+                logger.debug_error(e)
+                return False
+
+            self._dirty = False
+            logger.debug(f"Saved Steam library index to {self.index_file}")
+
+        return True
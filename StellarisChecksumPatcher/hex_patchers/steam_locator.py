@@ -0,0 +1,230 @@
+import glob
+import platform
+import threading
+
+from . import *
+from .concurrency import probe_in_parallel
+
+STEAM_LOCATION_CACHE_FILE = "steam-location-cache.json"
+STEAM_LOCATION_CACHE_VERSION = 1
+STEAM_ROOT_PROBE_TIMEOUT = 5.0
+
+# KEY_LOCAL_MACHINE
+STEAM_REGISTRY_PATH_32 = "SOFTWARE\\Valve\\Steam"
+STEAM_REGISTRY_PATH_64 = "SOFTWARE\\WOW6432Node\\Valve\\Steam"
+STEAM_INSTALL_LOCATION_KEY = "InstallPath"
+
+# Library folder files, relative to the Steam root, in order of preference.
+STEAM_LIBRARY_FOLDERS_FILES = (
+    os.path.join("config", "libraryfolders.vdf"),
+    os.path.join("steamapps", "libraryfolders.vdf"),
+)
+
+# Usual Linux Steam roots, relative to the home folder: native, ~/.steam symlinks, Debian, Flatpak and Snap.
+LINUX_STEAM_ROOTS = (
+    os.path.join(".steam", "steam"),
+    os.path.join(".steam", "root"),
+    os.path.join(".local", "share", "Steam"),
+    os.path.join(".steam", "debian-installation"),
+    os.path.join(".var", "app", "com.valvesoftware.Steam", ".local", "share", "Steam"),
+    os.path.join(".var", "app", "com.valvesoftware.Steam", "data", "Steam"),
+    os.path.join("snap", "steam", "common", ".local", "share", "Steam"),
+)
+
+# Windows Steam installed inside a Proton/Wine prefix, relative to steamapps/compatdata/<app_id>.
+PROTON_PREFIX_STEAM_ROOTS = (
+    os.path.join("pfx", "drive_c", "Program Files (x86)", "Steam"),
+    os.path.join("pfx", "drive_c", "Program Files", "Steam"),
+)
+
+
+def _mtime_ns(path) -> Union[int, None]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def find_library_folders_file(steam_root) -> Union[str, None]:
+    for trail in STEAM_LIBRARY_FOLDERS_FILES:
+        library_file = os.path.join(steam_root, trail)
+        if os.path.isfile(library_file):
+            return library_file
+
+    return None
+
+
+def is_steam_root(path) -> bool:
+    return os.path.isdir(os.path.join(path, "steamapps")) or find_library_folders_file(path) is not None
+
+
+class SteamLocationCache:
+    """
+    Persists the resolved Steam roots and the libraries of each.
+
+    The roots are trusted while they still exist and the libraries while the modification time of the library folders
+    file is unchanged, so a warm start resolves Steam with a couple of stat calls and no probing.
+    """
+
+    def __init__(self, cache_file=None) -> None:
+        self.cache_file = pathlib.Path(cache_file) if cache_file else pathlib.Path(config_folder) / STEAM_LOCATION_CACHE_FILE
+        self._data = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self._data is not None:
+            return self._data
+
+        self._data = {}
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == STEAM_LOCATION_CACHE_VERSION:
+                    self._data = data
+            except (OSError, ValueError) as e:
+                logger.debug_error(f"Discarding unreadable Steam location cache: {e}")
+
+        return self._data
+
+    def _save(self) -> None:
+        self._data["version"] = STEAM_LOCATION_CACHE_VERSION
+        tmp_file = self.cache_file.with_name(self.cache_file.name + ".tmp")
+        try:
+            if not self.cache_file.parent.exists():
+                os.makedirs(self.cache_file.parent)
+            with open(tmp_file, "w") as f:
+                f.write(json.dumps(self._data, indent=2))
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logger.error("Unable to save Steam location cache.")
+            logger.debug_error(e)
+
+    def get_roots(self) -> list:
+        with self._lock:
+            roots = self._load().get("roots", [])
+        if roots and all(os.path.isdir(root) for root in roots):
+            return list(roots)
+        return []
+
+    def set_roots(self, roots) -> None:
+        with self._lock:
+            data = self._load()
+            if data.get("roots") == list(roots):
+                return
+            data["roots"] = list(roots)
+            data.pop("libraries", None)
+            self._save()
+
+    def get_libraries(self, library_file) -> Union[list, None]:
+        with self._lock:
+            entry = self._load().get("libraries", {}).get(library_file)
+        if not entry or entry.get("mtime") != _mtime_ns(library_file):
+            return None
+        return list(entry.get("paths", []))
+
+    def set_libraries(self, library_file, libraries) -> None:
+        with self._lock:
+            data = self._load()
+            data.setdefault("libraries", {})[library_file] = {
+                "mtime": _mtime_ns(library_file),
+                "paths": list(libraries)
+            }
+            self._save()
+
+
+class SteamLocator:
+    """
+    Base discovery backend. Subclasses return the Steam roots found on their platform, the first being the main one.
+    """
+
+    def __init__(self, cache=None) -> None:
+        self.cache = cache or SteamLocationCache()
+        self.probe_timeout = STEAM_ROOT_PROBE_TIMEOUT
+
+    def _discover(self) -> list:
+        raise NotImplementedError
+
+    def find_steam_roots(self) -> list:
+        roots = self.cache.get_roots()
+        if roots:
+            logger.debug(f"Using cached Steam roots {roots}")
+            return roots
+
+        roots = self._discover()
+        if roots:
+            self.cache.set_roots(roots)
+
+        return roots
+
+    def find_steam_root(self) -> Union[str, None]:
+        roots = self.find_steam_roots()
+        return roots[0] if roots else None
+
+
+class WindowsSteamLocator(SteamLocator):
+    def _discover(self) -> list:
+        from . import registry_helper
+
+        # Try 64-bit first
+        steam = registry_helper.read_key(STEAM_REGISTRY_PATH_64, STEAM_INSTALL_LOCATION_KEY)
+
+        # Try 32-bit if 64 failed.
+        if not steam:
+            steam = registry_helper.read_key(STEAM_REGISTRY_PATH_32, STEAM_INSTALL_LOCATION_KEY)
+
+        return [steam] if steam else []
+
+
+class LinuxSteamLocator(SteamLocator):
+    def __init__(self, cache=None, home=None) -> None:
+        super().__init__(cache)
+        self.home = home or os.path.expanduser("~")
+
+    def _candidate_roots(self) -> list:
+        candidates = [os.path.join(self.home, trail) for trail in LINUX_STEAM_ROOTS]
+
+        xdg_data_home = os.getenv("XDG_DATA_HOME")
+        if xdg_data_home:
+            candidates.insert(0, os.path.join(xdg_data_home, "Steam"))
+
+        return candidates
+
+    @staticmethod
+    def _proton_roots(steam_root) -> list:
+        candidates = []
+        for trail in PROTON_PREFIX_STEAM_ROOTS:
+            pattern = os.path.join(glob.escape(steam_root), "steamapps", "compatdata", "*", trail)
+            candidates.extend(path for path in glob.glob(pattern) if is_steam_root(path))
+
+        return candidates
+
+    def _discover(self) -> list:
+        def _probe(candidate) -> Union[str, None]:
+            if is_steam_root(candidate):
+                return os.path.realpath(candidate)
+            return None
+
+        # ~/.steam/steam and ~/.steam/root are usually symlinks to one of the others, realpath de-duplicates them.
+        candidates = self._candidate_roots()
+        results, _ = probe_in_parallel(candidates, _probe, self.probe_timeout)
+        native_roots = list(dict.fromkeys(results[candidate] for candidate in candidates if results.get(candidate)))
+
+        # Windows Steam installs inside Proton compatdata prefixes contribute their libraries as well.
+        results, _ = probe_in_parallel(native_roots, self._proton_roots, self.probe_timeout)
+        proton_roots = [root for native_root in native_roots for root in results.get(native_root) or []]
+
+        roots = native_roots + [os.path.realpath(root) for root in proton_roots]
+        logger.debug(f"Found Steam roots: {roots}")
+
+        return roots
+
+
+def get_steam_locator(cache=None) -> SteamLocator:
+    """
+    Selects the discovery backend for the running platform.
+    """
+    if platform.system() == "Windows":
+        return WindowsSteamLocator(cache)
+
+    return LinuxSteamLocator(cache)
@@ -0,0 +1,145 @@
+import threading
+
+from . import *
+
+_ESCAPES = {"n": "\n", "t": "\t", "\\": "\\", "\"": "\""}
+_UNQUOTED_END = set(" \t\r\n{}\"")
+
+_parse_cache = {} # {path: ((mtime_ns, size), parsed)}
+_parse_cache_lock = threading.Lock()
+
+
+class VDFParseError(ValueError):
+    pass
+
+
+def _tokenize(text: str):
+    """
+    Yields the tokens of a VDF/ACF document in a single pass: strings (quoted or bare), "{" and "}".
+    Comments (//) and platform conditionals ([$WIN32]) are skipped.
+    """
+    i = 0
+    length = len(text)
+
+    while i < length:
+        char = text[i]
+
+        if char in " \t\r\n":
+            i += 1
+        elif char == "{" or char == "}":
+            yield char
+            i += 1
+        elif char == "/" and text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = length if newline == -1 else newline + 1
+        elif char == "[":
+            end = text.find("]", i)
+            i = length if end == -1 else end + 1
+        elif char == "\"":
+            i += 1
+            chunks = []
+            start = i
+            while True:
+                if i >= length:
+                    raise VDFParseError("Unterminated string.")
+                char = text[i]
+                if char == "\"":
+                    chunks.append(text[start:i])
+                    i += 1
+                    break
+                if char == "\\" and i + 1 < length:
+                    chunks.append(text[start:i])
+                    chunks.append(_ESCAPES.get(text[i + 1], text[i + 1]))
+                    i += 2
+                    start = i
+                    continue
+                i += 1
+            yield ("string", "".join(chunks))
+        else:
+            start = i
+            while i < length and text[i] not in _UNQUOTED_END:
+                i += 1
+            yield ("string", text[start:i])
+
+
+def parse_vdf(text: str) -> dict:
+    """
+    Parses a VDF/ACF document into nested dicts. Keys keep their original case; use vdf_get for case-insensitive
+    lookups. Duplicate keys keep the last value.
+    """
+    root = {}
+    stack = [root]
+    key = None
+
+    for token in _tokenize(text):
+        if token == "{":
+            if key is None:
+                raise VDFParseError("Block without a key.")
+            block = {}
+            stack[-1][key] = block
+            stack.append(block)
+            key = None
+        elif token == "}":
+            if len(stack) == 1:
+                raise VDFParseError("Unexpected closing brace.")
+            stack.pop()
+            key = None
+        elif key is None:
+            key = token[1]
+        else:
+            stack[-1][key] = token[1]
+            key = None
+
+    if len(stack) != 1:
+        raise VDFParseError("Unclosed block.")
+
+    return root
+
+
+def load_vdf(vdf_file) -> dict:
+    """
+    Reads and parses a VDF/ACF file. Parsed results are cached by path, modification time and size, so unchanged
+    files are never read twice.
+    """
+    vdf_file = os.path.abspath(vdf_file)
+    stat = os.stat(vdf_file)
+    stat_key = (stat.st_mtime_ns, stat.st_size)
+
+    with _parse_cache_lock:
+        cached = _parse_cache.get(vdf_file)
+    if cached and cached[0] == stat_key:
+        return cached[1]
+
+    with open(vdf_file, "r", encoding="utf-8", errors="replace") as f:
+        parsed = parse_vdf(f.read())
+
+    with _parse_cache_lock:
+        _parse_cache[vdf_file] = (stat_key, parsed)
+
+    return parsed
+
+
+def vdf_get(node, *keys, default=None):
+    """
+    Case-insensitive nested lookup: vdf_get(manifest, "AppState", "name").
+    """
+    for key in keys:
+        if not isinstance(node, dict):
+            return default
+        if key in node:
+            node = node[key]
+            continue
+        lowered = str(key).lower()
+        for candidate, value in node.items():
+            if candidate.lower() == lowered:
+                node = value
+                break
+        else:
+            return default
+
+    return node
+
+
+def clear_vdf_cache() -> None:
+    with _parse_cache_lock:
+        _parse_cache.clear()
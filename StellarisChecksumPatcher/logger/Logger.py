@@ -1,25 +1,169 @@
 # TODO: Refactor logging to use logging library.
 
 import os
+import queue
+import atexit
 import pathlib
 import logging
-from time import localtime, strftime
+import threading
+import traceback
+from typing import Union
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+from time import localtime, strftime, time
 
-from UI.ui_utils import WorkerSignals
 from . import config_folder
 
 LOG_FOLDER = config_folder
 LOG_FILE = "StellarisChecksumPatcherLog.txt"
+DEBUG_DUMP_FILE = "StellarisChecksumPatcherDebug-{timestamp}.txt"
+DEBUG_BUFFER_SIZE = 500 # Number of recent debug records kept in memory for dump_debug_buffer.
 
 print(f"LOG PATH: {LOG_FOLDER}")
 
+
+class _DeferredFlushMixin:
+    """
+    Stream handlers flush after every record. Under the listener they only flush when flush_now() is called, once the
+    queue has been drained, so a burst of records costs a single write to disk or terminal.
+    """
+
+    deferred = True
+
+    def flush(self):
+        if not self.deferred:
+            super().flush()
+
+    def flush_now(self):
+        super().flush()
+
+    def close(self):
+        self.flush_now()
+        super().close()
+
+
+class _FileHandler(_DeferredFlushMixin, logging.FileHandler):
+    def emit(self, record):
+        if getattr(record, "restart", False):
+            # Truncate in order with the records queued before the restart.
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.seek(0)
+            self.stream.truncate()
+            return
+
+        super().emit(record)
+
+
+class _StreamHandler(_DeferredFlushMixin, logging.StreamHandler):
+    pass
+
+
+class _SignalHandler(_DeferredFlushMixin, logging.Handler):
+    """
+    Forwards records to the UI terminal through a Qt signal, from the listener thread. Lines are collected and sent
+    as one signal per batch instead of one cross-thread signal per record. Records are dropped until a UI asks for
+    Logger.signals.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.signals = None
+        self._pending = []
+
+    def emit(self, record):
+        if self.signals is None:
+            return
+        self._pending.append(getattr(record, "console_log", record.getMessage()))
+        if not self.deferred:
+            self.flush_now()
+
+    def flush_now(self):
+        if self._pending:
+            lines, self._pending = self._pending, []
+            self.signals.progress.emit("\n".join(lines))
+
+
+class _ForwardHandler(_DeferredFlushMixin, logging.Handler):
+    """
+    Hands (level, message, console_log) of every record to send instead of writing it, see Logger.forward_records.
+    """
+
+    def __init__(self, send) -> None:
+        super().__init__()
+        self._send = send
+
+    def emit(self, record):
+        try:
+            self._send(record.levelno, record.getMessage(), getattr(record, "console_log", None))
+        except Exception:
+            self.handleError(record)
+
+
+class _LogFormatter(logging.Formatter):
+    def format(self, record):
+        # Raw records come from write_to_log_file and are written as is.
+        if getattr(record, "raw", False):
+            return record.getMessage()
+
+        return super().format(record)
+
+
+def _render(log_input, args) -> str:
+    """
+    Builds the final message: calls log_input if it is callable, then applies %-style args.
+    """
+    if callable(log_input):
+        log_input = log_input()
+
+    if args:
+        return str(log_input) % args
+
+    return f"{log_input}"
+
+
+def _format_exception(e: BaseException) -> str:
+    return "".join(traceback.format_exception(type(e), e, e.__traceback__)).strip()
+
+
+def _snapshot(log_input, args) -> tuple:
+    """
+    What the debug buffer keeps of a record. Exceptions are reduced to their formatted traceback, so the buffer keeps
+    no frames (and the data they reference) alive. Callables and plain %-style args stay unrendered until the record
+    is logged or dumped, so call sites pass values that do not change afterwards.
+    """
+    if isinstance(log_input, BaseException):
+        log_input = _format_exception(log_input)
+
+    if any(isinstance(arg, BaseException) for arg in args):
+        args = tuple(_format_exception(arg) if isinstance(arg, BaseException) else arg for arg in args)
+
+    return log_input, args
+
+
+def _is_console_record(record) -> bool:
+    return not getattr(record, "raw", False) and not getattr(record, "restart", False)
+
+
+class _BatchingQueueListener(QueueListener):
+    def dequeue(self, block):
+        if block and self.queue.empty():
+            # Nothing else pending, write out the batch before waiting for the next record.
+            for handler in self.handlers:
+                if isinstance(handler, _DeferredFlushMixin):
+                    handler.flush_now()
+
+        return super().dequeue(block)
+
+
 class Logger:
     def __init__(self,
                  is_debug=False,
                  logger_name: str = "DefaultAppLogger",
                  filepath: str = None,
                  filename: str = None,
-                 log_level: int = 1
+                 log_level: int = 1,
+                 debug_buffer_size: int = DEBUG_BUFFER_SIZE
                  ) -> None:
 
         self.is_debug = is_debug
@@ -38,9 +182,13 @@ class Logger:
         4 - CRITICAL
 
         :param log_level: 0 to 4
+        :param debug_buffer_size: Number of recent debug records kept in memory, even when debug is off.
         """
         
-        self.signals = WorkerSignals()
+        self._signals = None # Created on first access of signals, so headless use never imports Qt.
+
+        # (created, level, log_input, args) of recent debug records. Nothing is rendered unless it is dumped.
+        self._debug_buffer = deque(maxlen=debug_buffer_size)
 
         ##############################################################
         
@@ -79,16 +227,40 @@ class Logger:
         self.logger = logging.getLogger(logger_name)
         self.logger.setLevel(self.log_level)
 
-        formatter = logging.Formatter("[%(asctime)s] [%(levelname)-4s]: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
-        file_handler = logging.FileHandler(self.log_file)
-        stream_handler = logging.StreamHandler()
+        formatter = _LogFormatter("[%(asctime)s] [%(levelname)-4s]: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+        file_handler = _FileHandler(self.log_file)
+        stream_handler = _StreamHandler()
         stream_handler.setLevel(self.log_level)
+        signal_handler = _SignalHandler()
+        self._signal_handler = signal_handler
 
         stream_handler.setFormatter(formatter)
         file_handler.setFormatter(formatter)
 
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(stream_handler)
+        stream_handler.addFilter(_is_console_record)
+        signal_handler.addFilter(_is_console_record)
+
+        # Callers only enqueue records. A background listener writes them to the file, the terminal and the UI,
+        # so patching threads never block on disk or terminal I/O.
+        self._handlers = [file_handler, stream_handler, signal_handler]
+        self._queue_handler = QueueHandler(queue.Queue(-1))
+        self._listener = _BatchingQueueListener(self._queue_handler.queue, *self._handlers,
+                                                respect_handler_level=True)
+        self._shutdown_lock = threading.Lock()
+
+        self.logger.addHandler(self._queue_handler)
+        self._listener.start()
+
+        atexit.register(self.shutdown)
+
+    @property
+    def signals(self):
+        if self._signals is None:
+            from UI.ui_utils import WorkerSignals
+            self._signals = WorkerSignals()
+            self._signal_handler.signals = self._signals
+
+        return self._signals
 
     def create_log_folder(self):
         if not os.path.exists(LOG_FOLDER):
@@ -98,48 +270,140 @@ class Logger:
             with open(self.log_file, 'w') as f:
                 f.write("")
             
+    def _enqueue_file_record(self, log_input="", **flags):
+        # Bypasses the logger level, these records are only handled by the file handler.
+        record = logging.LogRecord(self.logger.name, logging.INFO, __file__, 0, log_input, None, None)
+        record.__dict__.update(flags)
+        self._queue_handler.handle(record)
+
     def restart_log_file(self):
         if not os.path.exists(LOG_FOLDER):
             os.makedirs(LOG_FOLDER)
-            
-        with open(self.log_file, 'w') as f:
-            f.write('')
-                
+
+        self._enqueue_file_record(restart=True)
+
     def write_to_log_file(self, log_input):
         if not log_input:
             log_input = ""
-            
-        if not os.path.exists(self.log_file):
-            with open(self.log_file, 'w') as f:
-                f.write(log_input + '\n')
-        else:
-            with open(self.log_file, 'a') as f:
-                f.write(log_input + '\n')
-    
-    def info(self, log_input):
-        console_log = f"[INFO] {log_input}"
-        self.signals.progress.emit(console_log)
-        self.logger.info(f"{log_input}")
-            
-    def debug(self, log_input):
-        console_log = f"[DEBUG] {log_input}"
-        if self.is_debug:
-            self.signals.progress.emit(console_log)
 
-        self.logger.debug(f"{log_input}")
-    
-    def error(self, log_input):
-        console_log = f"[ERROR] {log_input}"
-        self.signals.progress.emit(console_log)
-            
-        self.logger.error(f"{log_input}")
-            
-    def debug_error(self, log_input):
-        console_log = f"[DEBUG][ERROR] {log_input}"
-        if self.is_debug:
-            self.signals.progress.emit(console_log)
-        
-        self.logger.debug(f"[ERROR]: {log_input}")
+        self._enqueue_file_record(log_input, raw=True)
+
+    def shutdown(self):
+        """
+        Drains the queue and flushes every handler. Anything logged afterwards is written synchronously.
+        """
+        with self._shutdown_lock:
+            if self._listener is None:
+                return
+
+            self._listener.stop()
+            self._listener = None
+
+            self.logger.removeHandler(self._queue_handler)
+            for handler in self._handlers:
+                if isinstance(handler, _DeferredFlushMixin):
+                    handler.deferred = False
+                try:
+                    handler.flush()
+                except (OSError, ValueError):
+                    pass # Stream already closed at exit, as logging.shutdown tolerates too.
+                self.logger.addHandler(handler)
+
+    def forward_records(self, send) -> None:
+        """
+        Sends every record to send(level, message, console_log) instead of the file, the terminal and the UI. Used by
+        child processes, whose records are written by the parent through replay().
+        """
+        with self._shutdown_lock:
+            if self._listener is not None:
+                self._listener.stop()
+
+            for handler in self._handlers:
+                self.logger.removeHandler(handler) # Attached directly after shutdown().
+                handler.close()
+
+            self._handlers = [_ForwardHandler(send)]
+            self._handlers[0].addFilter(_is_console_record)
+            self._listener = _BatchingQueueListener(self._queue_handler.queue, *self._handlers,
+                                                    respect_handler_level=True)
+            if self._queue_handler not in self.logger.handlers:
+                self.logger.addHandler(self._queue_handler)
+            self._listener.start()
+
+    def replay(self, level: int, message: str, console_log: str = None) -> None:
+        """
+        Logs a record forwarded by another process as if it was logged here.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(level, message, extra={"console_log": console_log or message})
+
+    def dump_debug_buffer(self, reason=None) -> Union[pathlib.Path, None]:
+        """
+        Renders the buffered debug records to a timestamped file in the log folder and clears the buffer.
+        Meant for failures, so debug detail of successful runs never reaches the disk unless debug is on.
+
+        :return: Path of the dump or None.
+        """
+        entries = []
+        while self._debug_buffer:
+            entries.append(self._debug_buffer.popleft())
+
+        if not entries:
+            return None
+
+        dump_file = self.log_file.parent / DEBUG_DUMP_FILE.format(timestamp=strftime("%Y%m%d-%H%M%S", localtime()))
+
+        lines = [f"Debug records leading to: {reason}"] if reason else []
+        for created, level, log_input, args in entries:
+            try:
+                message = _render(log_input, args)
+            except Exception as e:
+                message = f"<unable to render {log_input!r}: {e}>"
+            lines.append(f"[{strftime('%Y-%m-%d %H:%M:%S', localtime(created))}] [{level}]: {message}")
+
+        try:
+            with open(dump_file, "w") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            self.error(f"Unable to write debug dump: {e}")
+            return None
+
+        self.info(f"Wrote {len(entries)} debug record(s) to {dump_file}")
+
+        return dump_file
+
+    # Messages may be callables and/or take %-style args. Either way they are only rendered when the level is
+    # enabled, e.g. logger.debug("%d match(es): %s", len(matches), matches) or logger.debug(lambda: expensive()).
+    # Debug records are also buffered unrendered, and only rendered if the buffer is dumped, see _snapshot.
+
+    def info(self, log_input, *args):
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        message = _render(log_input, args)
+        self.logger.info(message, extra={"console_log": f"[INFO] {message}"})
+
+    def debug(self, log_input, *args):
+        log_input, args = _snapshot(log_input, args)
+        self._debug_buffer.append((time(), "DEBUG", log_input, args))
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        message = _render(log_input, args)
+        self.logger.debug(message, extra={"console_log": f"[DEBUG] {message}"})
+
+    def error(self, log_input, *args):
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
+        message = _render(log_input, args)
+        self.logger.error(message, extra={"console_log": f"[ERROR] {message}"})
+
+    def debug_error(self, log_input, *args):
+        log_input, args = _snapshot(log_input, args)
+        self._debug_buffer.append((time(), "DEBUG][ERROR", log_input, args))
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        message = _render(log_input, args)
+        self.logger.debug(f"[ERROR]: {message}", extra={"console_log": f"[DEBUG][ERROR] {message}"})
 
     @staticmethod
     def _time_now():
@@ -1,8 +1,22 @@
+import sys
+import time
+import multiprocessing
+
+started = time.perf_counter()
+
 # 3rd-party
-from UI import stellaris_checksum_patcher_gui
+import cli
 
 debug_commands = ("-debug", "-d")
 
 if __name__ == '__main__':
-    w = stellaris_checksum_patcher_gui.StellarisChecksumPatcherGUI()
+    multiprocessing.freeze_support() # Patch processes start this executable again when frozen.
+
+    if cli.is_cli_invocation(sys.argv[1:]):
+        sys.exit(cli.run(sys.argv[1:]))
+
+    # Qt is only imported for the GUI, headless commands start without it.
+    from UI import stellaris_checksum_patcher_gui
+
+    w = stellaris_checksum_patcher_gui.StellarisChecksumPatcherGUI(started=started)
     w.show()
@@ -0,0 +1,331 @@
+import socketserver
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import *
+from hex_patchers import steam_helper
+from hex_patchers.HexPatcher import StellarisChecksumPatcher
+from hex_patchers.concurrency import JobCoalescer
+from hex_patchers.patch_file import fingerprint_file
+
+SERVICE_SOCKET_FILE = "stellaris-checksum-patcher.sock"
+DEFAULT_SOCKET_PATH = os.path.join(str(config_folder), SERVICE_SOCKET_FILE)
+DEFAULT_WORKERS = 2
+LATENCY_HISTORY = 256 # Number of finished jobs kept for latency stats.
+MAX_REQUEST_SIZE = 64 * 1024 # Maximum size of a single JSON request line.
+
+
+class PatchService:
+    """
+    Long-running patch service. Keeps the compiled patch rules, the fingerprint cache and the Steam library index warm
+    and runs jobs received over a Unix domain socket on a bounded worker pool.
+
+    Protocol: one JSON object per line, {"id": any, "job": str, "params": dict}. Every request is answered with one
+    JSON line, {"id": any, "ok": bool, "result": dict, "error": str, "queue_ms": float, "run_ms": float}.
+    """
+
+    def __init__(self, socket_path=None, max_workers: int = DEFAULT_WORKERS) -> None:
+        self.socket_path = socket_path or DEFAULT_SOCKET_PATH
+        self.max_workers = max(1, int(max_workers))
+
+        # Warm state shared by every job.
+        self._steam = steam_helper.SteamHelper()
+        self._patch_rules = StellarisChecksumPatcher(steam=self._steam).patch_rules
+
+        self._coalescer = JobCoalescer() # Duplicate jobs on the same executable wait for the running one.
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="PatchServiceWorker")
+        self._server = None
+
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._latencies = deque(maxlen=LATENCY_HISTORY) # [(queue_ms, run_ms), ...]
+
+        self.jobs = {
+            "patch": self._job_patch,
+            "probe": self._job_probe,
+            "revert": self._job_revert,
+            "benchmark": self._job_benchmark,
+        }
+
+    # =============================================
+    # ============== Class Functions ==============
+    # =============================================
+
+    def _new_patcher(self, params: dict) -> StellarisChecksumPatcher:
+        patcher = StellarisChecksumPatcher(steam=self._steam, patch_rules=self._patch_rules)
+        if params.get("output_dir"):
+            patcher.exe_out_directory = params.get("output_dir")
+
+        return patcher
+
+    @staticmethod
+    def _resolve_executable(patcher: StellarisChecksumPatcher, params: dict) -> str:
+        executable = params.get("executable")
+        if not executable:
+            executable = patcher.locate_game_install()
+
+        if not executable or not os.path.isfile(executable):
+            raise FileNotFoundError(f"Game executable not found: {executable}")
+
+        return os.path.abspath(executable)
+
+    def _load(self, params: dict) -> tuple:
+        patcher = self._new_patcher(params)
+        executable = self._resolve_executable(patcher, params)
+
+        if not patcher.load_file_hex(file_path=executable):
+            raise IOError(f"Unable to load {executable}")
+
+        return patcher, executable
+
+    def _patch(self, patcher: StellarisChecksumPatcher, executable: str, replace: bool) -> dict:
+        result = patcher.patch_executable(executable, replace=replace)
+        if not result["loaded"]:
+            raise IOError(f"Unable to load {executable}")
+
+        result["output"] = patcher.get_patched_file_path() if result["patched"] and not result["replaced"] else None
+
+        return result
+
+    def _probe(self, params: dict) -> dict:
+        patcher, executable = self._load(params)
+
+        result = patcher.probe()
+        result["executable"] = executable
+        result["fingerprint"] = fingerprint_file(executable)
+
+        return result
+
+    def _job_patch(self, params: dict) -> dict:
+        patcher = self._new_patcher(params)
+        executable = self._resolve_executable(patcher, params)
+        replace = bool(params.get("replace"))
+        key = ("patch", os.path.realpath(executable), patcher.exe_out_directory, replace)
+
+        return self._coalescer.run(key, self._patch, patcher, executable, replace)
+
+    def _job_probe(self, params: dict) -> dict:
+        patcher = self._new_patcher(params)
+        key = ("probe", os.path.realpath(self._resolve_executable(patcher, params)))
+
+        return self._coalescer.run(key, self._probe, params)
+
+    def _job_revert(self, params: dict) -> dict:
+        patcher = self._new_patcher(params)
+        executable = params.get("executable") or patcher.locate_game_install()
+        if not executable:
+            raise FileNotFoundError("Game executable not found.")
+
+        return {"executable": executable, "reverted": patcher.restore_original_file(executable)}
+
+    def _job_benchmark(self, params: dict) -> dict:
+        iterations = max(1, int(params.get("iterations", 3)))
+        timings = {"load_ms": [], "scan_ms": [], "fingerprint_ms": []}
+
+        for _ in range(iterations):
+            started = time.perf_counter()
+            patcher, executable = self._load(params)
+            loaded = time.perf_counter()
+            patcher.probe()
+            scanned = time.perf_counter()
+            fingerprint_file(executable)
+            fingerprinted = time.perf_counter()
+
+            timings["load_ms"].append((loaded - started) * 1000)
+            timings["scan_ms"].append((scanned - loaded) * 1000)
+            timings["fingerprint_ms"].append((fingerprinted - scanned) * 1000)
+
+        return {
+            name: {"min": round(min(values), 3), "avg": round(sum(values) / len(values), 3)}
+            for name, values in timings.items()
+        }
+
+    def _run_job(self, job_function, params: dict, queued_at: float) -> dict:
+        started = time.perf_counter()
+        with self._stats_lock:
+            self._queued -= 1
+            self._running += 1
+
+        response = {"ok": True, "result": None, "error": None}
+        try:
+            response["result"] = job_function(params)
+        except Exception as e:
+            logger.error(f"Job {job_function.__name__} failed: {e}")
+            response["ok"] = False
+            response["error"] = str(e)
+
+        finished = time.perf_counter()
+        response["queue_ms"] = round((started - queued_at) * 1000, 3)
+        response["run_ms"] = round((finished - started) * 1000, 3)
+
+        with self._stats_lock:
+            self._running -= 1
+            if response["ok"]:
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._latencies.append((response["queue_ms"], response["run_ms"]))
+
+        return response
+
+    # ===============================================
+    # ============== Regular Functions ==============
+    # ===============================================
+
+    def status(self) -> dict:
+        with self._stats_lock:
+            latencies = list(self._latencies)
+            status = {
+                "workers": self.max_workers,
+                "queue_depth": self._queued,
+                "coalescing": self._coalescer.in_flight(),
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+        if latencies:
+            total_ms = sorted(round(queue_ms + run_ms, 3) for queue_ms, run_ms in latencies)
+            status["latency_ms"] = {
+                "avg": round(sum(total_ms) / len(total_ms), 3),
+                "p50": total_ms[len(total_ms) // 2],
+                "p95": total_ms[min(len(total_ms) - 1, int(len(total_ms) * 0.95))],
+                "max": total_ms[-1],
+            }
+
+        return status
+
+    def submit(self, job: str, params: dict = None) -> dict:
+        """
+        Runs a job on the worker pool and blocks until it finishes.
+        """
+        params = params or {}
+
+        if job == "status":
+            return {"ok": True, "result": self.status(), "error": None}
+
+        job_function = self.jobs.get(job)
+        if not job_function:
+            return {"ok": False, "result": None, "error": f"Unknown job: {job}"}
+
+        with self._stats_lock:
+            self._queued += 1
+
+        future = self._executor.submit(self._run_job, job_function, params, time.perf_counter())
+
+        return future.result()
+
+    def serve_forever(self) -> bool:
+        if not hasattr(socket, "AF_UNIX"):
+            logger.error("Unix domain sockets are not supported on this platform.")
+            return False
+
+        socket_dir = os.path.dirname(os.path.abspath(self.socket_path))
+        if not os.path.exists(socket_dir):
+            os.makedirs(socket_dir)
+
+        if os.path.exists(self.socket_path):
+            try:
+                in_use = _socket_in_use(self.socket_path)
+            except OSError as e:
+                logger.error(f"Unable to check {self.socket_path}: {e}")
+                return False
+            if in_use:
+                logger.error(f"Another patch service is already listening on {self.socket_path}.")
+                return False
+            # Stale socket left behind by a previous service.
+            os.remove(self.socket_path)
+
+        self._server = _ServiceServer(self.socket_path, _ServiceRequestHandler)
+        self._server.service = self
+        os.chmod(self.socket_path, 0o600)
+
+        logger.info(f"Patch service listening on {self.socket_path} with {self.max_workers} worker(s).")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Stopping patch service.")
+        finally:
+            self.shutdown()
+
+        return True
+
+    def stop(self) -> None:
+        """
+        Makes a running serve_forever return. Called from another thread.
+        """
+        server = self._server
+        if server:
+            server.shutdown()
+
+    def shutdown(self) -> None:
+        if self._server:
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+        self._executor.shutdown(wait=True)
+
+
+class _ServiceRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_REQUEST_SIZE)
+            if not line:
+                break
+
+            try:
+                request = json.loads(line)
+                response = self.server.service.submit(request.get("job"), request.get("params"))
+                response["id"] = request.get("id")
+            except (ValueError, AttributeError) as e:
+                response = {"id": None, "ok": False, "result": None, "error": f"Invalid request: {e}"}
+
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _ServiceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:
+    _ServiceServer = None
+
+
+def _socket_in_use(socket_path) -> bool:
+    """
+    Whether a service accepts connections on socket_path. A socket file nobody listens on is stale.
+
+    :raises OSError: If socket_path cannot be checked, e.g. for lack of permissions.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+
+    return True
+
+
+def send_job(job: str, params: dict = None, socket_path=None, timeout: Union[float, None] = None) -> dict:
+    """
+    Sends a single job to a running patch service and returns its response.
+    """
+    request = {"id": os.getpid(), "job": job, "params": params or {}}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path or DEFAULT_SOCKET_PATH)
+        client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+
+        with client.makefile("rb") as response_stream:
+            line = response_stream.readline()
+
+    if not line:
+        return {"ok": False, "result": None, "error": "Service closed the connection."}
+
+    return json.loads(line)
@@ -0,0 +1,173 @@
+import queue
+import multiprocessing
+
+from . import *
+from hex_patchers.HexPatcher import StellarisChecksumPatcher
+from hex_patchers.progress import CancellationToken
+
+# Messages sent by the child process, one dict each:
+#   {"type": "log", "level": int, "message": str, "console_log": str}
+#   {"type": "progress", "stage": str, "done": int, "total": int}
+#   {"type": "result", "ok": bool, "result": dict, "error": str}  (always the last message)
+MESSAGE_LOG = "log"
+MESSAGE_PROGRESS = "progress"
+MESSAGE_RESULT = "result"
+
+POLL_INTERVAL = 0.1 # Seconds between checks of the cancellation token and the child while waiting for messages.
+EXIT_TIMEOUT = 5.0 # Seconds to wait for the child to exit after its result before terminating it.
+
+
+def _resolve_executable(patcher: StellarisChecksumPatcher, params: dict) -> str:
+    executable = params.get("executable") or patcher.locate_game_install()
+
+    if not executable or not os.path.isfile(executable):
+        raise FileNotFoundError(f"Game executable not found: {executable}")
+
+    return os.path.abspath(executable)
+
+
+def _new_patcher(params: dict) -> StellarisChecksumPatcher:
+    patcher = StellarisChecksumPatcher(profile=params.get("profile"), build=params.get("build"))
+    if params.get("output_dir"):
+        patcher.exe_out_directory = params.get("output_dir")
+
+    return patcher
+
+
+def _job_patch(params: dict, token: CancellationToken, progress) -> dict:
+    patcher = _new_patcher(params)
+    executable = _resolve_executable(patcher, params)
+
+    result = patcher.patch_executable(executable, replace=bool(params.get("replace")), token=token, progress=progress)
+    result["output"] = patcher.get_patched_file_path() if result["patched"] and not result["replaced"] else None
+
+    return result
+
+
+def _job_probe(params: dict, token: CancellationToken, progress) -> dict:
+    patcher = _new_patcher(params)
+    executable = _resolve_executable(patcher, params)
+
+    if not patcher.load_file_hex(file_path=executable, token=token, progress=progress):
+        raise IOError(f"Unable to load {executable}")
+
+    result = patcher.probe()
+    result["executable"] = executable
+
+    return result
+
+
+PROCESS_JOBS = {
+    "patch": _job_patch,
+    "probe": _job_probe,
+}
+
+
+def _child_main(job: str, params: dict, messages, cancel_event) -> None:
+    """
+    Entry point of the child process. Everything it logs is forwarded to the parent, followed by one result message.
+    """
+    logger.forward_records(lambda level, message, console_log: messages.put(
+        {"type": MESSAGE_LOG, "level": level, "message": message, "console_log": console_log}))
+
+    def _progress(stage, done, total):
+        messages.put({"type": MESSAGE_PROGRESS, "stage": stage, "done": done, "total": total})
+
+    response = {"type": MESSAGE_RESULT, "ok": True, "result": None, "error": None}
+    try:
+        response["result"] = PROCESS_JOBS[job](params, CancellationToken(cancel_event), _progress)
+    except Exception as e:
+        logger.error(f"Job {job} failed: {e}")
+        response["ok"] = False
+        response["error"] = str(e)
+
+    logger.shutdown() # Forward every pending record before the result.
+    messages.put(response)
+
+
+class PatchProcess:
+    """
+    Runs one job of PROCESS_JOBS in a child process, so the scan never holds the GIL of the calling process. The child
+    is started with "spawn" on every platform, which never forks the GUI's threads or Qt state.
+
+    Log records of the child are replayed by the parent logger, progress is passed to a callback and cancellation is
+    shared through a multiprocessing Event.
+    """
+
+    def __init__(self, job: str, params: dict = None) -> None:
+        if job not in PROCESS_JOBS:
+            raise ValueError(f"Unknown job: {job}")
+
+        self.job = job
+        self.params = params or {}
+
+        self._context = multiprocessing.get_context("spawn")
+        self._messages = self._context.Queue()
+        self._cancel_event = self._context.Event()
+        self._process = None
+
+    # =============================================
+    # ============== Class Functions ==============
+    # =============================================
+
+    def _handle(self, message: dict, progress) -> None:
+        if message["type"] == MESSAGE_LOG:
+            logger.replay(message["level"], message["message"], message.get("console_log"))
+        elif message["type"] == MESSAGE_PROGRESS and progress is not None:
+            progress(message["stage"], message["done"], message["total"])
+
+    def _join(self) -> None:
+        self._process.join(EXIT_TIMEOUT)
+        if self._process.is_alive():
+            logger.error("Patch process did not exit, terminating it.")
+            self._process.terminate()
+            self._process.join()
+
+    # ===============================================
+    # ============== Regular Functions ==============
+    # ===============================================
+
+    def start(self) -> None:
+        self._process = self._context.Process(target=_child_main, name=f"PatchProcess-{self.job}", daemon=True,
+                                              args=(self.job, self.params, self._messages, self._cancel_event))
+        self._process.start()
+        logger.debug("Started patch process %s for %s", self._process.pid, self.job)
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    def run(self, token: CancellationToken = None, progress=None) -> dict:
+        """
+        Starts the child and blocks until its result, handling its messages meanwhile. Only the calling thread
+        blocks, waiting on the message queue without holding the GIL.
+
+        :param token: Cancelling it cancels the child at its next block.
+        :param progress: Called as progress(stage, done, total) for the progress messages of the child.
+        :return: {"ok": bool, "result": dict, "error": str}
+        """
+        if self._process is None:
+            self.start()
+
+        while True:
+            if token is not None and token.cancelled:
+                self.cancel()
+
+            try:
+                message = self._messages.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    # The child may have put its last messages right before exiting.
+                    try:
+                        message = self._messages.get(timeout=POLL_INTERVAL)
+                    except queue.Empty:
+                        error = f"Patch process exited with code {self._process.exitcode}."
+                        logger.error(error)
+                        return {"ok": False, "result": None, "error": error}
+                else:
+                    continue
+
+            if message["type"] == MESSAGE_RESULT:
+                self._join()
+                return {key: message[key] for key in ("ok", "result", "error")}
+
+            self._handle(message, progress)
@@ -0,0 +1,161 @@
+import json
+import os
+import time
+import pathlib
+import sqlite3
+import threading
+
+from utils.global_defines import logger, config_folder
+
+INSTALL_STORE_FILE = "stellaris-checksum-patcher-installs.sqlite3"
+INSTALL_STORE_FIELDS = ("path", "size", "mtime", "sha256", "signature_id", "offset", "patched", "backup", "timings",
+                        "updated")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS installs (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime INTEGER,
+    sha256 TEXT,
+    signature_id TEXT,
+    offset INTEGER,
+    patched INTEGER NOT NULL DEFAULT 0,
+    backup TEXT,
+    timings TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS installs_sha256 ON installs (sha256);
+"""
+
+class InstallStore:
+    """
+    One record per game executable: path, size, mtime (ns), sha256, signature ID and offset of the match, patched
+    state, backup file and the timings of the last run. Records are looked up by path (primary key) or by hash
+    (indexed).
+
+    Backed by SQLite in the config folder. The connection is opened on first use and shared between threads.
+    """
+
+    def __init__(self, db_file=None):
+        self.db_file = pathlib.Path(db_file) if db_file else pathlib.Path(config_folder) / INSTALL_STORE_FILE
+        self._connection = None
+        self._lock = threading.Lock()
+
+    # =============================================
+    # ============== Class Functions ==============
+    # =============================================
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if not self.db_file.parent.exists():
+                os.makedirs(self.db_file.parent)
+
+            self._connection = sqlite3.connect(str(self.db_file), timeout=10, check_same_thread=False)
+            self._connection.row_factory = sqlite3.Row
+            # WAL lets other instances read while one writes.
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+            logger.debug("Opened install store %s", self.db_file)
+
+        return self._connection
+
+    @staticmethod
+    def _to_record(row) -> dict:
+        if row is None:
+            return {}
+
+        record = dict(row)
+        record["patched"] = bool(record.get("patched"))
+        record["timings"] = json.loads(record["timings"]) if record.get("timings") else {}
+
+        return record
+
+    def _query(self, sql, parameters=()) -> list:
+        try:
+            with self._lock:
+                return self._connect().execute(sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Unable to read install store.")
+            logger.debug_error(e)
+            return []
+
+    # ===============================================
+    # ============== Regular Functions ==============
+    # ===============================================
+
+    def get(self, path) -> dict:
+        rows = self._query("SELECT * FROM installs WHERE path = ?", (os.path.abspath(path),))
+        return self._to_record(rows[0]) if rows else {}
+
+    def find_by_hash(self, sha256) -> list:
+        rows = self._query("SELECT * FROM installs WHERE sha256 = ? ORDER BY updated DESC", (sha256,))
+        return [self._to_record(row) for row in rows]
+
+    def all(self) -> list:
+        return [self._to_record(row) for row in self._query("SELECT * FROM installs ORDER BY updated DESC")]
+
+    def is_current(self, record: dict) -> bool:
+        """
+        True while the executable on disk still has the size and mtime the record was made with.
+        """
+        try:
+            stat = os.stat(record.get("path"))
+        except (OSError, TypeError):
+            return False
+
+        return stat.st_size == record.get("size") and stat.st_mtime_ns == record.get("mtime")
+
+    def record(self, path, **fields) -> bool:
+        """
+        Creates or updates the record of path. Only the given fields change; size and mtime are taken from the file.
+        """
+        path = os.path.abspath(path)
+        unknown = set(fields) - set(INSTALL_STORE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown install store fields: {', '.join(sorted(unknown))}")
+
+        try:
+            stat = os.stat(path)
+            fields.setdefault("size", stat.st_size)
+            fields.setdefault("mtime", stat.st_mtime_ns)
+        except OSError:
+            pass
+
+        if "patched" in fields:
+            fields["patched"] = int(bool(fields["patched"]))
+        if "timings" in fields:
+            fields["timings"] = json.dumps(fields["timings"] or {})
+        fields["updated"] = time.time()
+
+        columns = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in fields)
+
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute(f"INSERT INTO installs (path, {columns}) VALUES (?, {placeholders}) "
+                                       f"ON CONFLICT(path) DO UPDATE SET {updates}", (path, *fields.values()))
+        except sqlite3.Error as e:
+            logger.error("Unable to update install store.")
+            logger.debug_error(e)
+            return False
+
+        return True
+
+    def remove(self, path) -> None:
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute("DELETE FROM installs WHERE path = ?", (os.path.abspath(path),))
+        except sqlite3.Error as e:
+            logger.error("Unable to update install store.")
+            logger.debug_error(e)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
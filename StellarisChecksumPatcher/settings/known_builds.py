@@ -0,0 +1,239 @@
+import json
+import os
+import time
+import pathlib
+import sqlite3
+import threading
+
+from utils.global_defines import logger, config_folder
+
+KNOWN_BUILDS_FILE = "stellaris-checksum-patcher-known-builds.sqlite3"
+KNOWN_BUILDS_FORMAT = "stellaris-checksum-known-builds"
+KNOWN_BUILDS_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS known_builds (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    patched_sha256 TEXT,
+    profile_id TEXT,
+    build TEXT,
+    signature_id TEXT,
+    offset INTEGER,
+    edits TEXT NOT NULL,
+    origin TEXT,
+    hits INTEGER NOT NULL DEFAULT 0,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS known_builds_patched_sha256 ON known_builds (patched_sha256);
+CREATE INDEX IF NOT EXISTS known_builds_size ON known_builds (size);
+"""
+
+
+def _encode_edits(edits) -> str:
+    return json.dumps([{"offset": int(offset), "old": bytes(old).hex().upper(), "new": bytes(new).hex().upper()}
+                       for offset, old, new in edits])
+
+
+def _decode_edits(edits) -> list:
+    if isinstance(edits, str):
+        edits = json.loads(edits)
+
+    decoded = []
+    for edit in edits:
+        old, new = bytes.fromhex(edit["old"]), bytes.fromhex(edit["new"])
+        if len(old) != len(new) or not old:
+            raise ValueError(f"Edit at offset {edit['offset']} changes length ({len(old)} -> {len(new)}).")
+        decoded.append((int(edit["offset"]), old, new))
+
+    return sorted(decoded, key=lambda edit: edit[0])
+
+
+class KnownBuilds:
+    """
+    Executables patched before, keyed by the sha256 of the original file: the edits that patch it (offset, original
+    and patched bytes), the signature and offset of the match and the sha256 of the patched file.
+
+    Filled automatically by every successful scan and shareable through export_file/import_file, so a build any user
+    already patched is patched again without scanning.
+
+    Backed by SQLite in the config folder. The connection is opened on first use and shared between threads.
+    """
+
+    def __init__(self, db_file=None):
+        self.db_file = pathlib.Path(db_file) if db_file else pathlib.Path(config_folder) / KNOWN_BUILDS_FILE
+        self._connection = None
+        self._lock = threading.Lock()
+
+    # =============================================
+    # ============== Class Functions ==============
+    # =============================================
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if not self.db_file.parent.exists():
+                os.makedirs(self.db_file.parent)
+
+            self._connection = sqlite3.connect(str(self.db_file), timeout=10, check_same_thread=False)
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+            logger.debug("Opened known builds %s", self.db_file)
+
+        return self._connection
+
+    @staticmethod
+    def _to_entry(row) -> dict:
+        if row is None:
+            return {}
+
+        entry = dict(row)
+        entry["edits"] = _decode_edits(entry["edits"])
+
+        return entry
+
+    def _query(self, sql, parameters=()) -> list:
+        try:
+            with self._lock:
+                return self._connect().execute(sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Unable to read known builds.")
+            logger.debug_error(e)
+            return []
+
+    def _execute(self, sql, parameters=()) -> bool:
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute(sql, parameters)
+        except sqlite3.Error as e:
+            logger.error("Unable to update known builds.")
+            logger.debug_error(e)
+            return False
+
+        return True
+
+    # ===============================================
+    # ============== Regular Functions ==============
+    # ===============================================
+
+    def get(self, sha256) -> dict:
+        """
+        The known build whose original file has this sha256, with its edits as [(offset, old, new), ...].
+        """
+        if not sha256:
+            return {}
+
+        rows = self._query("SELECT * FROM known_builds WHERE sha256 = ?", (str(sha256).lower(),))
+        return self._to_entry(rows[0]) if rows else {}
+
+    def find_patched(self, sha256) -> dict:
+        """
+        The known build whose patched file has this sha256.
+        """
+        if not sha256:
+            return {}
+
+        rows = self._query("SELECT * FROM known_builds WHERE patched_sha256 = ? LIMIT 1", (str(sha256).lower(),))
+        return self._to_entry(rows[0]) if rows else {}
+
+    def find_by_size(self, size: int) -> list:
+        """
+        Known builds whose original file has this size, the candidates for a file that was not hashed yet.
+        """
+        rows = self._query("SELECT * FROM known_builds WHERE size = ? ORDER BY hits DESC", (int(size),))
+        return [self._to_entry(row) for row in rows]
+
+    def all(self) -> list:
+        return [self._to_entry(row) for row in self._query("SELECT * FROM known_builds ORDER BY updated DESC")]
+
+    def record(self, sha256, size: int, edits, patched_sha256=None, profile_id=None, build=None, signature_id=None,
+               offset=None, origin="scan") -> bool:
+        """
+        Creates or replaces the known build of sha256.
+        """
+        if not sha256 or not edits:
+            return False
+
+        return self._execute(
+            "INSERT INTO known_builds (sha256, size, patched_sha256, profile_id, build, signature_id, offset, edits, "
+            "origin, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(sha256) DO UPDATE SET "
+            "size = excluded.size, patched_sha256 = excluded.patched_sha256, profile_id = excluded.profile_id, "
+            "build = excluded.build, signature_id = excluded.signature_id, offset = excluded.offset, "
+            "edits = excluded.edits, origin = excluded.origin, updated = excluded.updated",
+            (str(sha256).lower(), int(size), str(patched_sha256).lower() if patched_sha256 else None, profile_id,
+             build, signature_id, offset, _encode_edits(edits), origin, time.time()))
+
+    def hit(self, sha256) -> None:
+        self._execute("UPDATE known_builds SET hits = hits + 1 WHERE sha256 = ?", (str(sha256).lower(),))
+
+    def remove(self, sha256) -> None:
+        self._execute("DELETE FROM known_builds WHERE sha256 = ?", (str(sha256).lower(),))
+
+    def export_file(self, file_path) -> int:
+        """
+        Writes every known build to a JSON file that import_file accepts.
+
+        :return: Number of exported builds.
+        """
+        entries = self.all()
+        builds = [{
+            "source": {"size": entry["size"], "sha256": entry["sha256"]},
+            "target": {"size": entry["size"], "sha256": entry["patched_sha256"]},
+            "profile_id": entry["profile_id"],
+            "build": entry["build"],
+            "signature_id": entry["signature_id"],
+            "offset": entry["offset"],
+            "edits": json.loads(_encode_edits(entry["edits"])),
+        } for entry in entries]
+
+        directory = os.path.dirname(os.path.abspath(file_path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        with open(file_path, "w") as f:
+            f.write(json.dumps({"format": KNOWN_BUILDS_FORMAT, "version": KNOWN_BUILDS_VERSION, "builds": builds},
+                               indent=2))
+        logger.info(f"Exported {len(builds)} known build(s) to {file_path}")
+
+        return len(builds)
+
+    def import_file(self, file_path) -> int:
+        """
+        Adds the builds of a file written by export_file. Builds already known are replaced.
+
+        :raises ValueError: If the file is not a known builds file.
+        :return: Number of imported builds.
+        """
+        with open(file_path, "r") as f:
+            data = json.load(f)
+
+        if not isinstance(data, dict) or data.get("format") != KNOWN_BUILDS_FORMAT:
+            raise ValueError("Not a known builds file.")
+        if data.get("version", 0) > KNOWN_BUILDS_VERSION:
+            raise ValueError(f"Unsupported known builds version {data.get('version')}.")
+
+        imported = 0
+        for build in data.get("builds", []):
+            try:
+                edits = _decode_edits(build["edits"])
+                source = build["source"]
+                if self.record(source["sha256"], source["size"], edits,
+                               patched_sha256=(build.get("target") or {}).get("sha256"),
+                               profile_id=build.get("profile_id"), build=build.get("build"),
+                               signature_id=build.get("signature_id"), offset=build.get("offset"),
+                               origin="import"):
+                    imported += 1
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"Skipping invalid known build: {e}")
+
+        logger.info(f"Imported {imported} known build(s) from {file_path}")
+
+        return imported
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -1,10 +1,22 @@
 import json
 import os
+import time
+import atexit
 import pathlib
+import threading
 
 from utils.global_defines import logger, config_folder
 
+SAVE_DELAY = 1.0 # Seconds to coalesce setter calls into a single write.
+RELOAD_CHECK_INTERVAL = 2.0 # Minimum seconds between checks of the config file for changes made by other instances.
+
 class Settings:
+    """
+    Settings are loaded once and served from memory. The file is only re-read when its modification time changes,
+    checked at most every RELOAD_CHECK_INTERVAL seconds. Setters mark keys dirty and schedule a single debounced,
+    atomic write (temporary file + os.replace), so readers never see a half-written config.
+    """
+
     def __init__(self):
         self.patcher_settings = {
                 "app-version": "",
@@ -13,41 +25,151 @@ class Settings:
         self._config_file_name = "stellaris-checksum-patcher-settings.json"
         self.config_file = pathlib.Path(config_folder) / self._config_file_name
 
+        self._lock = threading.RLock()
+        self._dirty = set() # Keys changed in memory and not yet written.
+        self._loaded = False
+        self._config_mtime = None # Modification time of the config file when it was last read or written.
+        self._last_check = 0.0
+        self._save_timer = None
+
+        atexit.register(self.flush)
+
+    # =============================================
+    # ============== Class Functions ==============
+    # =============================================
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load_config()
+            return
+
+        now = time.monotonic()
+        if now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return
+        self._last_check = now
+
+        if self._file_mtime() != self._config_mtime:
+            logger.debug("Config changed on disk, reloading.")
+            self.load_config()
+
+    def _schedule_save(self) -> None:
+        if self._save_timer is not None:
+            return
+
+        self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._ensure_loaded()
+            return self.patcher_settings.get(key, default)
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            if key in self.patcher_settings and self.patcher_settings.get(key) == value:
+                return
+            self.patcher_settings[key] = value
+            self._dirty.add(key)
+            self._schedule_save()
+
+    # ===============================================
+    # ============== Regular Functions ==============
+    # ===============================================
+
     def set_app_version(self, version: str):
-        self.patcher_settings["app-version"] = version
-        self.save_config()
+        self.set("app-version", version)
 
     def get_app_version(self):
-        self.load_config()
-        v = self.patcher_settings.get("app-version")
+        v = self.get("app-version")
         return v
 
     def set_install_location(self, install_path) -> None:
-        self.patcher_settings["install-location"] = install_path
-        self.save_config()
+        self.set("install-location", install_path)
 
     def get_install_location(self) -> str:
-        self.load_config()
-        i = self.patcher_settings.get("install-location")
+        i = self.get("install-location")
         return i
 
-    def save_config(self):
-        if config_folder == '' or not pathlib.Path(config_folder).exists():
-            os.makedirs(config_folder)
-            logger.debug(f"Generated config folder {config_folder}")
+    def flush(self) -> bool:
+        """
+        Writes pending changes now instead of waiting for the debounce delay.
+        """
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+
+            if not self._dirty:
+                return True
+
+            return self.save_config()
+
+    def save_config(self) -> bool:
+        with self._lock:
+            if config_folder == '' or not pathlib.Path(config_folder).exists():
+                os.makedirs(config_folder)
+                logger.debug("Generated config folder %s", config_folder)
+
+            # Keep keys another instance wrote since we last read the file; only our dirty keys override them.
+            if self._loaded and self._file_mtime() != self._config_mtime:
+                self.load_config()
 
-        with open(self.config_file, 'w') as config_file:
-            config_file.write(json.dumps(self.patcher_settings, indent=2))
-            logger.debug(f"Saved config to {self.config_file}")
+            tmp_file = self.config_file.with_name(f"{self.config_file.name}.{os.getpid()}.tmp")
+            try:
+                with open(tmp_file, 'w') as config_file:
+                    config_file.write(json.dumps(self.patcher_settings, indent=2))
+                    config_file.flush()
+                    os.fsync(config_file.fileno())
+                os.replace(tmp_file, self.config_file)
+            except OSError as e:
+                logger.error("Unable to save config.")
+                logger.debug_error(e)
+                if tmp_file.exists():
+                    tmp_file.unlink()
+                return False
 
+            self._dirty.clear()
+            self._loaded = True
+            self._config_mtime = self._file_mtime()
+            logger.debug("Saved config to %s", self.config_file)
+
+        return True
 
     def load_config(self):
-        if config_folder == '' or not pathlib.Path(config_folder).exists()\
-                or not pathlib.Path(self.config_file).exists():
-            logger.debug(f"Config does not exists.")
-            return False
-
-        logger.debug(f"Loading config from {config_folder}")
-        with open(self.config_file, 'r') as config_file:
-            self.patcher_settings = json.load(config_file)
-        logger.debug(self.patcher_settings)
\ No newline at end of file
+        with self._lock:
+            self._loaded = True
+            self._last_check = time.monotonic()
+
+            if config_folder == '' or not pathlib.Path(config_folder).exists()\
+                    or not pathlib.Path(self.config_file).exists():
+                logger.debug("Config does not exists.")
+                self._config_mtime = None
+                return False
+
+            logger.debug("Loading config from %s", config_folder)
+            try:
+                mtime = self._file_mtime()
+                with open(self.config_file, 'r') as config_file:
+                    loaded = json.load(config_file)
+            except (OSError, ValueError) as e:
+                logger.error("Unable to read config.")
+                logger.debug_error(e)
+                return False
+
+            # Unsaved changes made in memory take precedence over the file.
+            for key in self._dirty:
+                loaded[key] = self.patcher_settings.get(key)
+
+            self.patcher_settings.update(loaded)
+            self._config_mtime = mtime
+            logger.debug(self.patcher_settings)
+
+        return True
@@ -1,53 +1,334 @@
-import requests
+import hashlib
 import json
+import os
+import time
+import pathlib
 
-from utils.global_defines import logger
+from typing import Union
+from utils.global_defines import logger, config_folder
+
+UPDATE_CACHE_FILE = "update-check-cache.json"
+UPDATE_CACHE_TTL = 6 * 60 * 60 # Seconds a cached release is used without asking GitHub again.
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+DOWNLOAD_FOLDER = "downloads"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_PART_SUFFIX = ".part"
+DOWNLOAD_PROGRESS_INTERVAL = 0.1 # Minimum seconds between progress signals.
 
 class Updater:
-    def __init__(self):
+    def __init__(self, url=None, cache_file=None, cache_ttl=UPDATE_CACHE_TTL):
         self.owner = "r0fld4nc3"
         self.repo_name = "Stellaris-Exe-Checksum-Patcher"
         self.download_cancelled = False
 
         self.repo = f"{self.owner}/{self.repo_name}"
-        self.url = f"https://api.github.com/repos/{self.repo}/releases/latest"
+        self.url = url or f"https://api.github.com/repos/{self.repo}/releases/latest"
 
         self._release_tag = "tag_name"
         self._assets_tag = "assets"
         self._download_url = "browser_download_url"
+        self._asset_size = "size"
+        self._asset_digest = "digest"
 
         self.pulled_release = {}
         self.download_location = ""  # Local disk location to save the downloaded file.
 
         self.local_version = "1.0.0"
 
-    def check_for_update(self):
-        logger.info("Checking for Stellaris Checksum Patcher update...")
+        # Last release response, revalidated with its ETag once older than cache_ttl and used as is when offline.
+        self.cache_file = pathlib.Path(cache_file) if cache_file else pathlib.Path(config_folder) / UPDATE_CACHE_FILE
+        self.cache_ttl = cache_ttl
+
+    # =============================================
+    # ============== Class Functions ==============
+    # =============================================
+
+    def _load_cache(self) -> dict:
+        try:
+            with open(self.cache_file, "r") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if cache.get("url") != self.url or not isinstance(cache.get("release"), dict):
+            return {}
 
+        return cache
+
+    def _save_cache(self, cache: dict) -> None:
+        tmp_file = self.cache_file.with_name(self.cache_file.name + ".tmp")
         try:
-            response = requests.get(self.url, timeout=60)
-        except requests.ConnectionError as con_err:
+            if not self.cache_file.parent.exists():
+                os.makedirs(self.cache_file.parent)
+            with open(tmp_file, "w") as f:
+                f.write(json.dumps(cache, indent=2))
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logger.error("Unable to save update check cache.")
+            logger.debug_error(e)
+
+    def _release_subset(self, release: dict) -> dict:
+        # Only what check_for_update needs is cached, not the whole GitHub response.
+        return {
+            self._release_tag: release.get(self._release_tag),
+            self._assets_tag: [{self._download_url: asset.get(self._download_url),
+                                self._asset_size: asset.get(self._asset_size),
+                                self._asset_digest: asset.get(self._asset_digest)}
+                               for asset in release.get(self._assets_tag) or [] if isinstance(asset, dict)]
+        }
+
+    @staticmethod
+    def _digest_sha256(digest) -> Union[str, None]:
+        # GitHub reports asset digests as "sha256:<hex>".
+        if isinstance(digest, str) and digest.lower().startswith("sha256:"):
+            return digest.split(":", 1)[1].lower()
+        return None
+
+    def _read_part(self, part_file, meta_file, url) -> tuple:
+        """
+        Returns (resume_from, validator, sha256 of the bytes already downloaded) for a partial download of url, or
+        (0, None, fresh hash) when there is nothing to resume. The validator is the strong ETag, or else the
+        Last-Modified date, of the response the part came from. A part without one is not resumed, since If-Range is
+        the only thing keeping a changed asset from being appended to it.
+        """
+        sha = hashlib.sha256()
+
+        try:
+            with open(meta_file, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+
+        if meta.get("url") != url or not os.path.isfile(part_file):
+            return 0, None, sha
+
+        etag = meta.get("etag")
+        validator = etag if etag and not etag.startswith("W/") else meta.get("last-modified")
+        if not validator:
+            logger.info("Partial download has no ETag or Last-Modified to resume against, restarting it.")
+            return 0, None, sha
+
+        # Hash what is already on disk so the final digest covers the whole file.
+        received = 0
+        with open(part_file, "rb") as f:
+            while True:
+                chunk = f.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                received += len(chunk)
+
+        return received, validator, sha
+
+    def _fetch_release(self, cache: dict, force: bool = False) -> dict:
+        """
+        Returns the latest release, from the cache while it is fresh, otherwise with a conditional request. An
+        unchanged release costs a 304 and the cached release is used when GitHub cannot be reached.
+        """
+        if cache and not force and time.time() - cache.get("fetched", 0) < self.cache_ttl:
+            logger.debug("Using cached release info from %s", self.cache_file)
+            return cache["release"]
+
+        headers = {"Accept": "application/vnd.github+json"}
+        if cache.get("etag"):
+            headers["If-None-Match"] = cache["etag"]
+        if cache.get("last-modified"):
+            headers["If-Modified-Since"] = cache["last-modified"]
+
+        import requests # Imported on first use, it is slow to import and only needed when going online.
+
+        try:
+            response = requests.get(self.url, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        except requests.RequestException as con_err:
             logger.error(f"Unable to establish connection to update repo.")
             logger.debug_error(con_err)
-            return False
+            if cache:
+                logger.info("Using cached release info.")
+                return cache["release"]
+            return {}
+
+        if response.status_code == 304 and cache:
+            logger.debug("Release unchanged (304).")
+            cache["fetched"] = time.time()
+            self._save_cache(cache)
+            return cache["release"]
+
+        if response.status_code != 200:
+            logger.error(f"Update check failed: HTTP {response.status_code} from {self.url}")
+            return cache.get("release", {})
+
+        try:
+            release = response.json()
+        except ValueError as e:
+            logger.error("Update repo returned an invalid response.")
+            logger.debug_error(e)
+            return cache.get("release", {})
+
+        if not isinstance(release, dict):
+            logger.error("Update repo returned an invalid response.")
+            return cache.get("release", {})
 
-        if not response.status_code == 200:
-            logger.error("Not a valid repository.")
+        release = self._release_subset(release)
+        self._save_cache({
+            "url": self.url,
+            "etag": response.headers.get("ETag"),
+            "last-modified": response.headers.get("Last-Modified"),
+            "fetched": time.time(),
+            "release": release
+        })
+
+        return release
+
+    # ===============================================
+    # ============== Regular Functions ==============
+    # ===============================================
+
+    def check_for_update(self, force=False):
+        logger.info("Checking for Stellaris Checksum Patcher update...")
+
+        pulled_release = self._fetch_release(self._load_cache(), force=force)
+
+        assets = pulled_release.get(self._assets_tag) or []
+        if not pulled_release.get(self._release_tag) or not assets or not assets[0].get(self._download_url):
+            logger.error("No release information available.")
+            return False
 
-        pulled_release = response.json()
         self.pulled_release = {
                 "name":     f"{self.repo_name}",
                 "latest":   pulled_release[self._release_tag],
-                "download": pulled_release[self._assets_tag][0][self._download_url],
-                "asset":    pulled_release[self._assets_tag][0][self._download_url].split("/")[-1]
+                "download": assets[0][self._download_url],
+                "asset":    assets[0][self._download_url].split("/")[-1],
+                "size":     assets[0].get(self._asset_size),
+                "sha256":   self._digest_sha256(assets[0].get(self._asset_digest))
         }
 
-        logger.debug(f"Release info:\n{json.dumps(self.pulled_release, indent=2)}")
+        logger.debug(lambda release=self.pulled_release: f"Release info:\n{json.dumps(release, indent=2)}")
 
         is_new_version = self.compare_release_versions(self.pulled_release.get("latest"), self.local_version)
 
         return is_new_version
 
+    def download_update(self, destination=None, signals=None, expected_sha256=None) -> Union[str, None]:
+        """
+        Streams the asset of the pulled release to <destination>.part in fixed size chunks, hashing it as it arrives,
+        then moves it into place atomically. An interrupted download is resumed with a Range request on the next call.
+
+        :param destination: Target file. Defaults to the asset name in download_location, or in the config folder.
+        :param signals: WorkerSignals; download_progress is emitted with (received, total).
+        :param expected_sha256: Overrides the digest reported by the release, if any.
+        :return: Path of the downloaded file or None. Setting download_cancelled stops the transfer, keeping the
+        partial file for a later resume.
+        """
+        url = self.pulled_release.get("download")
+        if not url:
+            logger.error("No release to download. Check for updates first.")
+            return None
+
+        if not destination:
+            download_dir = self.download_location or os.path.join(str(config_folder), DOWNLOAD_FOLDER)
+            destination = os.path.join(download_dir, self.pulled_release.get("asset"))
+
+        destination = os.path.abspath(destination)
+        part_file = destination + DOWNLOAD_PART_SUFFIX
+        meta_file = part_file + ".json"
+        expected_sha256 = expected_sha256 or self.pulled_release.get("sha256")
+        expected_size = self.pulled_release.get("size")
+
+        if not os.path.exists(os.path.dirname(destination)):
+            os.makedirs(os.path.dirname(destination))
+
+        import requests
+
+        self.download_cancelled = False
+        received, validator, sha = self._read_part(part_file, meta_file, url)
+
+        headers = {}
+        if received:
+            logger.info(f"Resuming download at {received} bytes.")
+            headers["Range"] = f"bytes={received}-"
+            headers["If-Range"] = validator # The server answers 200 with the whole file if the asset changed.
+
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)) as response:
+                if response.status_code == 416 and received:
+                    # Nothing left to send; the partial file may already be complete.
+                    total = received
+                    mode = None
+                elif response.status_code == 206 and received:
+                    content_range = response.headers.get("Content-Range", "")
+                    if not content_range.startswith(f"bytes {received}-"):
+                        logger.error(f"Unexpected Content-Range in resumed download: {content_range}")
+                        return None
+                    total = self._to_int(content_range.rsplit("/", 1)[-1]) if "/" in content_range else 0
+                    mode = "ab"
+                elif response.status_code == 200:
+                    if received:
+                        logger.info("Server sent the whole file, restarting download.")
+                    received, sha = 0, hashlib.sha256()
+                    total = self._to_int(response.headers.get("Content-Length", 0))
+                    mode = "wb"
+                else:
+                    logger.error(f"Download failed: HTTP {response.status_code} from {url}")
+                    return None
+
+                total = total if isinstance(total, int) else 0
+
+                if mode == "wb":
+                    # Validators of the response the part starts with, sent as If-Range when resuming it.
+                    with open(meta_file, "w") as f:
+                        f.write(json.dumps({"url": url, "etag": response.headers.get("ETag"),
+                                            "last-modified": response.headers.get("Last-Modified")}))
+
+                if mode:
+                    last_progress = 0.0
+                    with open(part_file, mode) as f:
+                        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            if self.download_cancelled:
+                                logger.info("Download cancelled.")
+                                return None
+                            if not chunk:
+                                continue
+
+                            f.write(chunk)
+                            sha.update(chunk)
+                            received += len(chunk)
+
+                            now = time.monotonic()
+                            if signals and now - last_progress >= DOWNLOAD_PROGRESS_INTERVAL:
+                                signals.download_progress.emit(received, total)
+                                last_progress = now
+
+                        f.flush()
+                        os.fsync(f.fileno())
+        except (requests.RequestException, OSError) as e:
+            logger.error("Download interrupted. It will resume on the next attempt.")
+            logger.debug_error(e)
+            return None
+
+        if signals:
+            signals.download_progress.emit(received, total)
+
+        if (total and received != total) or (expected_size and received != expected_size):
+            logger.error(f"Download incomplete: {received} of {total or expected_size} bytes.")
+            return None
+
+        digest = sha.hexdigest()
+        if not expected_sha256:
+            logger.info("The release reports no sha256 for this asset, skipping the integrity check.")
+        elif digest != expected_sha256.lower():
+            logger.error("Downloaded file does not match the expected sha256. Discarding it.")
+            for stale_file in (part_file, meta_file):
+                if os.path.exists(stale_file):
+                    os.remove(stale_file)
+            return None
+
+        os.replace(part_file, destination)
+        os.remove(meta_file)
+        logger.info(f"Downloaded {os.path.basename(destination)} ({received} bytes, sha256 {digest})")
+
+        return destination
+
     def compare_release_versions(self, pulled, existing) -> bool:
         _pulled_version = list(str(pulled).lower().split("v")[1].split("."))
         _pulled_major = self._to_int(_pulled_version[0])
@@ -2,6 +2,7 @@ import sys
 import os
 import pathlib
 import platform
+import threading
 
 _system = platform.system()
 debug_commands = ("-debug", "-d")
@@ -12,7 +13,8 @@ if _system == "Windows":
     config_folder = pathlib.Path(sys_drive + "\\r0fld4nc3\\Apps\\Stellaris\\ChecksumPatcher")
 elif _system == "Linux" or _system == "Darwin":
     print("Target System Linux")
-    sys_drive = pathlib.Path("usr/bin/r0fld4nc3")
+    # Absolute, so caches and databases never land in whatever directory the app was started from.
+    sys_drive = pathlib.Path(os.getenv("XDG_CONFIG_HOME") or pathlib.Path.home() / ".config") / "r0fld4nc3"
     config_folder = pathlib.Path(sys_drive) / "Apps" / "Stellaris" / "ChecksumPatcher"
 else:
     print("Target System Other")
@@ -20,8 +22,6 @@ else:
     sys_drive = pathlib.Path.cwd()
     config_folder = pathlib.Path(sys_drive) / r"\r0fld4nc3" / "Apps" / "Stellaris" / "ChecksumPatcher"
 
-from logger.Logger import Logger
-
 if len(sys.argv) > 1 and str(sys.argv[1]).lower() in debug_commands:
     is_debug = True
     print(f"Sys Drive: {sys_drive}")
@@ -29,10 +29,74 @@ if len(sys.argv) > 1 and str(sys.argv[1]).lower() in debug_commands:
 else:
     is_debug = False
 
-logger = Logger(is_debug=is_debug, logger_name="StellarisChecksumPatcherLogger")
 
-from updater.updater import Updater
-updater = Updater()
+# Shared singletons are created on first access (PEP 562), so importing this module, the patch engine or the CLI
+# builds nothing up front and pulls in neither Qt nor requests.
+
+def _create_logger():
+    from logger.Logger import Logger
+    return Logger(is_debug=is_debug, logger_name="StellarisChecksumPatcherLogger")
+
+
+def _create_updater():
+    from updater.updater import Updater
+    return Updater()
+
+
+def _create_settings():
+    from settings.settings import Settings
+    return Settings()
+
+
+def _create_install_store():
+    from settings.install_store import InstallStore
+    return InstallStore()
+
+
+def _create_known_builds():
+    from settings.known_builds import KnownBuilds
+    return KnownBuilds()
+
+
+_LAZY_SINGLETONS = {
+    "logger": _create_logger,
+    "updater": _create_updater,
+    "settings": _create_settings,
+    "install_store": _create_install_store,
+    "known_builds": _create_known_builds,
+}
+_lazy_lock = threading.RLock()
+
+
+def _resolve(name):
+    with _lazy_lock:
+        if name not in globals():
+            globals()[name] = _LAZY_SINGLETONS[name]()
+
+    return globals()[name]
+
+
+def __getattr__(name):
+    if name not in _LAZY_SINGLETONS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return _resolve(name)
+
+
+class LazySingleton:
+    """
+    Stands in for a shared singleton and creates it on the first attribute access. Packages bind these at import
+    time instead of the singletons themselves, e.g. logger = LazySingleton("logger"), so importing them stays free of
+    side effects.
+    """
+
+    def __init__(self, name: str) -> None:
+        if name not in _LAZY_SINGLETONS:
+            raise ValueError(f"Unknown singleton: {name}")
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(_resolve(self._name), attribute)
 
-from settings.settings import Settings
-settings = Settings()
+    def __repr__(self) -> str:
+        return f"LazySingleton({self._name})"
@@ -0,0 +1,62 @@
+import os
+import sys
+import random
+import tempfile
+
+import pytest
+
+# The config folder is resolved when utils.global_defines is first imported, so it has to point to a scratch folder
+# before any module of the patcher is.
+os.environ["XDG_CONFIG_HOME"] = tempfile.mkdtemp(prefix="scp-tests-")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "StellarisChecksumPatcher"))
+
+SIGNATURE_HEAD = bytes.fromhex("48 8B 12")
+CHECKSUM_TEST = bytes.fromhex("85 C0")
+CHECKSUM_PATCHED = bytes.fromhex("33 C0")
+EDIT_OFFSET = 17 # Of the checksum test inside the signature of the built-in Stellaris profile.
+
+
+def make_executable_bytes(size: int = 1 << 20, site: int = 300_000, seed: int = 0) -> bytearray:
+    """
+    Random bytes holding the checksum signature of the built-in Stellaris profile once, at site.
+    """
+    rng = random.Random(seed)
+    data = bytearray(rng.randbytes(size))
+    data[site:site + EDIT_OFFSET + 2] = SIGNATURE_HEAD + rng.randbytes(EDIT_OFFSET - 3) + CHECKSUM_TEST
+    return data
+
+
+@pytest.fixture
+def make_executable(tmp_path):
+    def _make(name="stellaris.exe", **kwargs):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(make_executable_bytes(**kwargs))
+        return path
+
+    return _make
+
+
+@pytest.fixture
+def make_patcher(tmp_path):
+    """
+    Patchers sharing their own install store and known builds database, writing to tmp_path / out_dir.
+    """
+    from hex_patchers.HexPatcher import StellarisChecksumPatcher
+    from settings.install_store import InstallStore
+    from settings.known_builds import KnownBuilds
+
+    store = InstallStore(tmp_path / "install-store.sqlite")
+    builds_db = KnownBuilds(tmp_path / "known-builds.sqlite")
+
+    def _make(out_dir="out", **kwargs):
+        patcher = StellarisChecksumPatcher(steam=object(), store=store, builds_db=builds_db, **kwargs)
+        patcher.exe_out_directory = str(tmp_path / out_dir)
+        return patcher
+
+    yield _make
+
+    store.close()
+    builds_db.close()
@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import hex_patchers
+from hex_patchers.concurrency import FileLock, default_lock_file
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(hex_patchers.__file__)))
+
+_TRY_LOCK = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from hex_patchers.concurrency import FileLock
+lock = FileLock(sys.argv[2], timeout=0.2)
+print("acquired" if lock.acquire() else "timeout")
+lock.release()
+"""
+
+
+def _try_lock_in_child(target) -> str:
+    completed = subprocess.run([sys.executable, "-c", _TRY_LOCK, PACKAGE_DIR, str(target)], capture_output=True,
+                               text=True, timeout=60)
+    return completed.stdout.strip().splitlines()[-1]
+
+
+def test_lock_excludes_other_processes(tmp_path):
+    target = tmp_path / "stellaris.exe"
+    target.write_bytes(b"")
+
+    with FileLock(target):
+        assert _try_lock_in_child(target) == "timeout"
+    assert _try_lock_in_child(target) == "acquired"
+
+
+def test_lock_serialises_threads(tmp_path):
+    target = tmp_path / "stellaris.exe"
+    inside = []
+    overlaps = []
+
+    def _work():
+        with FileLock(target):
+            inside.append(1)
+            if len(inside) > 1:
+                overlaps.append(1)
+            time.sleep(0.01)
+            inside.pop()
+
+    threads = [threading.Thread(target=_work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not overlaps
+
+
+def test_contended_lock_times_out(tmp_path):
+    target = tmp_path / "stellaris.exe"
+
+    with FileLock(target):
+        waiter = FileLock(target, timeout=0.2)
+        result = []
+        thread = threading.Thread(target=lambda: result.append(waiter.acquire()))
+        thread.start()
+        thread.join()
+
+    assert result == [False]
+
+
+def test_lock_file_stays_out_of_the_game_folder(tmp_path):
+    target = tmp_path / "stellaris.exe"
+
+    with FileLock(target) as lock:
+        assert lock.lock_path == str(default_lock_file(target))
+        assert os.listdir(tmp_path) == []
+
+    # Every spelling of the path takes the same lock.
+    assert default_lock_file(tmp_path / "." / "stellaris.exe") == default_lock_file(target)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from conftest import CHECKSUM_PATCHED, CHECKSUM_TEST, make_executable_bytes
+from hex_patchers.game_profiles import GameProfile, GameProfileRegistry
+
+OTHER_SIGNATURE = bytes.fromhex("DE AD BE EF") + CHECKSUM_TEST
+
+
+def _profile_data(other_sha256="") -> dict:
+    return {
+        "version": 1,
+        "profile_id": "stellaris",
+        "title": "Stellaris",
+        "steam_app_id": "281990",
+        "executables": {"default": ["stellaris.exe"]},
+        "default_build": "default",
+        "builds": {
+            "default": {"sha256": [], "rules": [{
+                "rule_id": "checksum",
+                "signature": "48 8B 12 ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? 85 C0",
+                "edits": [{"offset": 17, "old": "85 C0", "new": "33 C0"}]}]},
+            "other": {"sha256": [other_sha256] if other_sha256 else [], "rules": [{
+                "rule_id": "checksum",
+                "signature": OTHER_SIGNATURE.hex(" ").upper(),
+                "edits": [{"offset": 4, "old": "85 C0", "new": "33 C0"}]}]},
+        },
+    }
+
+
+@pytest.fixture
+def other_build(tmp_path):
+    """
+    An executable only the signature of the "other" build matches.
+    """
+    data = make_executable_bytes(seed=5)
+    data[300_000:300_019] = bytes(19)
+    data[400_000:400_006] = OTHER_SIGNATURE
+    path = tmp_path / "other" / "stellaris.exe"
+    path.parent.mkdir()
+    path.write_bytes(data)
+    return path
+
+
+def test_build_is_selected_by_executable_hash(make_patcher, other_build):
+    sha256 = hashlib.sha256(other_build.read_bytes()).hexdigest()
+    profile = GameProfile.from_dict(_profile_data(sha256))
+    assert profile.build_for_hash(sha256.upper()) == "other"
+
+    patcher = make_patcher(profile=profile)
+    result = patcher.patch_executable(str(other_build))
+
+    assert result["patched"]
+    assert patcher.build == "other"
+    with open(patcher.get_patched_file_path(), "rb") as f:
+        assert f.read()[400_004:400_006] == CHECKSUM_PATCHED
+    assert patcher._known_builds.get(sha256)["build"] == "other"
+
+
+def test_unlisted_executable_uses_the_default_build(make_patcher, make_executable, other_build):
+    sha256 = hashlib.sha256(other_build.read_bytes()).hexdigest()
+    patcher = make_patcher(profile=GameProfile.from_dict(_profile_data(sha256)))
+
+    assert patcher.patch_executable(str(make_executable()))["patched"]
+    assert patcher.build == "default"
+
+
+def test_given_build_is_not_replaced(make_patcher, other_build):
+    sha256 = hashlib.sha256(other_build.read_bytes()).hexdigest()
+    patcher = make_patcher(profile=GameProfile.from_dict(_profile_data(sha256)), build="default")
+
+    assert not patcher.patch_executable(str(other_build))["patched"]
+    assert patcher.build == "default"
+
+
+def test_registry_reloads_a_changed_profile(tmp_path):
+    folder = tmp_path / "profiles"
+    folder.mkdir()
+    data_file = folder / "stellaris.json"
+    data_file.write_text(json.dumps(_profile_data()))
+
+    registry = GameProfileRegistry(folders=[str(folder)])
+    first = registry.get("stellaris")
+    assert registry.get("stellaris") is first # Unchanged data files are not compiled again.
+
+    changed = _profile_data()
+    changed["title"] = "Stellaris Renamed"
+    data_file.write_text(json.dumps(changed))
+    stat = data_file.stat()
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert registry.get("stellaris").title == "Stellaris Renamed"
+    assert not list(tmp_path.glob("*.cache"))
+
+
+def test_registry_skips_invalid_profiles(tmp_path):
+    folder = tmp_path / "profiles"
+    folder.mkdir()
+    (folder / "broken.json").write_text("{}")
+    (folder / "stellaris.json").write_text(json.dumps(_profile_data()))
+
+    assert [profile.profile_id for profile in GameProfileRegistry(folders=[str(folder)]).all()] == ["stellaris"]
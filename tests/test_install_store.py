@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from settings.install_store import InstallStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = InstallStore(tmp_path / "install-store.sqlite")
+    yield store
+    store.close()
+
+
+def test_record_upserts_only_the_given_fields(store, make_executable):
+    executable = make_executable()
+
+    assert store.record(executable, sha256="aa", signature_id="checksum", offset=300_017,
+                        timings={"scan_ms": 12.5})
+    assert store.record(executable, patched=True, backup="stellaris.exe.bak")
+
+    record = store.get(executable)
+    assert record["path"] == str(executable)
+    assert record["size"] == executable.stat().st_size and record["mtime"] == executable.stat().st_mtime_ns
+    assert record["sha256"] == "aa" and record["offset"] == 300_017
+    assert record["patched"] is True and record["backup"] == "stellaris.exe.bak"
+    assert record["timings"] == {"scan_ms": 12.5}
+    assert len(store.all()) == 1
+
+
+def test_records_are_found_by_hash(store, make_executable):
+    first = make_executable("a/stellaris.exe")
+    second = make_executable("b/stellaris.exe")
+    store.record(first, sha256="aa")
+    store.record(second, sha256="aa")
+    store.record(make_executable("c/stellaris.exe", seed=1), sha256="bb")
+
+    assert sorted(record["path"] for record in store.find_by_hash("aa")) == [str(first), str(second)]
+    assert store.get("/nonexistent/stellaris.exe") == {}
+
+
+def test_unknown_fields_are_rejected(store, make_executable):
+    with pytest.raises(ValueError, match="sha1"):
+        store.record(make_executable(), sha1="aa")
+
+
+def test_is_current_until_the_executable_changes(store, make_executable):
+    executable = make_executable()
+    store.record(executable, sha256="aa")
+    assert store.is_current(store.get(executable))
+
+    stat = executable.stat()
+    os.utime(executable, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert not store.is_current(store.get(executable))
+
+    store.record(executable, sha256="aa") # Size and mtime are taken from the file again.
+    assert store.is_current(store.get(executable))
+
+    with open(executable, "ab") as f:
+        f.write(b"\x00")
+    os.utime(executable, ns=(stat.st_atime_ns, store.get(executable)["mtime"]))
+    assert not store.is_current(store.get(executable))
+
+    executable.unlink()
+    assert not store.is_current(store.get(executable))
+    assert not store.is_current({})
+
+
+def test_records_survive_reopening(store, make_executable):
+    executable = make_executable()
+    store.record(executable, patched=True)
+    store.close()
+
+    assert store.get(executable)["patched"] is True
+    store.remove(executable)
+    assert store.all() == []
@@ -0,0 +1,70 @@
+import hashlib
+import shutil
+
+from conftest import CHECKSUM_PATCHED, EDIT_OFFSET
+
+SITE = 300_000 + EDIT_OFFSET
+
+
+def _sha256(path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _copy(source, destination):
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(source, destination)
+    return destination
+
+
+def test_first_patch_scans_and_learns_the_build(make_executable, make_patcher):
+    executable = make_executable()
+    patcher = make_patcher()
+
+    result = patcher.patch_executable(str(executable))
+
+    assert result["patched"] and not result["known_build"]
+    entry = patcher._known_builds.get(_sha256(executable))
+    assert entry["patched_sha256"] == _sha256(patcher.get_patched_file_path())
+
+
+def test_same_build_elsewhere_is_a_known_build_hit(make_executable, make_patcher, tmp_path):
+    executable = make_executable()
+    scanned = make_patcher(out_dir="scanned")
+    assert scanned.patch_executable(str(executable))["patched"]
+
+    copy = _copy(executable, tmp_path / "library" / "stellaris.exe")
+    patcher = make_patcher(out_dir="known")
+    result = patcher.patch_executable(str(copy), replace=True)
+
+    assert result["known_build"] and result["patched"] and result["replaced"]
+    assert _sha256(copy) == _sha256(scanned.get_patched_file_path())
+    assert patcher._store.get(str(copy))["sha256"] == _sha256(copy)
+
+
+def test_modified_build_of_the_same_size_falls_back_to_a_scan(make_executable, make_patcher, tmp_path):
+    executable = make_executable()
+    assert make_patcher(out_dir="scanned").patch_executable(str(executable))["patched"]
+
+    tampered = _copy(executable, tmp_path / "tampered" / "stellaris.exe")
+    data = bytearray(tampered.read_bytes())
+    data[10] ^= 0xFF
+    tampered.write_bytes(data)
+
+    patcher = make_patcher(out_dir="tampered-out")
+    result = patcher.patch_executable(str(tampered))
+
+    assert result["patched"] and not result["known_build"]
+    with open(patcher.get_patched_file_path(), "rb") as f:
+        assert f.read()[SITE:SITE + 2] == CHECKSUM_PATCHED
+
+
+def test_patched_copy_of_a_known_build_is_already_patched(make_executable, make_patcher, tmp_path):
+    executable = make_executable()
+    scanned = make_patcher(out_dir="scanned")
+    assert scanned.patch_executable(str(executable))["patched"]
+
+    patched_copy = _copy(scanned.get_patched_file_path(), tmp_path / "patched" / "stellaris.exe")
+    result = make_patcher(out_dir="again").patch_executable(str(patched_copy))
+
+    assert result["already_patched"] and result["known_build"] and not result["patched"]
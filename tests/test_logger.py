@@ -0,0 +1,50 @@
+import logging
+
+import pytest
+
+from utils.global_defines import logger
+
+
+@pytest.fixture
+def debug_off():
+    assert not logger.logger.isEnabledFor(logging.DEBUG)
+    logger._debug_buffer.clear()
+    yield
+    logger._debug_buffer.clear()
+
+
+def test_debug_callable_is_not_called_on_a_successful_run(debug_off, make_executable, make_patcher):
+    calls = []
+    logger.debug(lambda: calls.append(1) or "expensive")
+
+    result = make_patcher().patch_executable(str(make_executable()))
+
+    assert result["patched"]
+    assert calls == []
+
+
+def test_debug_callable_is_rendered_when_the_buffer_is_dumped(debug_off):
+    calls = []
+    logger.debug(lambda: calls.append(1) or "expensive detail")
+
+    dump_file = logger.dump_debug_buffer(reason="test")
+
+    assert calls == [1]
+    assert "expensive detail" in dump_file.read_text()
+    dump_file.unlink()
+
+
+def test_buffered_exceptions_keep_no_frames(debug_off):
+    try:
+        raise ValueError("boom")
+    except ValueError as e:
+        logger.debug_error(e)
+        logger.debug("Failed: %s", e)
+
+    for _, _, log_input, args in logger._debug_buffer:
+        assert not isinstance(log_input, BaseException)
+        assert not any(isinstance(arg, BaseException) for arg in args)
+
+    dump_file = logger.dump_debug_buffer()
+    assert "ValueError: boom" in dump_file.read_text()
+    dump_file.unlink()
@@ -0,0 +1,80 @@
+import random
+import re
+
+import pytest
+
+from hex_patchers.ngram_index import NgramIndex, build_index
+from hex_patchers.patch_rules import parse_signature
+
+SIGNATURES = (
+    "48 8B 12 ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? 85 C0", # The built-in checksum signature.
+    "DE AD BE EF 01 02 03 04",
+    "AA AA AA AA AA AA AA AA", # Overlapping matches in a run.
+    "?? AD BE EF ?? 02 03 04 05 06 07 08", # Leading wildcard.
+    "DE ?? BE ?? 01", # Too few fixed bytes for the index, scanned instead.
+)
+
+
+def _regex_scan(data: bytes, signature) -> list:
+    pattern = b"".join(b"." if value is None else re.escape(bytes([value])) for value in parse_signature(signature))
+    return [match.start() for match in re.finditer(b"(?=" + pattern + b")", data, re.DOTALL)]
+
+
+@pytest.fixture(scope="module")
+def executable(tmp_path_factory):
+    rng = random.Random(3)
+    data = bytearray(rng.randbytes(1 << 19))
+    for site in rng.sample(range(0, len(data) - 64), 40):
+        data[site:site + 12] = bytes.fromhex("DE AD BE EF 01 02 03 04 05 06 07 08")
+    data[1000:1032] = b"\xAA" * 32
+    for site in (5000, 77777, 300001):
+        data[site:site + 19] = bytes.fromhex("48 8B 12") + rng.randbytes(14) + bytes.fromhex("85 C0")
+
+    path = tmp_path_factory.mktemp("ngram") / "stellaris.exe"
+    path.write_bytes(data)
+    return path
+
+
+@pytest.mark.parametrize("stride", [1, 2, 4, 8])
+@pytest.mark.parametrize("signature", SIGNATURES)
+def test_find_matches_a_regex_scan(executable, tmp_path, stride, signature):
+    index_file = tmp_path / "stellaris.ngram"
+    build_index(executable, index_file, stride=stride)
+
+    index = NgramIndex(executable, index_file)
+    assert index.open(build=False)
+    try:
+        expected = _regex_scan(executable.read_bytes(), signature)
+        assert expected
+        assert index.find(signature) == expected
+        assert index.find(signature, limit=2) == expected[:2]
+    finally:
+        index.close()
+
+
+def test_all_wildcard_query_is_limited(executable, tmp_path):
+    index = NgramIndex(executable, tmp_path / "stellaris.ngram")
+    assert index.open()
+    try:
+        assert index.find("?? ?? ?? ??", limit=5) == [0, 1, 2, 3, 4]
+    finally:
+        index.close()
+
+
+def test_changed_executable_is_not_queried_with_a_stale_index(executable, tmp_path):
+    copy = tmp_path / "stellaris.exe"
+    data = bytearray(executable.read_bytes())
+    copy.write_bytes(data)
+    index_file = tmp_path / "stellaris.ngram"
+    build_index(copy, index_file)
+
+    data[1000:1008] = bytes.fromhex("DE AD BE EF 01 02 03 04")
+    copy.write_bytes(data)
+
+    index = NgramIndex(copy, index_file)
+    assert not index.open(build=False)
+    assert index.open()
+    try:
+        assert index.find("DE AD BE EF 01 02 03 04") == _regex_scan(bytes(data), "DE AD BE EF 01 02 03 04")
+    finally:
+        index.close()
@@ -0,0 +1,52 @@
+import shutil
+
+from conftest import CHECKSUM_PATCHED, CHECKSUM_TEST, EDIT_OFFSET
+from hex_patchers.patch_file import PatchFile
+
+SITE = 300_000 + EDIT_OFFSET
+
+
+def _export(make_executable, make_patcher, tmp_path):
+    executable = make_executable()
+    patcher = make_patcher()
+    assert patcher.load_file_hex(file_path=str(executable))
+    assert patcher.patch()
+
+    patch_file = patcher.export_patch_file(str(tmp_path / "stellaris.scpatch"))
+    assert patch_file
+    return executable, patcher.get_patched_file_path(), patch_file
+
+
+def test_export_and_apply_round_trip(make_executable, make_patcher, tmp_path):
+    executable, patched_file, patch_file = _export(make_executable, make_patcher, tmp_path)
+
+    with open(patched_file, "rb") as f:
+        patched = f.read()
+    assert patched[SITE:SITE + 2] == CHECKSUM_PATCHED
+
+    copy = tmp_path / "copy" / "stellaris.exe"
+    copy.parent.mkdir()
+    shutil.copyfile(executable, copy)
+
+    applier = make_patcher(out_dir="applied")
+    assert applier.apply_patch_file(patch_file, str(copy))
+    with open(applier.get_patched_file_path(), "rb") as f:
+        assert f.read() == patched
+    assert copy.read_bytes()[SITE:SITE + 2] == CHECKSUM_TEST
+
+
+def test_patch_file_survives_save_and_load(make_executable, make_patcher, tmp_path):
+    _, _, patch_file = _export(make_executable, make_patcher, tmp_path)
+
+    loaded = PatchFile.load(patch_file)
+    assert loaded.edits == [(SITE, CHECKSUM_TEST, CHECKSUM_PATCHED)]
+    assert PatchFile.from_dict(loaded.to_dict()).to_dict() == loaded.to_dict()
+
+
+def test_patch_file_refuses_another_build(make_executable, make_patcher, tmp_path):
+    _, _, patch_file = _export(make_executable, make_patcher, tmp_path)
+    other = make_executable(name="other/stellaris.exe", seed=1)
+
+    applier = make_patcher(out_dir="applied")
+    assert not applier.apply_patch_file(patch_file, str(other))
+    assert not (tmp_path / "applied" / "stellaris-patched.exe").exists()
@@ -0,0 +1,120 @@
+import pytest
+
+from hex_patchers.patch_rules import (PatchEdit, PatchRule, PatchTransaction, MATCH_APPLIED, MATCH_CONFLICT,
+                                      MATCH_PENDING, parse_signature)
+from hex_patchers.progress import BLOCK_SIZE, PatchCancelled
+
+SIGNATURE = "48 8B 12 ?? ?? 85 C0"
+SITE_BYTES = bytes.fromhex("48 8B 12 AA BB 85 C0")
+PATCHED_BYTES = bytes.fromhex("48 8B 12 AA BB 33 C0")
+
+
+def _rule(**kwargs) -> PatchRule:
+    return PatchRule("checksum", SIGNATURE, edits=[PatchEdit(5, bytes.fromhex("85 C0"), bytes.fromhex("33 C0"))],
+                     **kwargs)
+
+
+def _data(size: int, sites: dict) -> bytearray:
+    data = bytearray(size)
+    for offset, site_bytes in sites.items():
+        data[offset:offset + len(site_bytes)] = site_bytes
+    return data
+
+
+def test_signature_parsing():
+    assert parse_signature(SIGNATURE) == [0x48, 0x8B, 0x12, None, None, 0x85, 0xC0]
+    with pytest.raises(ValueError):
+        parse_signature("")
+
+
+def test_match_across_a_block_boundary_is_found_once():
+    offset = BLOCK_SIZE - 3 # The signature straddles the first block's end.
+    data = _data(BLOCK_SIZE * 2, {offset: SITE_BYTES})
+
+    assert _rule(max_matches=None).find_matches(data) == [(offset, MATCH_PENDING)]
+
+
+def test_match_states():
+    data = _data(4096, {100: SITE_BYTES, 200: PATCHED_BYTES, 300: SITE_BYTES[:5] + bytes.fromhex("33 00")})
+    rule = PatchRule("checksum", "48 8B 12 ?? ?? ?? ??",
+                     edits=[PatchEdit(5, bytes.fromhex("85 C0"), bytes.fromhex("33 C0"))], max_matches=None)
+
+    assert rule.find_matches(data) == [(100, MATCH_PENDING), (200, MATCH_APPLIED), (300, MATCH_CONFLICT)]
+
+
+def test_already_patched_match_is_found_by_the_same_scan():
+    data = _data(4096, {1000: PATCHED_BYTES})
+
+    assert _rule().find_matches(data) == [(1000, MATCH_APPLIED)]
+
+
+def test_max_matches_stops_the_scan():
+    data = _data(4096, {100: SITE_BYTES, 200: SITE_BYTES, 300: SITE_BYTES})
+
+    assert _rule(max_matches=2).find_matches(data) == [(100, MATCH_PENDING), (200, MATCH_PENDING)]
+
+
+@pytest.mark.parametrize("edits, reason", [
+    ([PatchEdit(4, b"\x00\x85", b"\x00\x33"), PatchEdit(5, b"\x85\xC0", b"\x33\xC0")], "overlapping"),
+    ([PatchEdit(6, b"\xC0\x00", b"\xC0\x01")], "outside"),
+    ([PatchEdit(5, b"\x90\xC0", b"\x33\xC0")], "does not match"),
+])
+def test_invalid_rules_are_rejected(edits, reason):
+    with pytest.raises(ValueError, match=reason):
+        PatchRule("checksum", SIGNATURE, edits=edits)
+
+
+def test_overlapping_staged_edits_fail_validation():
+    data = _data(4096, {100: SITE_BYTES})
+    transaction = PatchTransaction()
+    transaction.stage_match(_rule(), 100)
+    transaction.stage(106, b"\xC0", b"\x90", "other")
+
+    assert not transaction.validate(data)
+
+
+def test_write_applies_every_edit_in_one_pass(tmp_path):
+    data = _data(BLOCK_SIZE * 2 + 17, {100: SITE_BYTES, BLOCK_SIZE + 5: SITE_BYTES})
+    transaction = PatchTransaction()
+    for offset, _ in _rule(max_matches=None).find_matches(data):
+        transaction.stage_match(_rule(), offset)
+
+    dest = tmp_path / "stellaris-patched.exe"
+    written = []
+    assert transaction.write(data, dest, checkpoint=written.append)
+
+    expected = _data(len(data), {100: PATCHED_BYTES, BLOCK_SIZE + 5: PATCHED_BYTES})
+    assert dest.read_bytes() == expected
+    assert written[-1] == len(data)
+    assert not (tmp_path / "stellaris-patched.exe.tmp").exists()
+
+
+def test_failed_validation_leaves_the_target_untouched(tmp_path):
+    data = _data(4096, {100: SITE_BYTES})
+    dest = tmp_path / "stellaris-patched.exe"
+    dest.write_bytes(b"previous output")
+
+    transaction = PatchTransaction()
+    transaction.stage_match(_rule(), 100)
+    transaction.stage(2000, b"\x01", b"\x02", "stale") # Data holds 00 there.
+
+    assert not transaction.write(data, dest)
+    assert dest.read_bytes() == b"previous output"
+    assert not (tmp_path / "stellaris-patched.exe.tmp").exists()
+
+
+def test_cancelled_write_leaves_the_target_untouched(tmp_path):
+    data = _data(BLOCK_SIZE * 3, {100: SITE_BYTES})
+    dest = tmp_path / "stellaris-patched.exe"
+    dest.write_bytes(b"previous output")
+
+    transaction = PatchTransaction()
+    transaction.stage_match(_rule(), 100)
+
+    def _cancel(position):
+        raise PatchCancelled()
+
+    with pytest.raises(PatchCancelled):
+        transaction.write(data, dest, checkpoint=_cancel)
+    assert dest.read_bytes() == b"previous output"
+    assert not (tmp_path / "stellaris-patched.exe.tmp").exists()
@@ -0,0 +1,114 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import pytest
+
+from conftest import CHECKSUM_PATCHED, EDIT_OFFSET
+from service.patch_service import PatchService, send_job
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix domain sockets only.")
+
+SITE = 300_000 + EDIT_OFFSET
+
+
+@pytest.fixture
+def socket_path():
+    # Socket paths are limited to about 100 bytes, pytest's tmp_path can be longer.
+    folder = tempfile.mkdtemp(prefix="scp-")
+    yield os.path.join(folder, "s.sock")
+    if os.path.exists(os.path.join(folder, "s.sock")):
+        os.remove(os.path.join(folder, "s.sock"))
+    os.rmdir(folder)
+
+
+def _start(service) -> threading.Thread:
+    result = []
+    thread = threading.Thread(target=lambda: result.append(service.serve_forever()), daemon=True)
+    thread.result = result
+    thread.start()
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if service._server is not None and os.path.exists(service.socket_path):
+            return thread
+        if not thread.is_alive():
+            return thread
+        time.sleep(0.01)
+
+    raise TimeoutError("Patch service did not start.")
+
+
+@pytest.fixture
+def service(socket_path):
+    service = PatchService(socket_path=socket_path, max_workers=2)
+    thread = _start(service)
+    yield service
+    service.stop()
+    thread.join(10)
+
+
+def test_patch_job_round_trip(service, make_executable, tmp_path):
+    executable = make_executable()
+    output_dir = tmp_path / "out"
+
+    response = send_job("patch", {"executable": str(executable), "output_dir": str(output_dir)},
+                        socket_path=service.socket_path, timeout=30)
+
+    assert response["ok"], response["error"]
+    assert response["id"] == os.getpid()
+    assert response["result"]["patched"]
+    assert response["queue_ms"] >= 0 and response["run_ms"] > 0
+    with open(response["result"]["output"], "rb") as f:
+        assert f.read()[SITE:SITE + 2] == CHECKSUM_PATCHED
+
+    status = send_job("status", socket_path=service.socket_path, timeout=30)["result"]
+    assert status["workers"] == 2
+    assert status["queue_depth"] == 0 and status["running"] == 0
+    assert status["completed"] == 1 and status["failed"] == 0
+    assert status["latency_ms"]["max"] >= status["latency_ms"]["p50"] > 0
+
+
+def test_failed_and_invalid_requests_are_answered(service):
+    response = send_job("probe", {"executable": "/nonexistent/stellaris.exe"}, socket_path=service.socket_path,
+                        timeout=30)
+    assert not response["ok"] and "not found" in response["error"]
+
+    assert send_job("nope", socket_path=service.socket_path, timeout=30)["error"] == "Unknown job: nope"
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(30)
+        client.connect(service.socket_path)
+        client.sendall(b"not json\n")
+        with client.makefile("rb") as stream:
+            response = json.loads(stream.readline())
+    assert not response["ok"] and response["error"].startswith("Invalid request")
+
+    assert send_job("status", socket_path=service.socket_path, timeout=30)["result"]["failed"] == 1
+
+
+def test_second_service_does_not_take_over_a_live_socket(service):
+    second = PatchService(socket_path=service.socket_path)
+
+    assert second.serve_forever() is False
+    assert send_job("status", socket_path=service.socket_path, timeout=30)["ok"]
+
+
+def test_stale_socket_is_replaced(socket_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close() # The file stays behind, nobody listens on it.
+
+    service = PatchService(socket_path=socket_path)
+    thread = _start(service)
+    try:
+        assert send_job("status", socket_path=socket_path, timeout=30)["ok"]
+    finally:
+        service.stop()
+        thread.join(10)
+
+    assert thread.result == [True]
+    assert not os.path.exists(socket_path)
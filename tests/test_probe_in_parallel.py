@@ -0,0 +1,58 @@
+import threading
+import time
+
+from hex_patchers.concurrency import MAX_PROBE_WORKERS, probe_in_parallel
+
+TIMEOUT = 0.5
+
+
+def test_queued_libraries_get_their_own_timeout():
+    libraries = [f"library-{i}" for i in range(MAX_PROBE_WORKERS + 4)]
+    slow = libraries[0]
+
+    def _probe(library):
+        # Every probe takes most of the timeout, so libraries waiting for a worker finish after the first batch's.
+        time.sleep(2.0 if library == slow else 0.3)
+        return library
+
+    results, unreachable = probe_in_parallel(libraries, _probe, TIMEOUT)
+
+    assert unreachable == [slow]
+    assert results == {library: library for library in libraries[1:]}
+
+
+def test_libraries_behind_stuck_workers_are_unreachable():
+    release = threading.Event()
+    libraries = [f"library-{i}" for i in range(MAX_PROBE_WORKERS + 2)]
+
+    def _probe(library):
+        release.wait(5)
+        return library
+
+    started = time.monotonic()
+    try:
+        results, unreachable = probe_in_parallel(libraries, _probe, 0.2)
+    finally:
+        release.set()
+
+    assert results == {}
+    assert sorted(unreachable) == sorted(libraries)
+    assert time.monotonic() - started < 2
+
+
+def test_first_match_stops_queued_probes():
+    probed = []
+    libraries = [f"library-{i}" for i in range(MAX_PROBE_WORKERS * 3)]
+
+    def _probe(library):
+        probed.append(library)
+        time.sleep(0.05)
+        return library == libraries[0]
+
+    stop = threading.Event()
+    results, _ = probe_in_parallel(libraries, _probe, TIMEOUT, first_match=True, stop=stop)
+
+    assert results[libraries[0]] is True
+    assert stop.is_set()
+    time.sleep(0.2)
+    assert len(probed) < len(libraries)
@@ -0,0 +1,102 @@
+import json
+import os
+import time
+
+import pytest
+
+from settings import settings as settings_module
+from settings.settings import Settings
+
+
+@pytest.fixture
+def make_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings_module, "SAVE_DELAY", 0.1)
+    monkeypatch.setattr(settings_module, "RELOAD_CHECK_INTERVAL", 0.0)
+    made = []
+
+    def _make():
+        settings = Settings()
+        settings.config_file = tmp_path / "settings.json"
+        made.append(settings)
+        return settings
+
+    yield _make
+
+    # Nothing is left for the flush registered with atexit.
+    for settings in made:
+        if settings._save_timer is not None:
+            settings._save_timer.cancel()
+        settings._dirty.clear()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_setters_are_coalesced_into_one_write(make_settings, monkeypatch):
+    settings = make_settings()
+    saves = []
+    original = settings.save_config
+    monkeypatch.setattr(settings, "save_config", lambda: saves.append(1) or original())
+
+    settings.set_app_version("3.1.0")
+    settings.set_install_location("/games/stellaris")
+    settings.set("install-location", "/games/stellaris") # Unchanged, does not schedule anything.
+    assert not settings.config_file.exists()
+
+    assert _wait_for(lambda: settings.config_file.exists())
+    time.sleep(0.2)
+
+    assert len(saves) == 1
+    assert json.loads(settings.config_file.read_text()) == {"app-version": "3.1.0",
+                                                            "install-location": "/games/stellaris"}
+    assert not list(settings.config_file.parent.glob("*.tmp"))
+
+
+def test_flush_writes_pending_changes_now(make_settings):
+    settings = make_settings()
+    settings.set_app_version("3.1.0")
+
+    assert settings.flush()
+    assert settings._save_timer is None
+    assert json.loads(settings.config_file.read_text())["app-version"] == "3.1.0"
+    assert make_settings().get_app_version() == "3.1.0"
+
+
+def test_changes_of_another_instance_are_kept(make_settings):
+    first = make_settings()
+    second = make_settings()
+    assert first.get_app_version() == ""
+
+    second.set_install_location("/games/stellaris")
+    assert second.flush()
+    stat = second.config_file.stat()
+    os.utime(second.config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    first.set_app_version("3.1.0")
+    assert first.get_install_location() == "/games/stellaris"
+    assert first.flush()
+
+    assert json.loads(first.config_file.read_text()) == {"app-version": "3.1.0",
+                                                         "install-location": "/games/stellaris"}
+
+
+def test_failed_write_keeps_the_previous_config(make_settings, monkeypatch):
+    settings = make_settings()
+    settings.set_app_version("3.0.0")
+    assert settings.flush()
+
+    def _replace(source, destination):
+        raise OSError("Disk full.")
+
+    monkeypatch.setattr(settings_module.os, "replace", _replace)
+    settings.set_app_version("3.1.0")
+
+    assert not settings.flush()
+    assert json.loads(settings.config_file.read_text())["app-version"] == "3.0.0"
+    assert not list(settings.config_file.parent.glob("*.tmp"))
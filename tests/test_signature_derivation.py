@@ -0,0 +1,63 @@
+import random
+
+from conftest import CHECKSUM_PATCHED, CHECKSUM_TEST, EDIT_OFFSET, make_executable_bytes
+from hex_patchers.patch_rules import PatchRule, PatchEdit, MATCH_PENDING
+from hex_patchers.signature_derivation import derive_signature, format_report
+
+SITE = 300_000 + EDIT_OFFSET
+INSERTED = 777 # Bytes inserted before the site in the second build.
+
+
+def _write_builds(tmp_path):
+    reference = make_executable_bytes()
+    rng = random.Random(1)
+
+    # A later build: code moved by an insertion, the bytes right before and after the edit changed.
+    sample = reference[:100_000] + bytearray(rng.randbytes(INSERTED)) + reference[100_000:]
+    sample[SITE + INSERTED - 1] ^= 0xFF
+    sample[SITE + INSERTED + len(CHECKSUM_TEST)] ^= 0xFF
+
+    reference_path = tmp_path / "reference.exe"
+    sample_path = tmp_path / "sample.exe"
+    reference_path.write_bytes(reference)
+    sample_path.write_bytes(sample)
+
+    return reference_path, sample_path
+
+
+def test_derived_signature_matches_once_in_every_build(tmp_path):
+    reference_path, sample_path = _write_builds(tmp_path)
+
+    result = derive_signature(reference_path, SITE, CHECKSUM_TEST, CHECKSUM_PATCHED, sample_paths=[sample_path])
+
+    assert "error" not in result, format_report(result)
+    assert result["verified"]
+    assert result["sites"] == {reference_path: SITE, sample_path: SITE + INSERTED}
+
+    rule = PatchRule("checksum", result["signature"],
+                     edits=[PatchEdit(result["edit_offset"], CHECKSUM_TEST, CHECKSUM_PATCHED)], max_matches=None)
+    for path, site in result["sites"].items():
+        assert rule.find_matches(path.read_bytes()) == [(site - result["edit_offset"], MATCH_PENDING)]
+
+
+def test_differing_context_becomes_a_wildcard(tmp_path):
+    reference_path, sample_path = _write_builds(tmp_path)
+
+    result = derive_signature(reference_path, SITE, CHECKSUM_TEST, CHECKSUM_PATCHED, sample_paths=[sample_path])
+
+    # The edited bytes alone occur many times, so the window reaches at least one of the changed neighbours.
+    assert result["wildcards"] >= 1
+    for path, site in result["sites"].items():
+        data = path.read_bytes()
+        start = site - result["edit_offset"]
+        for i, token in enumerate(result["signature"].split()):
+            assert token == "??" or data[start + i] == int(token, 16)
+
+
+def test_wrong_site_is_reported(tmp_path):
+    reference_path, _ = _write_builds(tmp_path)
+
+    result = derive_signature(reference_path, SITE + 1, CHECKSUM_TEST, CHECKSUM_PATCHED)
+
+    assert "error" in result
+    assert result["error"] == format_report(result)
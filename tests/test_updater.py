@@ -0,0 +1,164 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from updater import updater as updater_module
+from updater.updater import Updater
+
+ASSET = bytes(range(256)) * 1024
+ETAG = '"asset-v1"'
+LAST_MODIFIED = "Mon, 19 Oct 2026 10:00:00 GMT"
+RELEASE_ETAG = '"release-v1"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+
+        if self.path == "/release":
+            if self.headers.get("If-None-Match") == RELEASE_ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = json.dumps({"tag_name": "v9.9.9", "assets": [{
+                "browser_download_url": f"http://127.0.0.1:{server.server_port}/asset.zip",
+                "size": len(server.asset),
+                "digest": server.digest}]}).encode()
+            self.send_response(200)
+            self.send_header("ETag", RELEASE_ETAG)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        asset = server.asset
+        start = 0
+        byte_range = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if byte_range and if_range in server.validators.values():
+            start = int(byte_range.split("=")[1].rstrip("-"))
+
+        self.send_response(206 if start else 200)
+        for header, value in server.validators.items():
+            if value:
+                self.send_header(header, value)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(asset) - 1}/{len(asset)}")
+        self.send_header("Content-Length", str(len(asset) - start))
+        self.end_headers()
+        self.wfile.write(asset[start:])
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.requests = []
+    httpd.asset = ASSET
+    httpd.digest = f"sha256:{hashlib.sha256(ASSET).hexdigest()}"
+    httpd.validators = {"ETag": ETAG, "Last-Modified": LAST_MODIFIED}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def updater(server, tmp_path):
+    instance = Updater(url=f"http://127.0.0.1:{server.server_port}/release", cache_file=tmp_path / "cache.json",
+                       cache_ttl=0)
+    assert instance.check_for_update()
+    return instance
+
+
+def _write_part(destination, data, **meta):
+    part_file = f"{destination}{updater_module.DOWNLOAD_PART_SUFFIX}"
+    with open(part_file, "wb") as f:
+        f.write(data)
+    with open(f"{part_file}.json", "w") as f:
+        json.dump(meta, f)
+
+
+def test_unchanged_release_is_revalidated_with_304(server, updater):
+    assert updater.check_for_update()
+
+    path, headers = server.requests[-1]
+    assert path == "/release"
+    assert headers.get("If-None-Match") == RELEASE_ETAG
+    assert updater.pulled_release["latest"] == "v9.9.9"
+
+
+def test_cached_release_is_used_when_offline(server, updater):
+    server.shutdown()
+    server.server_close()
+
+    assert updater.check_for_update()
+    assert updater.pulled_release["latest"] == "v9.9.9"
+
+
+def test_download_resumes_with_if_range(server, updater, tmp_path):
+    destination = tmp_path / "asset.zip"
+    _write_part(destination, ASSET[:1000], url=updater.pulled_release["download"], etag=ETAG)
+
+    assert updater.download_update(destination=str(destination)) == str(destination)
+
+    _, headers = server.requests[-1]
+    assert headers.get("Range") == "bytes=1000-"
+    assert headers.get("If-Range") == ETAG
+    assert destination.read_bytes() == ASSET
+
+
+def test_download_resumes_against_last_modified_without_etag(server, updater, tmp_path):
+    destination = tmp_path / "asset.zip"
+    _write_part(destination, ASSET[:1000], url=updater.pulled_release["download"], etag=None,
+                **{"last-modified": LAST_MODIFIED})
+
+    assert updater.download_update(destination=str(destination)) == str(destination)
+
+    _, headers = server.requests[-1]
+    assert headers.get("If-Range") == LAST_MODIFIED
+    assert destination.read_bytes() == ASSET
+
+
+def test_changed_asset_restarts_the_download(server, updater, tmp_path):
+    destination = tmp_path / "asset.zip"
+    _write_part(destination, b"stale" * 200, url=updater.pulled_release["download"], etag='"asset-v0"')
+
+    assert updater.download_update(destination=str(destination)) == str(destination)
+    assert destination.read_bytes() == ASSET
+
+
+def test_part_without_validator_is_not_resumed(server, updater, tmp_path):
+    destination = tmp_path / "asset.zip"
+    _write_part(destination, b"stale" * 200, url=updater.pulled_release["download"])
+
+    assert updater.download_update(destination=str(destination)) == str(destination)
+
+    _, headers = server.requests[-1]
+    assert "Range" not in headers
+    assert destination.read_bytes() == ASSET
+
+
+def test_missing_digest_is_reported(server, updater, tmp_path, monkeypatch):
+    messages = []
+    monkeypatch.setattr(updater_module.logger, "info", lambda log_input, *args: messages.append(log_input))
+    updater.pulled_release["sha256"] = None
+
+    destination = tmp_path / "asset.zip"
+    assert updater.download_update(destination=str(destination)) == str(destination)
+    assert any("integrity check" in message for message in messages)
+
+
+def test_wrong_digest_discards_the_download(server, updater, tmp_path):
+    destination = tmp_path / "asset.zip"
+
+    assert updater.download_update(destination=str(destination), expected_sha256="0" * 64) is None
+    assert not destination.exists()
+    assert not (tmp_path / f"asset.zip{updater_module.DOWNLOAD_PART_SUFFIX}").exists()
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from hex_patchers import vdf_parser
+from hex_patchers.vdf_parser import VDFParseError, clear_vdf_cache, load_vdf, parse_vdf, vdf_get
+
+LIBRARY_FOLDERS = r'''
+// Written by Steam
+"libraryfolders"
+{
+	"0"
+	{
+		"path"		"C:\\Program Files (x86)\\Steam"
+		"label"		"say \"hi\"\tthere"
+		"apps"
+		{
+			"281990"		"71634902" // Stellaris
+		}
+	}
+	"1"
+	{
+		"path"		"D:\\SteamLibrary"	[$WIN32]
+		"path"		"/mnt/games"	[$LINUX]
+		bare_key	bare_value
+	}
+}
+'''
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    clear_vdf_cache()
+    yield
+    clear_vdf_cache()
+
+
+def test_nested_blocks():
+    parsed = parse_vdf(LIBRARY_FOLDERS)
+
+    assert list(parsed["libraryfolders"]) == ["0", "1"]
+    assert parsed["libraryfolders"]["0"]["apps"] == {"281990": "71634902"}
+    assert vdf_get(parsed, "LibraryFolders", "0", "Apps", "281990") == "71634902"
+    assert vdf_get(parsed, "libraryfolders", "0", "path", "deeper") is None
+    assert vdf_get(parsed, "libraryfolders", "2", default="missing") == "missing"
+
+
+def test_escaped_strings():
+    library = parse_vdf(LIBRARY_FOLDERS)["libraryfolders"]["0"]
+
+    assert library["path"] == "C:\\Program Files (x86)\\Steam"
+    assert library["label"] == "say \"hi\"\tthere"
+
+
+def test_comments_and_conditionals_are_skipped():
+    library = parse_vdf(LIBRARY_FOLDERS)["libraryfolders"]["1"]
+
+    # Conditionals are not evaluated, duplicate keys keep the last value.
+    assert library == {"path": "/mnt/games", "bare_key": "bare_value"}
+    assert parse_vdf("// only a comment") == {}
+
+
+@pytest.mark.parametrize("text", ['"key" "unterminated', '"a" { "b" "c"', '}', '{ "a" "b" }'])
+def test_malformed_documents_raise(text):
+    with pytest.raises(VDFParseError):
+        parse_vdf(text)
+
+
+def test_load_is_cached_until_the_file_changes(tmp_path, monkeypatch):
+    vdf_file = tmp_path / "appmanifest_281990.acf"
+    vdf_file.write_text('"AppState" { "name" "Stellaris" }')
+
+    parses = []
+    original = vdf_parser.parse_vdf
+    monkeypatch.setattr(vdf_parser, "parse_vdf", lambda text: parses.append(text) or original(text))
+
+    first = load_vdf(vdf_file)
+    assert load_vdf(str(vdf_file)) is first
+    assert len(parses) == 1
+
+    vdf_file.write_text('"AppState" { "name" "Stellaris 2" }')
+    stat = vdf_file.stat()
+    os.utime(vdf_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert vdf_get(load_vdf(vdf_file), "appstate", "name") == "Stellaris 2"
+    assert len(parses) == 2
+
+    clear_vdf_cache()
+    load_vdf(vdf_file)
+    assert len(parses) == 3